@@ -1,337 +1,282 @@
 #!/usr/bin/env python3
 """
-Script pro nahrání BMW carbon produktů do DynamoDB
-Stahuje obrázky z Made-in-China a nahrává do DynamoDB
+Hromadné nahrání produktů do DynamoDB z datových souborů (JSON / NDJSON)
+
+Příklady:
+    python backend/update-products.py backend/products.json
+    python backend/update-products.py data/*.ndjson --diff --dry-run
+
+Produkty bez "id" dostanou deterministické ID z kategorie a názvu, takže
+opakované spuštění přepíše stejné položky místo vytváření duplikátů.
+Produkty se zapisují po dávkách už během čtení, takže paměť nezávisí na
+velikosti souborů.
+
+Zápis je UpdateItem: nastaví jen atributy ze souboru, ostatní atributy
+položky v tabulce (např. imageVariants, contentHash nebo priceSort ze
+scraperu) zůstanou zachovány. Atribut odebraný ze souboru se tedy z tabulky
+nesmaže.
 """
 
-import boto3
-import uuid
-import requests
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
 from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import boto3
+from botocore.config import Config
 
 # DynamoDB konfigurace
 REGION = 'eu-central-1'
 TABLE_NAME = 'carbon-parts-products'
+DEFAULT_FILES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'products-made-in-china.ndjson')]
 
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
-table = dynamodb.Table(TABLE_NAME)
-
-# Produkty z Made-in-China
-products = [
-    {
-        "name": "Karbonový Přední Splitter Vorsteiner pro BMW M3 M4 F80/F82",
-        "category": "BMW M3 F80 | Exteriér",
-        "price": Decimal("34900"),
-        "image": "https://image.made-in-china.com/3f2j00LyIVHFPsMdpv/for-BMW-F80-F82-F83-M3-M4-Vorsteiner-Type-Carbon-Fiber-2PC-Front-Bumper-Lip-Body-Kit.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00LyIVHFPsMdpv/for-BMW-F80-F82-F83-M3-M4-Vorsteiner-Type-Carbon-Fiber-2PC-Front-Bumper-Lip-Body-Kit.jpg",
-        ],
-        "isNew": True,
-        "description": "Prémiový karbonový přední splitter ve stylu Vorsteiner pro BMW M3/M4 F80/F82/F83. 2-dílná sada vyrobená z dry carbon fiber s perfektním OEM fitmentem. TUV/GS certifikace, 1 rok záruky.",
-        "specifications": [
-            {"label": "Materiál", "value": "Dry Carbon Fiber (Autokláv)"},
-            {"label": "Povrchová úprava", "value": "2x2 Twill Weave"},
-            {"label": "Fitment", "value": "Vorsteiner Style"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 F80/F82/F83"},
-            {"label": "Montáž", "value": "2-dílná sada, bolt-on"},
-            {"label": "Certifikace", "value": "TUV/GS"},
-        ],
-        "features": [
-            "Vorsteiner inspirovaný design",
-            "2-dílná konstrukce pro snadnou instalaci",
-            "TUV/GS certifikace",
-            "Dry carbon fiber (autokláv)",
-            "UV ochranná vrstva",
-            "Záruka 1 rok",
-        ],
-    },
-    {
-        "name": "Karbonový Přední Lip pro BMW M3 M4 G80/G82",
-        "category": "BMW M4 G82 | Exteriér",
-        "price": Decimal("28900"),
-        "image": "https://image.made-in-china.com/3f2j00jKWbfmPBksqU/Factory-Quality-Professional-Manufacture-Dry-Carbon-Fiber-Front-Lip-for-BMW-M3-M4-G80-G82-S58.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00jKWbfmPBksqU/Factory-Quality-Professional-Manufacture-Dry-Carbon-Fiber-Front-Lip-for-BMW-M3-M4-G80-G82-S58.jpg",
-        ],
-        "isNew": True,
-        "description": "Profesionálně vyráběný přední lip z dry carbon fiber pro nejnovější BMW M3/M4 G80/G82. Perfektní přesnost, ISO9001/TS16949 certifikace. Dramaticky zlepšuje agresivní vzhled vozu.",
-        "specifications": [
-            {"label": "Materiál", "value": "Dry Carbon Fiber"},
-            {"label": "Povrchová úprava", "value": "2x2 Twill Weave"},
-            {"label": "Fitment", "value": "100% OEM"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 G80/G82 S58 (2021+)"},
-            {"label": "Montáž", "value": "Bolt-on, kompletní kit"},
-            {"label": "Certifikace", "value": "ISO9001, TS16949, CE"},
-        ],
-        "features": [
-            "Tovární kvalita výroby",
-            "Dry carbon konstrukce",
-            "ISO certifikace",
-            "Perfect OEM fit",
-            "UV ochrana",
-            "Montážní kit v balení",
-        ],
-    },
-    {
-        "name": "Jagrow Motorsport Karbonový Front Lip BMW M3/M4 G80/G82",
-        "category": "BMW M4 G82 | Exteriér",
-        "price": Decimal("29900"),
-        "image": "https://image.made-in-china.com/3f2j00ajToEAQDgZbB/Jagrow-Motorsport-Dry-Carbon-Fiber-Front-Lip-for-BMW-M3-M4-G80-G82-S58.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00ajToEAQDgZbB/Jagrow-Motorsport-Dry-Carbon-Fiber-Front-Lip-for-BMW-M3-M4-G80-G82-S58.jpg",
-        ],
-        "isNew": True,
-        "description": "Jagrow Motorsport prémiový karbonový front lip pro BMW M3/M4 G80/G82. Závodní kvalita s 1 rokem záruky. Ideální pro show a track použití.",
-        "specifications": [
-            {"label": "Materiál", "value": "Dry Carbon Fiber"},
-            {"label": "Povrchová úprava", "value": "Gloss finish"},
-            {"label": "Fitment", "value": "Motorsport style"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 G80/G82 S58"},
-            {"label": "Montáž", "value": "Bolt-on"},
-            {"label": "Záruka", "value": "1 rok"},
-        ],
-        "features": [
-            "Jagrow Motorsport kvalita",
-            "Závodní vzhled",
-            "Carbon fiber konstrukce",
-            "1 rok záruka",
-            "Snadno instalovatelné",
-            "UV stabilní",
-        ],
-    },
-    {
-        "name": "Karbonový Front Splitter BMW M3/M4 F80/F82",
-        "category": "BMW M3 F80 | Exteriér",
-        "price": Decimal("15900"),
-        "image": "https://image.made-in-china.com/3f2j00dOClRStsEvUY/Factory-Direct-Automotive-Components-Genuine-Carbon-Fibre-Front-Spoiler-Lip-for-BMW-M4-M3-F80-F82-F83-Front-Bumper-.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00dOClRStsEvUY/Factory-Direct-Automotive-Components-Genuine-Carbon-Fibre-Front-Spoiler-Lip-for-BMW-M4-M3-F80-F82-F83-Front-Bumper-.jpg",
-        ],
-        "isNew": False,
-        "description": "Tovární přední spoiler lip z pravého carbon fiber pro BMW M3/M4 F80/F82/F83. Přímý nákup od výrobce = nejlepší cena. 1 rok záruka.",
-        "specifications": [
-            {"label": "Materiál", "value": "Carbon Fiber"},
-            {"label": "Povrchová úprava", "value": "Glossy black"},
-            {"label": "Fitment", "value": "OEM"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 F80/F82/F83"},
-            {"label": "Montáž", "value": "Front bumper lip"},
-            {"label": "Záruka", "value": "1 rok"},
-        ],
-        "features": [
-            "Tovární přímý prodej",
-            "Nejlepší cena/výkon",
-            "Pravý carbon fiber",
-            "1 rok záruka",
-            "Snadná instalace",
-            "OEM fit",
-        ],
-    },
-    {
-        "name": "Vorsteiner Karbonový Zadní Difuzor BMW M3 E92/E93",
-        "category": "BMW M3 E92 | Exteriér",
-        "price": Decimal("24900"),
-        "image": "https://image.made-in-china.com/3f2j00veGMfCBzgRcg/Vorsteiner-Style-Carbon-Fiber-Rear-Diffuser-Rear-Lip-for-2009-2013-BMW-3-Series-E92-E93-M3.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00veGMfCBzgRcg/Vorsteiner-Style-Carbon-Fiber-Rear-Diffuser-Rear-Lip-for-2009-2013-BMW-3-Series-E92-E93-M3.jpg",
-        ],
-        "isNew": False,
-        "description": "Zadní difuzor ve stylu Vorsteiner pro BMW M3 E92/E93 (2009-2013). Carbon fiber, černá lesklá povrchová úprava. CE certifikace, 12 měsíců záruky.",
-        "specifications": [
-            {"label": "Materiál", "value": "Carbon Fiber"},
-            {"label": "Barva", "value": "Černá lesklá"},
-            {"label": "Fitment", "value": "Vorsteiner Style"},
-            {"label": "Kompatibilita", "value": "BMW M3 E92/E93 (2009-2013)"},
-            {"label": "Montáž", "value": "Zadní difuzor"},
-            {"label": "Certifikace", "value": "CE"},
-        ],
-        "features": [
-            "Vorsteiner inspirovaný design",
-            "Klasický E92 M3",
-            "CE certifikace",
-            "12 měsíců záruka",
-            "Carbon fiber",
-            "Lesklý černý finish",
-        ],
-    },
-    {
-        "name": "CS-Style Karbonový Front Splitter BMW M3/M4 F8X",
-        "category": "BMW M3 F80 | Exteriér",
-        "price": Decimal("12900"),
-        "image": "https://image.made-in-china.com/3f2j00jyMiZsElkCYo/CS-Style-Front-Spoiler-with-Carbon-Fibre-Front-Bumper-Lip-for-BMW-F80-F82-F83-F8X-M3-and-M4.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00jyMiZsElkCYo/CS-Style-Front-Spoiler-with-Carbon-Fibre-Front-Bumper-Lip-for-BMW-F80-F82-F83-F8X-M3-and-M4.jpg",
-        ],
-        "isNew": False,
-        "description": "Přední spoiler ve stylu CS s karbonovým lip pro BMW M3/M4 F8X. Cenově dostupné řešení pro upgradem vzhledu. 1 rok záruka.",
-        "specifications": [
-            {"label": "Materiál", "value": "Carbon Fiber"},
-            {"label": "Povrchová úprava", "value": "Matte black"},
-            {"label": "Fitment", "value": "CS Style"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 F80/F82/F83/F8X"},
-            {"label": "Montáž", "value": "Front bumper lip"},
-            {"label": "Záruka", "value": "1 rok"},
-        ],
-        "features": [
-            "CS inspirovaný design",
-            "Cenově výhodné",
-            "Carbon fiber materiál",
-            "Jednoduché montování",
-            "1 rok záruka",
-            "Univerzální F8X fit",
-        ],
-    },
-    {
-        "name": "3-Dílný Front Lip Splitter BMW M3/M4 G80/G82",
-        "category": "BMW M4 G82 | Exteriér",
-        "price": Decimal("8900"),
-        "image": "https://image.made-in-china.com/3f2j00uPoBmgvnEzqp/Factory-Wholesale-3-Parts-Front-Lip-Splitter-for-BMW-M3-G80-M4-G82-2020-.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00uPoBmgvnEzqp/Factory-Wholesale-3-Parts-Front-Lip-Splitter-for-BMW-M3-G80-M4-G82-2020-.jpg",
-        ],
-        "isNew": True,
-        "description": "Tovární wholesale 3-dílný přední lip splitter pro BMW M3 G80 / M4 G82 (2020+). Dostupné v různých barvách. CE/ISO/BV certifikace.",
-        "specifications": [
-            {"label": "Materiál", "value": "ABS + Carbon pattern"},
-            {"label": "Barvy", "value": "Černá, carbon, custom"},
-            {"label": "Fitment", "value": "OEM"},
-            {"label": "Kompatibilita", "value": "BMW M3 G80 / M4 G82 (2020+)"},
-            {"label": "Montáž", "value": "3-dílná sada"},
-            {"label": "Certifikace", "value": "CE, ISO, BV"},
-        ],
-        "features": [
-            "3-dílná konstrukce",
-            "Více barev dostupných",
-            "Tovární wholesale cena",
-            "CE/ISO certifikace",
-            "Snadná instalace",
-            "Pro nejnovější G80/G82",
-        ],
-    },
-    {
-        "name": "Performance V-Style Karbonový Front Lip BMW M3/M4 G80/G82",
-        "category": "BMW M4 G82 | Exteriér",
-        "price": Decimal("31900"),
-        "image": "https://image.made-in-china.com/3f2j00pZmbkJdGiCcB/Performance-Dry-Carbon-Fiber-V-Style-Front-Bumper-Lip-3PC-for-BMW-M3-M4-G80-G82-S58.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00pZmbkJdGiCcB/Performance-Dry-Carbon-Fiber-V-Style-Front-Bumper-Lip-3PC-for-BMW-M3-M4-G80-G82-S58.jpg",
-        ],
-        "isNew": True,
-        "description": "Performance dry carbon fiber V-style přední bumper lip (3PC) pro BMW M3/M4 G80/G82 S58. Nerezová ocel tělo, 1 rok záruky. Agresivní závodní vzhled.",
-        "specifications": [
-            {"label": "Materiál", "value": "Dry Carbon + Stainless Steel"},
-            {"label": "Povrchová úprava", "value": "V-Style design"},
-            {"label": "Fitment", "value": "Performance"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 G80/G82 S58"},
-            {"label": "Montáž", "value": "3-dílná sada"},
-            {"label": "Záruka", "value": "1 rok"},
-        ],
-        "features": [
-            "V-Style agresivní design",
-            "3-dílná performance sada",
-            "Dry carbon + nerez ocel",
-            "1 rok záruka",
-            "Závodní kvalita",
-            "Pro S58 motor",
-        ],
-    },
-    {
-        "name": "V-Style Karbonový Front Lip BMW M3/M4 G82",
-        "category": "BMW M4 G82 | Exteriér",
-        "price": Decimal("29900"),
-        "image": "https://image.made-in-china.com/3f2j00DNfbrUHEqoqz/V-Style-Carbon-Fiber-Front-Lip-for-BMW-G82-M3-M4.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00DNfbrUHEqoqz/V-Style-Carbon-Fiber-Front-Lip-for-BMW-G82-M3-M4.jpg",
-        ],
-        "isNew": True,
-        "description": "V-style karbonový přední lip pro BMW M3/M4 G82. Customizovatelné logo, ODM services. Premium kvalita s možností personalizace.",
-        "specifications": [
-            {"label": "Materiál", "value": "Carbon Fiber"},
-            {"label": "Povrchová úprava", "value": "V-Style"},
-            {"label": "Fitment", "value": "OEM+"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 G82"},
-            {"label": "Personalizace", "value": "Custom logo možné"},
-            {"label": "Service", "value": "ODM dostupné"},
-        ],
-        "features": [
-            "V-Style design",
-            "Možnost custom loga",
-            "ODM service",
-            "Carbon fiber",
-            "Premium finish",
-            "G82 specific",
-        ],
-    },
-    {
-        "name": "Karbonový Front Bumper Lip BMW M3/M4 G80/G82",
-        "category": "BMW M4 G82 | Exteriér",
-        "price": Decimal("39900"),
-        "image": "https://image.made-in-china.com/3f2j00ZGeoBniMLrqI/Carbon-Fiber-Front-Bumper-Lip-for-BMW-M3-M4-G80-G82-S58.jpg",
-        "images": [
-            "https://image.made-in-china.com/3f2j00ZGeoBniMLrqI/Carbon-Fiber-Front-Bumper-Lip-for-BMW-M3-M4-G80-G82-S58.jpg",
-        ],
-        "isNew": True,
-        "description": "Prémiový karbonový front bumper lip pro BMW M3/M4 G80/G82 S58. 18 měsíců záruky, ocelové tělo, Euro V compliant. Top kvalita.",
-        "specifications": [
-            {"label": "Materiál", "value": "Carbon Fiber + Steel"},
-            {"label": "Povrchová úprava", "value": "Premium gloss"},
-            {"label": "Fitment", "value": "100% OEM"},
-            {"label": "Kompatibilita", "value": "BMW M3/M4 G80/G82 S58"},
-            {"label": "Záruka", "value": "18 měsíců"},
-            {"label": "Certifikace", "value": "Euro V"},
-        ],
-        "features": [
-            "18 měsíců záruka (nejdelší)",
-            "Euro V compliant",
-            "Ocelové tělo + carbon",
-            "Premium gloss finish",
-            "Top kvalita",
-            "Perfect OEM fit",
-        ],
-    },
-]
-
-def upload_products():
-    """Nahraje produkty do DynamoDB"""
-    print(f"🚀 Nahrávání {len(products)} produktů do DynamoDB...")
-    print(f"📦 Tabulka: {TABLE_NAME}")
-    print(f"🌍 Region: {REGION}\n")
-
-    success_count = 0
-    error_count = 0
-
-    for idx, product in enumerate(products, 1):
+_READ_CHUNK = 64 * 1024
+# BatchGetItem bere nejvýš 100 klíčů; stejně velké dávky jdou i do zápisu
+BATCH_SIZE = 100
+# Opakování UnprocessedKeys: náhodná pauza do min(MAX_DELAY, BASE_DELAY * 2^pokus)
+BATCH_GET_BASE_DELAY = 0.05
+BATCH_GET_MAX_DELAY = 5.0
+BATCH_GET_MAX_ATTEMPTS = 10
+# Throttlované zápisy opakuje botocore s exponenciálním backoffem a jitterem
+WRITE_RETRY_CONFIG = Config(retries={'mode': 'standard', 'max_attempts': 10})
+
+
+def stable_product_id(product: Dict[str, Any]) -> str:
+    """Deterministické ID z kategorie a názvu (stejná délka jako ID ze scraperu)"""
+    natural_key = f"{product.get('category', '')}|{product['name']}".strip().casefold()
+    return hashlib.sha256(natural_key.encode('utf-8')).hexdigest()[:24]
+
+
+def _iter_json_array(f) -> Iterator[Dict[str, Any]]:
+    """Čte JSON pole po jednotlivých prvcích, aniž by načítal celý soubor"""
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    buf = f.read(_READ_CHUNK).lstrip()
+    if not buf.startswith('['):
+        raise ValueError('očekáváno JSON pole produktů')
+    buf = buf[1:]
+    eof = False
+    while True:
+        buf = buf.lstrip().lstrip(',').lstrip()
+        if buf.startswith(']'):
+            return
         try:
-            # Přidání ID
-            product['id'] = str(uuid.uuid4())
+            value, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(_READ_CHUNK)
+            eof = not chunk
+            buf += chunk
+            continue
+        yield value
+        buf = buf[end:]
 
-            # Upload do DynamoDB
-            table.put_item(Item=product)
 
-            print(f"✅ [{idx}/{len(products)}] {product['name'][:50]}...")
-            success_count += 1
+def iter_products(path: str) -> Iterator[Dict[str, Any]]:
+    """Produkty z .json (pole) nebo .ndjson/.jsonl (jeden produkt na řádek)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line, parse_float=Decimal)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f'{path}:{line_no}: {e}')
+        else:
+            yield from _iter_json_array(f)
 
-        except Exception as e:
-            print(f"❌ [{idx}/{len(products)}] Chyba: {e}")
-            error_count += 1
 
-    print(f"\n{'='*60}")
-    print(f"✅ Úspěšně nahráno: {success_count}")
-    print(f"❌ Chyby: {error_count}")
-    print(f"📊 Celkem: {len(products)}")
-    print(f"{'='*60}\n")
+def to_item(product: Dict[str, Any], key_names: List[str]) -> Dict[str, Any]:
+    if not product.get('name'):
+        raise ValueError(f'produkt bez názvu: {product!r:.80}')
+    item = dict(product)
+    # DynamoDB neumí float; ceny z JSONu převedeme na Decimal
+    if isinstance(item.get('price'), (int, float)):
+        item['price'] = Decimal(str(item['price']))
+    item['id'] = str(item.get('id') or stable_product_id(item))
+    missing = [k for k in key_names if k not in item]
+    if missing:
+        raise ValueError(f"položce {item['id']} chybí klíč tabulky: {', '.join(missing)}")
+    return item
 
-    if success_count > 0:
-        print("✨ Produkty jsou nyní dostupné na webu!")
-        print("🔗 https://workuj.cz")
 
-if __name__ == "__main__":
-    print("\n" + "="*60)
-    print("  BMW CARBON PARTS - DynamoDB Upload Script")
-    print("="*60 + "\n")
+def item_key(item: Dict[str, Any], key_names: List[str]) -> Tuple:
+    return tuple(item[k] for k in key_names)
+
+
+def iter_items(paths: List[str], key_names: List[str], seen: Set[Tuple]) -> Iterator[Dict[str, Any]]:
+    """Položky ze všech souborů v pořadí čtení; při duplicitním klíči vyhrává první výskyt"""
+    for path in paths:
+        count = 0
+        for product in iter_products(path):
+            item = to_item(product, key_names)
+            count += 1
+            key = item_key(item, key_names)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield item
+        print(f"📄 {path}: {count} produktů")
+
+
+def iter_batches(items: Iterable[Dict[str, Any]], size: int = BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def fetch_existing(dynamodb, table_name: str, key_names: List[str], items: List[Dict[str, Any]]) -> Dict[Tuple, Dict]:
+    """Načte aktuální stav položek po 100 klíčích (BatchGetItem), nezpracované klíče opakuje s backoffem"""
+    existing: Dict[Tuple, Dict] = {}
+    for start in range(0, len(items), BATCH_SIZE):
+        request = {table_name: {'Keys': [{k: i[k] for k in key_names} for i in items[start:start + BATCH_SIZE]]}}
+        attempt = 0
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            for found in resp['Responses'].get(table_name, []):
+                existing[item_key(found, key_names)] = found
+            request = resp.get('UnprocessedKeys') or {}
+            if not request:
+                break
+            attempt += 1
+            if attempt >= BATCH_GET_MAX_ATTEMPTS:
+                pending = len(request.get(table_name, {}).get('Keys', []))
+                raise RuntimeError(f'{pending} klíčů zůstalo nezpracováno ani po {attempt} pokusech')
+            time.sleep(random.uniform(0, min(BATCH_GET_MAX_DELAY, BATCH_GET_BASE_DELAY * (2 ** attempt))))
+    return existing
+
+
+def changed_fields(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Atributy ze souboru, které se liší od tabulky; atributy jen v tabulce zápis nemění"""
+    return sorted(k for k in new if old.get(k) != new[k])
 
-    confirmation = input("Chceš nahrát produkty do DynamoDB? (ano/ne): ")
 
-    if confirmation.lower() in ['ano', 'yes', 'a', 'y']:
-        upload_products()
+def update_request(item: Dict[str, Any], key_names: List[str]) -> Dict[str, Any]:
+    """Parametry UpdateItem, které nastaví všechny neklíčové atributy položky"""
+    attrs = [k for k in item if k not in key_names]
+    return {
+        'Key': {k: item[k] for k in key_names},
+        'UpdateExpression': 'SET ' + ', '.join(f'#a{i} = :v{i}' for i in range(len(attrs))),
+        # Názvy přes placeholdery, protože "name" a další jsou v DynamoDB rezervovaná slova
+        'ExpressionAttributeNames': {f'#a{i}': k for i, k in enumerate(attrs)},
+        'ExpressionAttributeValues': {f':v{i}': item[k] for i, k in enumerate(attrs)},
+    }
+
+
+def iter_changed(dynamodb, table_name: str, key_names: List[str],
+                 batches: Iterable[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+    """Porovná každou dávku s tabulkou, vypíše změny a propustí jen nové/změněné položky"""
+    changed = unchanged = 0
+    for batch in batches:
+        existing = fetch_existing(dynamodb, table_name, key_names, batch)
+        to_write = []
+        for item in batch:
+            old = existing.get(item_key(item, key_names))
+            if old is None:
+                print(f"➕ {item['id']} {item['name'][:60]}")
+                to_write.append(item)
+            elif changed_fields(old, item):
+                print(f"✏️  {item['id']} {item['name'][:60]}: {', '.join(changed_fields(old, item))}")
+                to_write.append(item)
+            else:
+                unchanged += 1
+        changed += len(to_write)
+        if to_write:
+            yield to_write
+    print(f"\nNové/změněné: {changed}, beze změny: {unchanged}")
+
+
+def write_batches(table_name: str, region: str, endpoint_url: Optional[str],
+                  batches: Iterable[List[Dict[str, Any]]], workers: int, key_names: List[str]) -> int:
+    """Zapisuje dávky paralelně, jak přicházejí (UpdateItem po položkách)
+
+    boto3 resource není thread-safe, proto má každé vlákno vlastní session.
+    Rozpracovaných je nejvýš 2× workers dávek, takže čtení souborů čeká na zápis.
+    """
+    written = 0
+    local = threading.local()
+
+    def _write(batch: List[Dict[str, Any]]) -> int:
+        table = getattr(local, 'table', None)
+        if table is None:
+            session = boto3.session.Session(region_name=region)
+            dynamodb = session.resource('dynamodb', endpoint_url=endpoint_url, config=WRITE_RETRY_CONFIG)
+            table = local.table = dynamodb.Table(table_name)
+        for item in batch:
+            table.update_item(**update_request(item, key_names))
+        return len(batch)
+
+    in_flight: Set[concurrent.futures.Future] = set()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        for batch in batches:
+            if len(in_flight) >= workers * 2:
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                written += sum(f.result() for f in done)
+            in_flight.add(ex.submit(_write, batch))
+        written += sum(f.result() for f in concurrent.futures.as_completed(in_flight))
+    return written
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Hromadné nahrání produktů z JSON/NDJSON do DynamoDB')
+    parser.add_argument('files', nargs='*', default=DEFAULT_FILES,
+                        help='Soubory .json (pole) nebo .ndjson/.jsonl (default: products-made-in-china.ndjson)')
+    parser.add_argument('--table-name', default=TABLE_NAME, help=f'DynamoDB tabulka (default: {TABLE_NAME})')
+    parser.add_argument('--region', default=REGION, help=f'AWS region (default: {REGION})')
+    parser.add_argument('--endpoint-url', default=None, help='Vlastní endpoint, např. DynamoDB Local')
+    parser.add_argument('--workers', type=int, default=4, help='Paralelní zapisovací vlákna (default: 4)')
+    parser.add_argument('--diff', action='store_true',
+                        help='Porovnat s tabulkou, vypsat změny a zapsat jen nové/změněné produkty')
+    parser.add_argument('--dry-run', action='store_true', help='Nic nezapisovat, jen ukázat co by se stalo')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    print(f"📦 Tabulka: {args.table_name}")
+    print(f"🌍 Region: {args.region}\n")
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region, endpoint_url=args.endpoint_url)
+    table = dynamodb.Table(args.table_name)
+    if args.dry_run and not args.diff:
+        key_names = ['id']  # bez přístupu k tabulce předpokládáme klíč carbon-parts-products
     else:
-        print("❌ Upload zrušen.")
+        key_names = [k['AttributeName'] for k in table.key_schema]
+
+    # Pamatujeme si jen klíče, položky odcházejí do zápisu po dávkách
+    seen: Set[Tuple] = set()
+    batches = iter_batches(iter_items(args.files, key_names, seen))
+    if args.diff:
+        batches = iter_changed(dynamodb, args.table_name, key_names, batches)
+
+    if args.dry_run:
+        would_write = 0
+        for batch in batches:
+            if not args.diff:
+                for item in batch:
+                    print(f"• {item['id']} {item['name'][:60]}")
+            would_write += len(batch)
+        print(f"\n🔍 Dry run: zapsáno by bylo {would_write} produktů, nic nebylo změněno.")
+        return 0
+
+    written = write_batches(args.table_name, args.region, args.endpoint_url, batches, max(1, args.workers), key_names)
+    print(f"\n{'='*60}")
+    print(f"✅ Zapsáno: {written}")
+    print(f"📊 Celkem v souborech: {len(seen)}")
+    print(f"{'='*60}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
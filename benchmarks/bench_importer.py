@@ -0,0 +1,307 @@
+"""Offline throughput benchmark for scrape_made_in_china_m3_lip.py.
+
+Serves synthetic (or recorded, see --recorded-dir) search pages and images
+from a local HTTP server, runs the importer's main() against an in-process
+moto DynamoDB, and reports products/sec, pages/sec, parse µs/card, peak RSS
+and write throughput per catalog size. Each size runs in its own subprocess
+so peak RSS is measured per size.
+
+    python benchmarks/bench_importer.py --sizes 100,1000,10000,100000
+    python benchmarks/bench_importer.py --baseline benchmarks/results/baseline.json
+
+Copy a results file to benchmarks/results/baseline.json to make it the
+reference; --baseline exits non-zero when throughput or parse speed regress
+beyond --tolerance.
+
+Requires `pip install moto[dynamodb]`.
+"""
+
+import argparse
+import glob
+import http.server
+import io
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scrape_made_in_china_m3_lip as importer  # noqa: E402
+
+
+DEFAULT_RESULTS = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+TABLE_NAME = "bench-products"
+
+CARD_TEMPLATE = """
+<div class="list-node product-item" data-s-virtual="1">
+  <div class="img-wrap"><a href="/p/{n}.html" title="Dry Carbon Fiber Front Lip for BMW M3 G80 M4 G82 #{n}" rel="nofollow"><img data-original="{base}/img/{n}.jpg" src="data:,"></a></div>
+  <h2 class="product-name"><a href="/p/{n}.html" title="Dry Carbon Fiber Front Lip for BMW M3 G80 M4 G82 #{n}">Dry <strong>Carbon</strong> Front Lip #{n}</a></h2>
+  <div class="price-info"><strong class="price">US${price}.00-{price_hi}.00</strong> / Piece</div>
+  <div class="info"><span>1 Piece</span> (MOQ)</div>
+  <div class="company-info"><a href="https://supplier{s}.en.made-in-china.com/company-Info.html" title="Guangzhou Carbon Parts Co. {s}">Guangzhou Carbon Parts Co. {s}</a></div>
+</div>
+"""
+
+
+def synthetic_page(page: int, per_page: int, total: int, base: str) -> bytes:
+    start = (page - 1) * per_page
+    cards = []
+    for n in range(start, min(start + per_page, total)):
+        price = 100 + n % 400
+        cards.append(CARD_TEMPLATE.format(n=n, base=base, price=price, price_hi=price + 50, s=n % 97))
+    body = "".join(cards)
+    return f"<!DOCTYPE html><html><head><meta charset='utf-8'></head><body><div class='prod-list'>{body}</div></body></html>".encode("utf-8")
+
+
+def load_recorded_pages(recorded_dir: str) -> List[str]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(recorded_dir, "*.html"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append(f.read())
+    if not pages:
+        raise SystemExit(f"No *.html pages in {recorded_dir}")
+    return pages
+
+
+_HREF_RE = re.compile(r'href="([^"#]+\.html)"')
+_IMAGE_HOST_RE = re.compile(r"(?:https?:)?//image\.made-in-china\.com/")
+
+
+def scaled_recorded_page(pages: List[str], page: int, base: str) -> bytes:
+    # Recorded pages are reused round-robin; a per-page fragment keeps product URLs unique
+    html = pages[(page - 1) % len(pages)]
+    html = _HREF_RE.sub(lambda m: f'href="{m.group(1)}#bench-p{page}"', html)
+    html = _IMAGE_HOST_RE.sub(f"{base}/img/", html)
+    return html.encode("utf-8")
+
+
+def tiny_jpeg() -> bytes:
+    try:
+        from PIL import Image
+    except ImportError:
+        # Not a decodable image, but downloads only hash and store the bytes
+        return b"\xff\xd8\xff\xe0" + b"\x00" * 2048 + b"\xff\xd9"
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 240), (40, 40, 40)).save(buf, "JPEG", quality=70)
+    return buf.getvalue()
+
+
+class StandInServer:
+    """Local made-in-china.com stand-in serving /search?page=N and /img/<n>.jpg."""
+
+    def __init__(self, total: int, per_page: int, recorded: Optional[List[str]] = None) -> None:
+        image = tiny_jpeg()
+        state = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # noqa: N802 - http.server API
+                parts = urlsplit(self.path)
+                if parts.path.startswith("/img/"):
+                    body, content_type = image, "image/jpeg"
+                else:
+                    page = int(parse_qs(parts.query).get("page", ["1"])[0])
+                    if recorded:
+                        body = scaled_recorded_page(recorded, page, state.base) if page <= state.pages else b"<html></html>"
+                    else:
+                        body = synthetic_page(page, per_page, total, state.base)
+                    content_type = "text/html; charset=utf-8"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self.pages = max(1, -(-total // per_page))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def measure_parse(per_page: int, engines: List[str], repeat: int = 5) -> Dict[str, float]:
+    """Parse µs per card for each installed parser engine on one synthetic page."""
+    html = synthetic_page(1, per_page, per_page, "http://127.0.0.1").decode("utf-8")
+    out: Dict[str, float] = {}
+    for engine in engines:
+        try:
+            cards = len(importer.parse_products_from_page(html, engine))
+        except RuntimeError:
+            continue  # engine not installed
+        started = time.perf_counter()
+        for _ in range(repeat):
+            importer.parse_products_from_page(html, engine)
+        out[engine] = (time.perf_counter() - started) / repeat / max(1, cards) * 1e6
+    return out
+
+
+def run_size(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one end-to-end import in this process (called in a child process)."""
+    try:
+        import boto3
+        from moto import mock_aws
+    except ImportError:
+        raise SystemExit("The benchmark needs `pip install moto[dynamodb]`")
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-central-1")
+    recorded = load_recorded_pages(args.recorded_dir) if args.recorded_dir else None
+    with tempfile.TemporaryDirectory() as work, StandInServer(size, args.per_page, recorded) as server, mock_aws():
+        boto3.client("dynamodb").create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        report_path = os.path.join(work, "report.json")
+        argv = [
+            "--url", f"{server.base}/search?word=M3+lip",
+            "--pages", str(server.pages),
+            "--delay-sec", "0",
+            "--concurrency", str(args.concurrency),
+            "--parser", args.parser,
+            "--table-name", TABLE_NAME,
+            "--download-dir", os.path.join(work, "images"),
+            "--change-index", os.path.join(work, "change-index.sqlite3"),
+            # Journal and page archive stay on, as in a default run, but inside the scratch directory
+            "--journal", os.path.join(work, "journal.sqlite3"),
+            "--archive-dir", os.path.join(work, "page-archive"),
+            "--no-cache",
+            "--report-json", report_path,
+        ]
+        started = time.perf_counter()
+        importer.main(argv)
+        elapsed = time.perf_counter() - started
+        with open(report_path, encoding="utf-8") as f:
+            report = json.load(f)
+
+    written = (report.get("summary") or {}).get("inserted", 0) + (report.get("summary") or {}).get("updated", 0)
+    write_sec = sum(
+        h["sum"] for h in report["histograms"]
+        if h["name"] == "dynamodb_request_seconds" and h["labels"].get("operation") == "BatchWriteItem"
+    )
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return {
+        "size": size,
+        "pages": server.pages,
+        "elapsedSec": round(elapsed, 3),
+        "productsPerSec": round(written / elapsed, 1) if elapsed else 0.0,
+        "pagesPerSec": round(server.pages / elapsed, 2) if elapsed else 0.0,
+        "writeItemsPerSec": round(written / write_sec, 1) if write_sec else None,
+        "peakRssMb": round(peak_rss / 1024 / 1024, 1),
+        "written": written,
+        "stages": report["stages"],
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions versus `baseline` beyond `tolerance` (0.2 = 20%)."""
+    problems = []
+    base_runs = {r["size"]: r for r in baseline.get("runs", [])}
+    for run in results["runs"]:
+        ref = base_runs.get(run["size"])
+        if ref and run["productsPerSec"] < ref["productsPerSec"] * (1 - tolerance):
+            problems.append(f"size {run['size']}: {run['productsPerSec']} products/s vs baseline {ref['productsPerSec']}")
+    for engine, us in results["parseMicrosPerCard"].items():
+        ref_us = baseline.get("parseMicrosPerCard", {}).get(engine)
+        if ref_us and us > ref_us * (1 + tolerance):
+            problems.append(f"parser {engine}: {us:.1f} µs/card vs baseline {ref_us:.1f}")
+    return problems
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline importer benchmark against a local site and DynamoDB stand-in")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Catalog sizes to run (default: 100,1000,10000)")
+    parser.add_argument("--per-page", type=int, default=40, help="Products per synthetic search page (default: 40)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Importer --concurrency (default: 8)")
+    parser.add_argument(
+        "--parser", default=importer.DEFAULT_PARSER_ENGINE, choices=sorted(importer.PARSER_ENGINES),
+        help=f"Importer --parser (default: {importer.DEFAULT_PARSER_ENGINE})",
+    )
+    parser.add_argument("--recorded-dir", default=None, help="Serve saved search pages (*.html) instead of synthetic ones")
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help="Where to store the results JSON")
+    parser.add_argument("--baseline", default=None, help="Results JSON to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown versus baseline (default: 0.2)")
+    parser.add_argument("--run-size", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.run_size is not None:
+        # Child process: the importer's own prints go to stderr so stdout carries only the JSON result
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        result = run_size(args.run_size, args)
+        stdout.write(json.dumps(result) + "\n")
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results: Dict[str, Any] = {
+        "createdAt": int(time.time()),
+        "parser": args.parser,
+        "perPage": args.per_page,
+        "concurrency": args.concurrency,
+        "parseMicrosPerCard": measure_parse(args.per_page, sorted(importer.PARSER_ENGINES)),
+        "runs": [],
+    }
+    for engine, us in results["parseMicrosPerCard"].items():
+        print(f"parse[{engine}]: {us:.1f} µs/card")
+    child_args = [a for a in (argv if argv is not None else sys.argv[1:])]
+    for size in sizes:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *child_args, "--run-size", str(size)],
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        results["runs"].append(run)
+        print(
+            f"size={size}: {run['productsPerSec']} products/s, {run['pagesPerSec']} pages/s, "
+            f"writes {run['writeItemsPerSec']} items/s, peak RSS {run['peakRssMb']} MB"
+        )
+
+    importer.ensure_dir(os.path.dirname(os.path.abspath(args.output)))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
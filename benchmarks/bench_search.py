@@ -0,0 +1,183 @@
+"""Latency benchmark for the offline search index (search_index.py).
+
+Builds an index from a synthetic catalog per size, then reports full build
+time, incremental rebuild time after changing 1% of the products, index
+and JSON export sizes, open time and query latency percentiles for a mix
+of exact, fuzzy and faceted queries.
+
+    python benchmarks/bench_search.py --sizes 1000,10000,100000
+    python benchmarks/bench_search.py --baseline benchmarks/results/search-baseline.json
+
+--baseline exits non-zero when p95 query latency regresses beyond --tolerance.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import search_index  # noqa: E402
+
+
+DEFAULT_RESULTS = os.path.join(ROOT, "benchmarks", "results", "search-latest.json")
+
+CHASSIS = ("E90", "E92", "F80", "F82", "G80", "G82", "G87", "other")
+PARTS = (
+    "Front Lip", "Front Splitter", "Rear Diffuser", "Side Skirts", "Mirror Covers", "Trunk Spoiler",
+    "Hood Vent", "Kidney Grille", "Rear Canards", "Roof Spoiler", "Steering Wheel Trim", "Interior Trim",
+)
+MATERIALS = ("Carbon Fiber", "Dry Carbon", "Forged Carbon", "ABS Gloss Black", "Prepreg Carbon")
+MODELS = ("M3", "M4", "M2", "340i", "M340i", "430i")
+DESCRIPTIONS = (
+    "Přední spoiler z karbonu, montáž bez vrtání",
+    "Zadní difuzor s lesklým lakem",
+    "Boční prahy, kompletní sada",
+    "Kryty zrcátek, výměnný typ",
+    "",
+)
+QUERIES: Tuple[Tuple[str, Dict[str, str]], ...] = (
+    ("g82", {}),
+    ("M4 lip", {}),
+    ("carbon front lip", {}),
+    ("dry carbon diffuser", {}),
+    ("predni spoiler", {}),
+    ("difusor", {}),
+    ("splitter", {"chassis": "G80"}),
+    ("carbon", {"price": "100-200"}),
+    ("", {"chassis": "F82"}),
+    ("mirror covers m3", {"chassis": "G80", "price": "50-100"}),
+)
+
+
+def synthetic_item(n: int, rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    chassis = rng.choice(CHASSIS)
+    model = rng.choice(MODELS)
+    name = f"{rng.choice(MATERIALS)} {rng.choice(PARTS)} for BMW {model} {chassis if chassis != 'other' else ''} #{n}"
+    item = {
+        "id": f"{n:08d}",
+        "name": " ".join(name.split()),
+        "description": rng.choice(DESCRIPTIONS),
+        "price": Decimal(rng.choice((0, rng.randint(20, 1500)))),
+        "image": f"https://cdn.example.com/{n}.jpg",
+        "category": "BMW M3/M4 | Exteriér",
+        "chassis": chassis,
+        "isNew": rng.random() < 0.1,
+        "contentHash": f"{n}-0",
+    }
+    return json.dumps({"pk": f"prod#{n}"}), item
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_size(size: int, repeat: int) -> Dict[str, Any]:
+    rng = random.Random(size)
+    items = [synthetic_item(n, rng) for n in range(size)]
+    with tempfile.TemporaryDirectory() as work:
+        builder = search_index.SearchIndexBuilder(work)
+        started = time.perf_counter()
+        builder.sync(items)
+        builder.write()
+        build_sec = time.perf_counter() - started
+
+        for key, item in rng.sample(items, max(1, size // 100)):
+            item["price"] += 1
+            item["contentHash"] = item["contentHash"].replace("-0", "-1")
+        started = time.perf_counter()
+        builder.sync(items)
+        builder.write()
+        incremental_sec = time.perf_counter() - started
+        reanalyzed = builder.analyzed - size
+        builder.close()
+
+        index_bytes = os.path.getsize(os.path.join(work, search_index.INDEX_FILE))
+        json_bytes = os.path.getsize(os.path.join(work, search_index.JSON_FILE))
+        started = time.perf_counter()
+        index = search_index.SearchIndex.open(work)
+        open_ms = (time.perf_counter() - started) * 1000
+        per_query: Dict[str, List[float]] = {}
+        all_ms: List[float] = []
+        with index:
+            for _ in range(repeat):
+                for query, filters in QUERIES:
+                    started = time.perf_counter()
+                    index.search(query, **filters)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    per_query.setdefault(f"{query}|{json.dumps(filters)}", []).append(elapsed)
+                    all_ms.append(elapsed)
+    return {
+        "size": size,
+        "buildSec": round(build_sec, 3),
+        "incrementalSec": round(incremental_sec, 3),
+        "reanalyzed": reanalyzed,
+        "indexBytes": index_bytes,
+        "jsonBytes": json_bytes,
+        "openMs": round(open_ms, 3),
+        "p50Ms": round(percentile(all_ms, 50), 3),
+        "p95Ms": round(percentile(all_ms, 95), 3),
+        "p99Ms": round(percentile(all_ms, 99), 3),
+        "queries": {q: round(percentile(ms, 50), 3) for q, ms in per_query.items()},
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    problems = []
+    base_runs = {r["size"]: r for r in baseline.get("runs", [])}
+    for run in results["runs"]:
+        ref = base_runs.get(run["size"])
+        if ref and run["p95Ms"] > ref["p95Ms"] * (1 + tolerance):
+            problems.append(f"size {run['size']}: p95 {run['p95Ms']} ms vs baseline {ref['p95Ms']} ms")
+    return problems
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Search index build and query latency benchmark")
+    parser.add_argument("--sizes", default="1000,10000", help="Catalog sizes to run (default: 1000,10000)")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of the query mix per size (default: 20)")
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help="Where to store the results JSON")
+    parser.add_argument("--baseline", default=None, help="Results JSON to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown versus baseline (default: 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results: Dict[str, Any] = {"createdAt": int(time.time()), "repeat": args.repeat, "runs": []}
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        run = run_size(size, args.repeat)
+        results["runs"].append(run)
+        print(
+            f"size={size}: build {run['buildSec']}s, incremental {run['incrementalSec']}s "
+            f"({run['reanalyzed']} re-analyzed), index {run['indexBytes'] / 1024:.0f} KiB, "
+            f"json {run['jsonBytes'] / 1024:.0f} KiB, open {run['openMs']} ms, "
+            f"query p50 {run['p50Ms']} ms p95 {run['p95Ms']} ms p99 {run['p99Ms']} ms"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
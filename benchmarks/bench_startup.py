@@ -0,0 +1,153 @@
+"""Start-up time benchmark for the scrape_made_in_china_m3_lip.py CLI.
+
+Times fresh interpreter processes for `scrape --help`, parse-only runs
+(`scrape --html` on a saved page, with the default engine and per installed
+parser engine) and a bare `import`, next to `python -c pass` as the floor
+every command pays. Each case is also run once under -X importtime to list
+which of the heavy libraries (boto3, botocore, requests, PIL, pyarrow and
+the parser engines) it loaded.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 50 --budget-ms 80
+
+The module's bytecode is compiled first and the commands run with -m, so
+the numbers match an installed CLI rather than a first run that compiles
+the source. Exits non-zero when any command loads boto3, botocore,
+requests, PIL or pyarrow, or when the median wall time of `scrape --help`,
+the default parse-only run or one with lxml or selectolax exceeds
+--budget-ms. The budget is absolute: it includes the interpreter's own
+start-up, which is reported separately as the `python` case. An explicit
+bs4 run is reported only, since bs4 is the default engine (and then held to
+the budget as parse[default]) only when lxml is not installed.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import py_compile
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_importer import synthetic_page  # noqa: E402
+
+
+MODULE = "scrape_made_in_china_m3_lip"
+DEFAULT_RESULTS = os.path.join(ROOT, "benchmarks", "results", "startup-latest.json")
+HEAVY_MODULES = ("boto3", "botocore", "requests", "PIL", "pyarrow", "bs4", "lxml", "selectolax")
+# Parser engines load their own library; no start-up path may touch AWS, HTTP, image or Parquet libraries
+FORBIDDEN_MODULES = ("boto3", "botocore", "requests", "PIL", "pyarrow")
+_IMPORTTIME_RE = re.compile(r"^import time:\s+\d+ \|\s+\d+ \|\s*([\w.]+)$")
+
+
+def cases(page_path: str) -> List[Tuple[str, List[str], bool]]:
+    """(name, python arguments, held to --budget-ms) per measured command."""
+    out = [
+        ("python", ["-c", "pass"], False),
+        ("import", ["-c", f"import {MODULE}"], False),
+        ("scrape --help", ["-m", MODULE, "scrape", "--help"], True),
+        # What a user gets without --parser: lxml when installed, bs4 otherwise
+        ("parse[default]", ["-m", MODULE, "scrape", "--html", page_path, "--output", os.devnull], True),
+    ]
+    for engine in ("selectolax", "lxml", "bs4"):
+        if importlib.util.find_spec(engine) is None:
+            continue
+        out.append(
+            (
+                f"parse[{engine}]",
+                ["-m", MODULE, "scrape", "--html", page_path, "--parser", engine, "--output", os.devnull],
+                engine != "bs4",
+            )
+        )
+    return out
+
+
+def run_once(args: List[str], env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def loaded_heavy_modules(args: List[str], env: Dict[str, str]) -> List[str]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], env=env, check=True, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True,
+    )
+    names = {m.group(1).split(".")[0] for m in map(_IMPORTTIME_RE.match, proc.stderr.splitlines()) if m}
+    return sorted(names & set(HEAVY_MODULES))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="CLI start-up time benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="Processes started per command (default: 20)")
+    parser.add_argument("--cards", type=int, default=40, help="Products on the parsed search page (default: 40)")
+    parser.add_argument(
+        "--budget-ms", type=float, default=100.0,
+        help="Allowed median wall time, interpreter start-up included, for help and parse-only runs (default: 100)",
+    )
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help="Where to store the results JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    py_compile.compile(os.path.join(ROOT, f"{MODULE}.py"), doraise=True)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+    results: Dict[str, Any] = {"createdAt": int(time.time()), "repeat": args.repeat, "budgetMs": args.budget_ms}
+    runs: List[Dict[str, Any]] = []
+    problems = []
+    with tempfile.TemporaryDirectory() as work:
+        page_path = os.path.join(work, "search.html")
+        with open(page_path, "wb") as f:
+            f.write(synthetic_page(1, args.cards, args.cards, "https://image.made-in-china.com"))
+        floor = None
+        for name, cmd, budgeted in cases(page_path):
+            run_once(cmd, env)  # warm the OS file cache
+            times = [run_once(cmd, env) for _ in range(args.repeat)]
+            median = percentile(times, 50)
+            floor = median if floor is None else floor
+            run = {
+                "case": name,
+                "medianMs": round(median, 1),
+                "p95Ms": round(percentile(times, 95), 1),
+                "overMs": round(median - floor, 1),
+                "heavyModules": loaded_heavy_modules(cmd, env),
+            }
+            runs.append(run)
+            print(
+                f"{name:<18} median {run['medianMs']:7.1f} ms  p95 {run['p95Ms']:7.1f} ms  "
+                f"+{run['overMs']:6.1f} ms over python  loads: {', '.join(run['heavyModules']) or '-'}"
+            )
+            if budgeted and run["medianMs"] > args.budget_ms:
+                problems.append(
+                    f"{name}: median {run['medianMs']} ms ({run['overMs']} ms over the interpreter), "
+                    f"budget {args.budget_ms} ms"
+                )
+            forbidden = sorted(set(run["heavyModules"]) & set(FORBIDDEN_MODULES))
+            if forbidden:
+                problems.append(f"{name}: loads {', '.join(forbidden)}")
+    results["runs"] = runs
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {args.output}")
+    for problem in problems:
+        print(f"OVER BUDGET {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,384 @@
+import argparse
+import base64
+import concurrent.futures
+import datetime
+import decimal
+import gzip
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional, Dict, Any, Iterator
+
+import boto3
+from boto3.dynamodb.types import Binary, TypeDeserializer
+
+from io_utils import plain_number, write_atomic
+from scrape_made_in_china_m3_lip import DynamoBulkWriter, ensure_dir
+
+
+MANIFEST_NAME = "manifest.json"
+CHECKPOINT_DIR = "checkpoints"
+# Rows per Parquet row group, and the most rows held in memory while writing one
+PARQUET_ROW_GROUP_SIZE = 50_000
+
+
+@dataclass
+class SegmentCheckpoint:
+    segment: int
+    parts: List[str] = field(default_factory=list)
+    items: int = 0
+    # ExclusiveStartKey for the next page; None with done=False means "not started"
+    last_evaluated_key: Optional[Dict[str, Any]] = None
+    done: bool = False
+
+
+def _checkpoint_path(out_dir: str, segment: int) -> str:
+    return os.path.join(out_dir, CHECKPOINT_DIR, f"segment-{segment:04d}.json")
+
+
+def _load_checkpoint(out_dir: str, segment: int) -> SegmentCheckpoint:
+    path = _checkpoint_path(out_dir, segment)
+    if not os.path.exists(path):
+        return SegmentCheckpoint(segment=segment)
+    with open(path, "r", encoding="utf-8") as f:
+        return SegmentCheckpoint(**json.load(f))
+
+
+def _save_checkpoint(out_dir: str, checkpoint: SegmentCheckpoint) -> None:
+    write_atomic(_checkpoint_path(out_dir, checkpoint.segment), json.dumps(asdict(checkpoint)))
+
+
+def _encode_binary(value: Any) -> Any:
+    # The low-level client returns B/BS values as bytes; store them base64 like DynamoDB's own exports
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_binary(attr: Dict[str, Any]) -> Dict[str, Any]:
+    """Reverse _encode_binary on one DynamoDB-JSON attribute value (recursing into maps and lists)."""
+    (kind, value), = attr.items()
+    if kind == "B":
+        return {"B": base64.b64decode(value)}
+    if kind == "BS":
+        return {"BS": [base64.b64decode(v) for v in value]}
+    if kind == "M":
+        return {"M": {k: _decode_binary(v) for k, v in value.items()}}
+    if kind == "L":
+        return {"L": [_decode_binary(v) for v in value]}
+    return attr
+
+
+class _PartWriter:
+    """Gzipped NDJSON part (plus optional Parquet twin) that only gets its final name when complete."""
+
+    def __init__(self, out_dir: str, name: str, parquet: bool) -> None:
+        self.out_dir = out_dir
+        self.name = name
+        self.parquet = parquet
+        self.items = 0
+        self._tmp_path = os.path.join(out_dir, f"{name}.ndjson.gz.tmp")
+        self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8")
+
+    def write(self, item: Dict[str, Any]) -> None:
+        self._file.write(json.dumps({"Item": item}, separators=(",", ":"), default=_encode_binary))
+        self._file.write("\n")
+        self.items += 1
+
+    def close(self) -> List[str]:
+        self._file.close()
+        ndjson_path = os.path.join(self.out_dir, f"{self.name}.ndjson.gz")
+        os.replace(self._tmp_path, ndjson_path)
+        files = [f"{self.name}.ndjson.gz"]
+        if self.parquet:
+            # Converted from the finished part instead of rows kept in memory for the whole part
+            _write_parquet(os.path.join(self.out_dir, f"{self.name}.parquet"), ndjson_path)
+            files.append(f"{self.name}.parquet")
+        return files
+
+
+def _plain(value: Any) -> Any:
+    """Deserialized DynamoDB value as plain JSON-able Python (numbers, base64 binaries, sorted sets)."""
+    if isinstance(value, decimal.Decimal):
+        return plain_number(value)
+    if isinstance(value, Binary):
+        return base64.b64encode(value.value).decode("ascii")
+    if isinstance(value, set):
+        return sorted(_plain(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _parquet_batches(ndjson_path: str) -> Iterator[List[Dict[str, Any]]]:
+    """Items of an NDJSON part as flat rows, PARQUET_ROW_GROUP_SIZE at a time."""
+    batch: List[Dict[str, Any]] = []
+    for item in iter_export_items(ndjson_path):
+        row = {}
+        for name, value in item.items():
+            value = _plain(value)
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+            row[name] = value
+        batch.append(row)
+        if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write_parquet(path: str, ndjson_path: str) -> None:
+    """Flat Parquet for analysis: scalar attributes as columns, lists/maps as JSON strings.
+
+    Streams one row group at a time. Items need not share attributes, so a
+    first pass over the part settles the columns (an int column seen as
+    float elsewhere becomes double) before the second writes the rows.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+    schemas = []
+    for batch in _parquet_batches(ndjson_path):
+        # from_pylist alone would take the columns from the first row only
+        names = dict.fromkeys(name for row in batch for name in row)
+        schemas.append(pa.Table.from_pydict({name: [row.get(name) for row in batch] for name in names}).schema)
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    tmp_path = f"{path}.tmp"
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        for batch in _parquet_batches(ndjson_path):
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    os.replace(tmp_path, path)
+
+
+def _export_segment(
+    client: Any,
+    table_name: str,
+    out_dir: str,
+    segment: int,
+    total_segments: int,
+    items_per_part: int,
+    parquet: bool,
+) -> SegmentCheckpoint:
+    """Scan one segment into part files, checkpointing after every completed part."""
+    checkpoint = _load_checkpoint(out_dir, segment)
+    if checkpoint.done:
+        return checkpoint
+    kwargs: Dict[str, Any] = {"TableName": table_name, "Segment": segment, "TotalSegments": total_segments}
+    if checkpoint.last_evaluated_key:
+        kwargs["ExclusiveStartKey"] = checkpoint.last_evaluated_key
+
+    part: Optional[_PartWriter] = None
+    while True:
+        resp = client.scan(**kwargs)
+        for item in resp.get("Items", []):
+            if part is None:
+                part = _PartWriter(out_dir, f"segment-{segment:04d}-part-{len(checkpoint.parts):05d}", parquet)
+            part.write(item)
+        last_key = resp.get("LastEvaluatedKey")
+        # A part is only closed on a page boundary, where the scan position is known
+        if part is not None and (part.items >= items_per_part or last_key is None):
+            checkpoint.items += part.items
+            checkpoint.parts.extend(part.close())
+            checkpoint.last_evaluated_key = last_key
+            part = None
+        if last_key is None:
+            checkpoint.done = True
+            _save_checkpoint(out_dir, checkpoint)
+            return checkpoint
+        if part is None:
+            checkpoint.last_evaluated_key = last_key
+            _save_checkpoint(out_dir, checkpoint)
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def export_table(
+    table_name: str,
+    out_dir: str,
+    segments: int = 8,
+    items_per_part: int = 100_000,
+    parquet: bool = False,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Parallel Scan of `table_name` into gzipped NDJSON parts under `out_dir`; returns the manifest.
+
+    Each of `segments` Scan segments runs in its own thread with its own
+    client and streams pages straight to disk. Progress is checkpointed per
+    segment whenever a part file is complete, so rerunning the same export
+    into the same directory resumes where it stopped. Like any Scan, this is
+    not a point-in-time snapshot of a table that is being written to.
+    """
+    ensure_dir(os.path.join(out_dir, CHECKPOINT_DIR))
+    session = boto3.session.Session(region_name=region_name)
+    description = session.client("dynamodb", endpoint_url=endpoint_url).describe_table(TableName=table_name)["Table"]
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous["table"] != table_name or previous["segments"] != segments:
+            raise RuntimeError(
+                f"{out_dir} holds an export of {previous['table']} with {previous['segments']} segments; "
+                "use an empty directory"
+            )
+    manifest: Dict[str, Any] = {
+        "table": table_name,
+        "segments": segments,
+        "keySchema": description["KeySchema"],
+        "attributeDefinitions": description["AttributeDefinitions"],
+        "startedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "complete": False,
+    }
+    write_atomic(manifest_path, json.dumps(manifest, indent=2))
+
+    # Sessions are not thread-safe; build one client per segment up front
+    clients = [
+        boto3.session.Session(region_name=region_name).client("dynamodb", endpoint_url=endpoint_url)
+        for _ in range(segments)
+    ]
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=segments) as ex:
+        futures = [
+            ex.submit(_export_segment, clients[n], table_name, out_dir, n, segments, items_per_part, parquet)
+            for n in range(segments)
+        ]
+        checkpoints = [f.result() for f in futures]
+
+    manifest.update(
+        complete=True,
+        finishedAt=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        items=sum(c.items for c in checkpoints),
+        parts=[p for c in checkpoints for p in c.parts],
+    )
+    write_atomic(manifest_path, json.dumps(manifest, indent=2))
+    elapsed = time.perf_counter() - started
+    print(f"Exported {manifest['items']} items in {elapsed:.1f}s into {len(manifest['parts'])} files")
+    return manifest
+
+
+def iter_export_items(path: str) -> Iterator[Dict[str, Any]]:
+    """Items of one NDJSON part, deserialized to the Python types boto3's resource API uses."""
+    deserializer = TypeDeserializer()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                raw = json.loads(line)["Item"]
+                yield {k: deserializer.deserialize(_decode_binary(v)) for k, v in raw.items()}
+
+
+def restore_table(
+    in_dir: str,
+    table_name: str,
+    workers: int = 8,
+    max_wcu_per_sec: Optional[float] = None,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+) -> int:
+    """Write every item of a complete export into `table_name` (which must have the same key schema)."""
+    with open(os.path.join(in_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if not manifest.get("complete"):
+        raise RuntimeError(f"{in_dir} holds an unfinished export; rerun the export first")
+    session = boto3.session.Session(region_name=region_name)
+    target = session.client("dynamodb", endpoint_url=endpoint_url).describe_table(TableName=table_name)["Table"]
+    if target["KeySchema"] != manifest["keySchema"]:
+        raise RuntimeError(f"Key schema of {table_name} {target['KeySchema']} differs from the export's")
+    key_names = [k["AttributeName"] for k in manifest["keySchema"]]
+
+    parts = [os.path.join(in_dir, p) for p in manifest["parts"] if p.endswith(".ndjson.gz")]
+    restored = 0
+    lock = threading.Lock()
+    started = time.perf_counter()
+    with DynamoBulkWriter(
+        table_name,
+        key_names,
+        region_name=region_name,
+        endpoint_url=endpoint_url,
+        workers=workers,
+        max_wcu_per_sec=max_wcu_per_sec,
+    ) as writer:
+
+        def _restore_part(path: str) -> None:
+            nonlocal restored
+            count = 0
+            for item in iter_export_items(path):
+                writer.put_item(Item=item)
+                count += 1
+            with lock:
+                restored += count
+
+        # Parts are read in parallel; the writer's threads do the BatchWriteItem calls
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, max(1, len(parts)))) as ex:
+            list(ex.map(_restore_part, parts))
+    elapsed = time.perf_counter() - started
+    print(f"Restored {restored} items into {table_name} in {elapsed:.1f}s")
+    return restored
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export a DynamoDB table to sharded NDJSON (and Parquet) with a parallel Scan, or restore one",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Parallel Scan into gzipped NDJSON parts; resumes an unfinished export")
+    export.add_argument("--table-name", required=True, help="DynamoDB table to export")
+    export.add_argument("--out", required=True, help="Output directory (rerun with the same one to resume)")
+    export.add_argument("--segments", type=int, default=8, help="Parallel Scan segments/threads (default: 8)")
+    export.add_argument(
+        "--items-per-part",
+        type=int,
+        default=100_000,
+        help="Start a new part file (and checkpoint) after this many items (default: 100000)",
+    )
+    export.add_argument("--parquet", action="store_true", help="Also write a Parquet file per part (needs pyarrow)")
+
+    restore = sub.add_parser("restore", help="Load an export back into a table through parallel batch writers")
+    restore.add_argument("--table-name", required=True, help="Target DynamoDB table (same key schema)")
+    restore.add_argument("--from", dest="source", required=True, help="Directory of a complete export")
+    restore.add_argument("--write-workers", type=int, default=8, help="Parallel writer threads (default: 8)")
+    restore.add_argument(
+        "--max-wcu",
+        type=float,
+        default=None,
+        help="Cap on estimated write capacity units per second (default: no cap)",
+    )
+
+    for sp in (export, restore):
+        sp.add_argument("--aws-region", default=None, help="AWS region (default: boto3 environment)")
+        sp.add_argument("--dynamodb-endpoint-url", default=None, help="Custom endpoint, e.g. DynamoDB Local")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.command == "export":
+        export_table(
+            args.table_name,
+            args.out,
+            segments=args.segments,
+            items_per_part=args.items_per_part,
+            parquet=args.parquet,
+            region_name=args.aws_region,
+            endpoint_url=args.dynamodb_endpoint_url,
+        )
+    else:
+        restore_table(
+            args.source,
+            args.table_name,
+            workers=args.write_workers,
+            max_wcu_per_sec=args.max_wcu,
+            region_name=args.aws_region,
+            endpoint_url=args.dynamodb_endpoint_url,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
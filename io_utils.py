@@ -0,0 +1,40 @@
+"""JSON and file helpers shared by the importer, the DynamoDB export and the search index.
+
+Standard library only: the search index imports this on its query path.
+"""
+
+import decimal
+import os
+import threading
+from typing import Any, Union
+
+
+def plain_number(value: Any) -> Any:
+    """A DynamoDB number (Decimal) as int or float; any other value unchanged."""
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def json_default(value: Any) -> Any:
+    """`default=` for json.dumps of items read back from DynamoDB, which hands numbers back as Decimal."""
+    if isinstance(value, decimal.Decimal):
+        return plain_number(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_atomic(path: str, data: Union[str, bytes]) -> None:
+    """Replace `path` with `data` (str is written as UTF-8); readers never see a partial file."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    # Unique per process and thread: the same path may be written concurrently
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,22 +1,71 @@
 import argparse
+import array
+import codecs
+import collections
 import concurrent.futures
+import contextlib
+import datetime
+import decimal
+import gzip
 import hashlib
+import importlib.util
+import itertools
+import json
+import math
+import mimetypes
+import operator
 import os
+import queue
+import random
 import re
+import sqlite3
 import sys
+import tempfile
+import threading
 import time
-from dataclasses import dataclass, asdict
-from typing import List, Optional, Dict, Any
+import unicodedata
+from dataclasses import dataclass, asdict, field, fields
+from typing import IO, TYPE_CHECKING, List, Optional, Dict, Any, Callable, Iterable, Iterator, Set, Tuple, Union
+from urllib.parse import urljoin, urlsplit
 
-import boto3
-import botocore
-import requests
-from bs4 import BeautifulSoup
+from io_utils import json_default, write_atomic
+
+# boto3, requests and bs4 are imported inside the functions that use them: boto3
+# alone costs more than the rest of start-up, and `scrape --help` or a parse-only
+# run should not pay for AWS clients it never creates
+if TYPE_CHECKING:
+    import requests
+    from boto3.dynamodb.types import TypeSerializer
 
 
 DEFAULT_URL = (
     "https://www.made-in-china.com/productdirectory.do?subaction=hunt&style=b&mode=and&code=0&comProvince=nolimit&order=0&isOpenCorrection=1&org=top&keyword=&file=&searchType=0&word=M3+lip&log_from=4&bv_id=1j9c5mv1s4e9"
 )
+SITE_ORIGIN = "https://www.made-in-china.com"
+DEFAULT_CATEGORY = "BMW M3/M4 | Exteriér"
+
+# Patterns are compiled once here; parsing runs them for every card on every page
+_CARD_DIV_CLASS_RE = re.compile(r"product-item|list-item|list-product|pro-item", re.I)
+_CARD_LI_CLASS_RE = re.compile(r"product|pro-item|list", re.I)
+_PRICE_TEXT_RE = re.compile(r"\b(US\$|\$|price)\b", re.I)
+_MOQ_TEXT_RE = re.compile(r"\bMOQ\b|\bMin\.|Minimum\s+Order", re.I)
+_SUPPLIER_HREF_RE = re.compile(r"company|supplier", re.I)
+_PRICE_NUMBER_RE = re.compile(r"\d+[\d,.]*")
+_THOUSANDS_GROUPED_RE = re.compile(r"\d{1,3}(?:,\d{3})+")
+_PAGE_LINK_RE = re.compile(r"""href=["'][^"']*[?&](?:amp;)?page=(\d+)""", re.I)
+_TOTAL_RESULTS_RE = re.compile(r"([\d,]+)\s+(?:products|results|items)\b", re.I)
+# BMW chassis codes (E92, F80, G82, ...); "M3"/"S58" style model and engine names do not match
+_CHASSIS_RE = re.compile(r"(?<![A-Za-z0-9])([EFG]\d{2})(?![A-Za-z0-9])", re.I)
+# Tags whose text bs4's get_text() leaves out (html.parser wraps them in special string types)
+_NON_TEXT_CONTAINERS = frozenset({"script", "style", "template", "rt", "rp"})
+# Detail pages: tier price blocks, specification rows and the image gallery
+_TIER_CLASS_RE = re.compile(r"price[-_]?(?:item|tier|ladder|range)|swiper-money|ladder|tier", re.I)
+_TIER_PRICE_RE = re.compile(r"(?:US\$|USD|\$)\s*(\d[\d,]*(?:\.\d+)?)", re.I)
+_TIER_QTY_RE = re.compile(r"(\d[\d,]*)\s*(?:-\s*(\d[\d,]*)\s*|\+\s*)?(?:Pieces?|Pcs|Sets?|Pairs?|Units?|Boxes)\b", re.I)
+_SPEC_ITEM_CLASS_RE = re.compile(r"bsc-item|spec-item|attr-item|basic-info-item|property-item", re.I)
+_SPEC_LABEL_CLASS_RE = re.compile(r"label|name|key|title", re.I)
+_SPEC_VALUE_CLASS_RE = re.compile(r"value|val\b|content|desc", re.I)
+_GALLERY_CLASS_RE = re.compile(r"gallery|swiper|thumb|slide|pic-list|main-?image", re.I)
 
 
 @dataclass
@@ -31,6 +80,17 @@ class Product:
     supplier_name: Optional[str]
     supplier_url: Optional[str]
     source: str
+    image_digest: Optional[str] = None
+    image_variants: List[Dict[str, Any]] = field(default_factory=list)
+    image_public_url: Optional[str] = None
+    category: Optional[str] = None
+    extra_attrs: Dict[str, Any] = field(default_factory=dict)
+    cluster_id: Optional[str] = None
+    # Filled from the detail page by the enrichment stage (see iter_products_enriched)
+    description: str = ""
+    specifications: List[Dict[str, str]] = field(default_factory=list)
+    price_tiers: List[Dict[str, Any]] = field(default_factory=list)
+    gallery: List[str] = field(default_factory=list)
 
 
 def stable_id_from_url(url: str) -> str:
@@ -49,303 +109,4437 @@ def build_headers() -> Dict[str, str]:
     }
 
 
-def sanitize_filename(name: str) -> str:
-    cleaned = re.sub(r"[^a-zA-Z0-9._-]+", "_", name).strip("._-")
-    return cleaned or "image"
-
-
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def get_with_retries(url: str, timeout: int = 20) -> requests.Response:
-    last_exc: Optional[Exception] = None
-    for attempt in range(5):
+# Upper bounds (seconds) of the latency histogram buckets
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class RunMetrics:
+    """Thread-safe counters, latency histograms and per-stage timings for one run.
+
+    Stages overlap in the streaming pipeline, so each stage reports both the
+    time spent inside its work units (`busy_sec`, summed across threads) and
+    the wall-clock span from its first to its last unit (`span_sec`).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Held by the one stage being profiled; see stage()
+        self._profile_lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Dict[str, Any]] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.profile_dir: Optional[str] = None
+        self._profiles: Dict[str, List[Any]] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = {"buckets": [0] * len(_LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+                self.histograms[key] = hist
+            for i, bound in enumerate(_LATENCY_BUCKETS):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+                    break
+            hist["sum"] += value
+            hist["count"] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        # One profiler per process at a time: cProfile cannot nest, and on Python 3.12+
+        # (sys.monitoring) enabling a second one anywhere in the process raises ValueError.
+        # Nested and concurrent stages therefore run unprofiled and are only counted.
+        profiler = None
+        if self.profile_dir is not None:
+            if self._profile_lock.acquire(blocking=False):
+                import cProfile
+
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:  # another profiling tool (debugger, coverage) is active
+                    profiler = None
+                    self._profile_lock.release()
+            if profiler is None:
+                self.inc("profile_skipped_stages_total", stage=name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._profile_lock.release()
+            now = time.time()
+            with self._lock:
+                stage = self.stages.get(name)
+                if stage is None:
+                    stage = {"busy_sec": 0.0, "calls": 0, "first": now - elapsed, "last": now}
+                    self.stages[name] = stage
+                stage["busy_sec"] += elapsed
+                stage["calls"] += 1
+                stage["last"] = now
+                if profiler is not None:
+                    self._profiles.setdefault(name, []).append(profiler)
+
+    def enable_profiling(self, profile_dir: str) -> None:
+        import tracemalloc
+
+        ensure_dir(profile_dir)
+        self.profile_dir = profile_dir
+        tracemalloc.start(25)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "startedAt": self.started_at,
+                "durationSec": time.time() - self.started_at,
+                "stages": {
+                    name: {
+                        "busySec": round(st["busy_sec"], 6),
+                        "spanSec": round(st["last"] - st["first"], 6),
+                        "calls": st["calls"],
+                    }
+                    for name, st in sorted(self.stages.items())
+                },
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "buckets": dict(zip([str(b) for b in _LATENCY_BUCKETS], hist["buckets"])),
+                        "sum": hist["sum"],
+                        "count": hist["count"],
+                    }
+                    for (name, labels), hist in sorted(self.histograms.items())
+                ],
+            }
+
+    def write_json(self, path: str, extra: Optional[Dict[str, Any]] = None) -> None:
+        report = self.report()
+        if extra:
+            report.update(extra)
+        write_atomic(path, json.dumps(report, indent=2, default=str))
+
+    def write_prometheus(self, path: str, prefix: str = "mic_importer") -> None:
+        def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+            parts = [f'{k}="{_prom_escape(str(v))}"' for k, v in labels]
+            if extra:
+                parts.append(extra)
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        lines: List[str] = []
+        report = self.report()
+        lines.append(f"# TYPE {prefix}_run_duration_seconds gauge")
+        lines.append(f"{prefix}_run_duration_seconds {report['durationSec']:.6f}")
+        lines.append(f"# TYPE {prefix}_stage_busy_seconds gauge")
+        for name, st in report["stages"].items():
+            lines.append(f'{prefix}_stage_busy_seconds{{stage="{name}"}} {st["busySec"]}')
+        lines.append(f"# TYPE {prefix}_stage_span_seconds gauge")
+        for name, st in report["stages"].items():
+            lines.append(f'{prefix}_stage_span_seconds{{stage="{name}"}} {st["spanSec"]}')
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((k, dict(v, buckets=list(v["buckets"]))) for k, v in self.histograms.items())
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                declared.add(name)
+            lines.append(f"{prefix}_{name}{_labels(labels)} {value}")
+        for (name, labels), hist in histograms:
+            if name not in declared:
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                declared.add(name)
+            cumulative = 0
+            for bound, count in zip(_LATENCY_BUCKETS, hist["buckets"]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{prefix}_{name}_bucket{_labels(labels, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{prefix}_{name}_bucket{_labels(labels, inf)} {hist['count']}")
+            lines.append(f"{prefix}_{name}_sum{_labels(labels)} {hist['sum']:.6f}")
+            lines.append(f"{prefix}_{name}_count{_labels(labels)} {hist['count']}")
+        write_atomic(path, "\n".join(lines) + "\n")
+
+    def dump_profiles(self) -> None:
+        """Write one merged cProfile file per stage plus a tracemalloc summary."""
+        if self.profile_dir is None:
+            return
+        import pstats
+        import tracemalloc
+
+        for name, profilers in self._profiles.items():
+            stats = pstats.Stats(profilers[0])
+            for extra in profilers[1:]:
+                stats.add(extra)
+            stats.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:50]
+            tracemalloc.stop()
+            # Stages run concurrently, so allocations are reported process-wide by source line
+            lines = [f"current={current} peak={peak}"] + [str(stat) for stat in top]
+            write_atomic(os.path.join(self.profile_dir, "tracemalloc.txt"), "\n".join(lines) + "\n")
+
+
+def _prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = RunMetrics()
+
+
+def reset_metrics() -> RunMetrics:
+    """Start a fresh METRICS collection (one per run)."""
+    global METRICS
+    METRICS = RunMetrics()
+    return METRICS
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        # A request bigger than the bucket goes through once it is full and leaves it in debt
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One token bucket per host, so politeness is enforced per site rather than globally."""
+
+    def __init__(self, rate_per_sec: float, burst: float = 1.0) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_per_sec, self.burst)
+                self._buckets[host] = bucket
+        bucket.acquire()
+
+
+_SESSION: Optional["requests.Session"] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session(pool_size: int = 16) -> "requests.Session":
+    """Shared keep-alive session so pages and images reuse pooled TLS connections."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(build_headers())
+            _SESSION = session
+        return _SESSION
+
+
+class ResponseCache:
+    """Persistent URL-keyed response cache with ETag/Last-Modified revalidation.
+
+    Bodies live as files under `cache_dir`; metadata lives in a SQLite index.
+    Entries younger than `ttl_sec` are served without touching the network,
+    older ones are revalidated with a conditional GET. When the total body
+    size exceeds `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024, ttl_sec: float = 600.0) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        ensure_dir(os.path.join(cache_dir, "bodies"))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_type TEXT,"
+            " size INTEGER NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _body_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, "bodies", hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, content_type, stored_at FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or not os.path.exists(self._body_path(url)):
+            return None
+        etag, last_modified, content_type, stored_at = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": content_type,
+            "fresh": time.time() - stored_at < self.ttl_sec,
+        }
+
+    def conditional_headers(self, entry: Dict[str, Any]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, url: str) -> Optional["requests.Response"]:
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        try:
+            with open(self._body_path(url), "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        import requests
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = body
+        if entry["content_type"]:
+            response.headers["Content-Type"] = entry["content_type"]
+        if entry["etag"]:
+            response.headers["ETag"] = entry["etag"]
+        if entry["last_modified"]:
+            response.headers["Last-Modified"] = entry["last_modified"]
+        response.headers["X-Cache"] = "HIT"
+        # Same charset as a live fetch so response.text decodes the cached body identically
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def touch(self, url: str) -> None:
+        """Mark an entry as revalidated (304) so its TTL starts over."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self._db.commit()
+
+    def store(self, url: str, response: "requests.Response") -> None:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control:
+            return
+        body = response.content
+        if len(body) > self.max_bytes:
+            return
+        path = self._body_path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries"
+                " (url, etag, last_modified, content_type, size, stored_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, response.headers.get("Content-Type"), len(body), now, now),
+            )
+            self._db.commit()
+        self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for url, size in self._db.execute("SELECT url, size FROM entries ORDER BY accessed_at ASC"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(url)
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE url = ?", [(u,) for u in victims])
+            self._db.commit()
+        for url in victims:
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+
+
+_RESPONSE_CACHE: Optional[ResponseCache] = None
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    global _RESPONSE_CACHE
+    _RESPONSE_CACHE = cache
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without touching the network while a host's circuit breaker is open."""
+
+
+class RetryPolicy:
+    """Retry rules plus per-host retry budget and circuit breaker state.
+
+    Attempts back off exponentially with full jitter, and a Retry-After header
+    on 429/503 is honoured instead (up to `max_delay`). Only connection errors,
+    timeouts and `retry_statuses` are retried. Each host may spend at most
+    `budget_min_retries + budget_ratio * requests` retries, so a struggling
+    host is not stampeded by parallel workers. After `breaker_threshold`
+    consecutive failed attempts the host's breaker opens for
+    `breaker_cooldown_sec`, then lets a single probe request through.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        retry_statuses: Iterable[int] = (408, 425, 429, 500, 502, 503, 504),
+        budget_min_retries: int = 10,
+        budget_ratio: float = 0.2,
+        breaker_threshold: int = 8,
+        breaker_cooldown_sec: float = 60.0,
+    ) -> None:
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.budget_min_retries = budget_min_retries
+        self.budget_ratio = budget_ratio
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown_sec = breaker_cooldown_sec
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+
+    def _host(self, host: str) -> Dict[str, Any]:
+        state = self._hosts.get(host)
+        if state is None:
+            state = {"requests": 0, "retries": 0, "failures": 0, "open_until": 0.0, "probing": False}
+            self._hosts[host] = state
+        return state
+
+    def before_request(self, host: str) -> None:
+        with self._lock:
+            state = self._host(host)
+            if state["open_until"]:
+                if time.monotonic() < state["open_until"] or state["probing"]:
+                    raise CircuitOpenError(f"Circuit open for {host}")
+                # Cool-down elapsed: half-open, let exactly one probe through
+                state["probing"] = True
+            state["requests"] += 1
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            state = self._host(host)
+            state["failures"] = 0
+            state["open_until"] = 0.0
+            state["probing"] = False
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            state = self._host(host)
+            state["failures"] += 1
+            if state["probing"] or state["failures"] >= self.breaker_threshold:
+                state["open_until"] = time.monotonic() + self.breaker_cooldown_sec
+                state["probing"] = False
+
+    def take_retry(self, host: str) -> bool:
+        """Spend one retry from the host's budget; False when it is exhausted."""
+        with self._lock:
+            state = self._host(host)
+            if state["retries"] >= self.budget_min_retries + self.budget_ratio * state["requests"]:
+                return False
+            state["retries"] += 1
+            return True
+
+    def is_retryable(self, exc: Exception) -> bool:
+        import requests
+
+        if isinstance(exc, requests.HTTPError):
+            return exc.response is not None and exc.response.status_code in self.retry_statuses
+        return isinstance(exc, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+    def delay(self, attempt: int, exc: Exception) -> float:
+        import requests
+
+        retry_after = None
+        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+            retry_after = parse_retry_after(exc.response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds from now; accepts delta-seconds and HTTP-date forms."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    import email.utils
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+_RETRY_POLICY = RetryPolicy()
+
+
+def set_retry_policy(policy: RetryPolicy) -> None:
+    global _RETRY_POLICY
+    _RETRY_POLICY = policy
+
+
+def get_with_retries(
+    url: str,
+    timeout: int = 20,
+    rate_limiter: Optional[HostRateLimiter] = None,
+    stream: bool = False,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> "requests.Response":
+    """GET with retries. With `stream=True` the body is left unread (and the
+    response cache is bypassed); the caller must close the response."""
+    session = get_session()
+    policy = retry_policy or _RETRY_POLICY
+    host = urlsplit(url).netloc
+    cache = _RESPONSE_CACHE if not stream else None
+    entry = cache.lookup(url) if cache is not None else None
+    if entry is not None and entry["fresh"]:
+        cached = cache.load(url)
+        if cached is not None:
+            METRICS.inc("http_cache_total", result="fresh")
+            return cached
+    attempt = 0
+    while True:
+        try:
+            policy.before_request(host)
+        except CircuitOpenError:
+            METRICS.inc("http_circuit_open_total", host=host)
+            raise
         try:
-            response = requests.get(url, headers=build_headers(), timeout=timeout)
+            if rate_limiter is not None:
+                rate_limiter.acquire(url)
+            headers = cache.conditional_headers(entry) if entry is not None else None
+            started = time.perf_counter()
+            response = session.get(url, timeout=timeout, headers=headers, stream=stream)
+            METRICS.observe("http_request_seconds", time.perf_counter() - started, host=host)
+            METRICS.inc("http_responses_total", host=host, status=str(response.status_code))
+            if response.status_code == 304 and entry is not None:
+                policy.record_success(host)
+                cached = cache.load(url)
+                if cached is not None:
+                    METRICS.inc("http_cache_total", result="revalidated")
+                    cache.touch(url)
+                    return cached
+                # Body vanished between lookup and load; refetch unconditionally
+                entry = None
+                continue
+            if not response.ok:
+                response.close()
             response.raise_for_status()
+            policy.record_success(host)
+            if not stream:
+                # Streamed bodies are counted by their consumer as they are read
+                METRICS.inc("http_bytes_total", len(response.content), host=host)
+            if cache is not None:
+                METRICS.inc("http_cache_total", result="miss")
+                cache.store(url, response)
             return response
-        except Exception as exc:  # noqa: BLE001 - surface and retry
-            last_exc = exc
-            time.sleep(1 + attempt * 0.8)
-    raise RuntimeError(f"Failed to GET {url}: {last_exc}")
+        except Exception as exc:  # noqa: BLE001 - classified by the retry policy
+            retryable = policy.is_retryable(exc)
+            if retryable:
+                policy.record_failure(host)
+            else:
+                # A definitive answer (404/403/...) says the host is healthy
+                policy.record_success(host)
+            attempt += 1
+            if not retryable or attempt >= policy.max_attempts or not policy.take_retry(host):
+                METRICS.inc("http_failures_total", host=host)
+                raise RuntimeError(f"Failed to GET {url}: {exc}") from exc
+            METRICS.inc("http_retries_total", host=host)
+            time.sleep(policy.delay(attempt - 1, exc))
 
 
-def parse_products_from_page(html: str) -> List[Product]:
-    soup = BeautifulSoup(html, "html.parser")
+def _site_url(url: Optional[str]) -> Optional[str]:
+    if url and url.startswith("/"):
+        return f"{SITE_ORIGIN}{url}"
+    return url
+
+
+def _image_src(get: Callable[[str], Optional[str]]) -> Optional[str]:
+    image_url = get("data-src") or get("data-original") or get("src")
+    if image_url and image_url.startswith("//"):
+        image_url = f"https:{image_url}"
+    return image_url
+
+
+def _pick_cards(candidates: Iterable[Tuple[Any, str, Optional[str], bool]]) -> List[Any]:
+    # The site can change; try a few robust selectors, first non-empty bucket wins.
+    # All three are collected in one pass over div/li instead of one find_all each.
+    div_cards: List[Any] = []
+    li_cards: List[Any] = []
+    virtual_cards: List[Any] = []
+    for node, tag, class_value, is_virtual in candidates:
+        if tag == "div":
+            if class_value and _CARD_DIV_CLASS_RE.search(class_value):
+                div_cards.append(node)
+            if is_virtual:
+                virtual_cards.append(node)
+        elif class_value and _CARD_LI_CLASS_RE.search(class_value):
+            li_cards.append(node)
+    return div_cards or li_cards or virtual_cards
+
+
+def _clean_text(text: Optional[str]) -> Optional[str]:
+    # html.parser keeps CRLF while libxml2 and lexbor turn it into LF, and NBSP survives all three:
+    # collapsing every whitespace run to one space makes the engines agree on stored text
+    return " ".join(text.split()) if text else text
 
-    # The site can change; try a few robust selectors
-    product_cards = []
-    candidates = [
-        ("div", {"class": re.compile(r"product-item|list-item|list-product|pro-item", re.I)}),
-        ("li", {"class": re.compile(r"product|pro-item|list", re.I)}),
-        ("div", {"data-s-virtual": True}),
-    ]
-    for tag, attrs in candidates:
-        found = soup.find_all(tag, attrs=attrs)
-        if found:
-            product_cards = found
-            break
+
+def _make_product(
+    title_text: Optional[str],
+    product_url: Optional[str],
+    image_url: Optional[str],
+    price_text: Optional[str],
+    moq_text: Optional[str],
+    supplier_name: Optional[str],
+    supplier_url: Optional[str],
+) -> Optional[Product]:
+    product_url = _site_url(product_url)
+    title_text = _clean_text(title_text)
+    if not product_url or not title_text:
+        return None
+    return Product(
+        product_id=stable_id_from_url(product_url),
+        title=title_text,
+        product_url=product_url,
+        image_url=image_url,
+        image_local_path=None,
+        price_text=_clean_text(price_text),
+        moq_text=_clean_text(moq_text),
+        supplier_name=_clean_text(supplier_name),
+        supplier_url=_site_url(supplier_url),
+        source="made-in-china",
+    )
+
+
+def _parse_cards_bs4(html: str) -> List[Product]:
+    from bs4 import BeautifulSoup, NavigableString
+
+    soup = BeautifulSoup(html, "html.parser")
+    cards = _pick_cards(
+        (
+            tag,
+            tag.name,
+            " ".join(tag.get("class") or []),
+            tag.get("data-s-virtual") is not None,
+        )
+        for tag in soup.find_all(["div", "li"])
+    )
 
     products: List[Product] = []
-    for card in product_cards:
-        # Title/link
-        title_el = card.find("a", href=True)
-        title_text = None
-        product_url = None
-        if title_el:
+    for card in cards:
+        title_el = img_el = supplier_el = None
+        price_text = moq_text = None
+        # Single pass over the card: first link, first image, first supplier link,
+        # first price-like and MOQ-like strings.
+        for node in card.descendants:
+            if isinstance(node, NavigableString):
+                if price_text is None and _PRICE_TEXT_RE.search(node):
+                    price_text = node.strip()
+                if moq_text is None and _MOQ_TEXT_RE.search(node):
+                    moq_text = node.strip()
+            elif node.name == "a":
+                href = node.get("href")
+                if href is None:
+                    continue
+                if title_el is None:
+                    title_el = node
+                if supplier_el is None and _SUPPLIER_HREF_RE.search(href):
+                    supplier_el = node
+            elif node.name == "img" and img_el is None:
+                img_el = node
+            if title_el is not None and img_el is not None and supplier_el is not None and price_text and moq_text:
+                break
+
+        title_text = product_url = supplier_name = supplier_url = None
+        if title_el is not None:
             title_text = title_el.get("title") or title_el.get_text(strip=True)
             product_url = title_el.get("href")
-            if product_url and product_url.startswith("/"):
-                product_url = f"https://www.made-in-china.com{product_url}"
-
-        # Image
-        img_el = card.find("img")
-        image_url = None
-        if img_el:
-            image_url = (
-                img_el.get("data-src")
-                or img_el.get("data-original")
-                or img_el.get("src")
-            )
-            if image_url and image_url.startswith("//"):
-                image_url = f"https:{image_url}"
-
-        # Price and MOQ texts (best-effort)
-        price_text = None
-        moq_text = None
-        price_candidates = card.find_all(text=re.compile(r"\b(US\$|\$|price)\b", re.I))
-        if price_candidates:
-            price_text = price_candidates[0].strip()
-        moq_candidates = card.find_all(text=re.compile(r"\bMOQ\b|\bMin\.|Minimum\s+Order", re.I))
-        if moq_candidates:
-            moq_text = moq_candidates[0].strip()
-
-        # Supplier
-        supplier_name = None
-        supplier_url = None
-        supplier_link = card.find("a", href=True, attrs={"href": re.compile(r"company|supplier", re.I)})
-        if supplier_link:
-            supplier_name = supplier_link.get("title") or supplier_link.get_text(strip=True)
-            supplier_url = supplier_link.get("href")
-            if supplier_url and supplier_url.startswith("/"):
-                supplier_url = f"https://www.made-in-china.com{supplier_url}"
-
-        if not product_url or not title_text:
-            continue
+        if supplier_el is not None:
+            supplier_name = supplier_el.get("title") or supplier_el.get_text(strip=True)
+            supplier_url = supplier_el.get("href")
+        image_url = _image_src(img_el.get) if img_el is not None else None
 
-        product_id = stable_id_from_url(product_url)
-        products.append(
-            Product(
-                product_id=product_id,
-                title=title_text,
-                product_url=product_url,
-                image_url=image_url,
-                image_local_path=None,
-                price_text=price_text,
-                moq_text=moq_text,
-                supplier_name=supplier_name,
-                supplier_url=supplier_url,
-                source="made-in-china",
-            )
-        )
+        product = _make_product(title_text, product_url, image_url, price_text, moq_text, supplier_name, supplier_url)
+        if product is not None:
+            products.append(product)
     return products
 
 
-def maybe_download_image(image_url: Optional[str], download_dir: str, title: str) -> Optional[str]:
-    if not image_url:
-        return None
-    ensure_dir(download_dir)
-    name = sanitize_filename(title)[:64]
-    ext = os.path.splitext(image_url.split("?")[0])[1] or ".jpg"
-    filename = f"{name}{ext}"
-    dest_path = os.path.join(download_dir, filename)
-    if os.path.exists(dest_path) and os.path.getsize(dest_path) > 0:
-        return dest_path
+def _lxml_link_text(el: Any) -> str:
+    # Mirrors bs4 get_text(strip=True): comments and script/style-like content are skipped
+    parts: List[str] = []
+    # The element's own text goes on last so it is popped first, before its children
+    stack: List[Any] = _lxml_children_reversed(el)
+    if el.text:
+        stack.append(el.text)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            stripped = item.strip()
+            if stripped:
+                parts.append(stripped)
+        elif isinstance(item.tag, str) and item.tag not in _NON_TEXT_CONTAINERS:
+            stack.extend(_lxml_children_reversed(item))
+            if item.text:
+                stack.append(item.text)
+    return "".join(parts)
+
+
+def _parse_cards_lxml(html: str) -> List[Product]:
     try:
-        resp = get_with_retries(image_url, timeout=30)
-        with open(dest_path, "wb") as f:
-            f.write(resp.content)
-        return dest_path
-    except Exception:
-        return None
+        from lxml import etree
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("The lxml parser engine requires `pip install lxml`") from exc
 
+    if not html.strip():
+        return []
+    root = etree.fromstring(html.encode("utf-8"), etree.HTMLParser(encoding="utf-8"))
+    if root is None:
+        return []
+    cards = _pick_cards(
+        (el, el.tag, el.get("class"), el.get("data-s-virtual") is not None)
+        for el in root.iter("div", "li")
+    )
 
-def discover_paged_urls(base_url: str, pages: int) -> List[str]:
-    if pages <= 1:
-        return [base_url]
-    urls = [base_url]
-    # Try common pagination parameter: page=2,3,...
-    sep = "&" if "?" in base_url else "?"
-    for p in range(2, pages + 1):
-        urls.append(f"{base_url}{sep}page={p}")
-    return urls
+    products: List[Product] = []
+    for card in cards:
+        title_el = img_el = supplier_el = None
+        price_text = moq_text = None
+        # Document-order walk emitting elements and text nodes (text, then children, then tails)
+        stack: List[Any] = [card.text] if card.text else []
+        stack.extend(_lxml_children_reversed(card))
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                if price_text is None and _PRICE_TEXT_RE.search(item):
+                    price_text = item.strip()
+                if moq_text is None and _MOQ_TEXT_RE.search(item):
+                    moq_text = item.strip()
+                continue
+            tag = item.tag
+            if tag is etree.Comment:
+                if item.text:
+                    stack.append(item.text)
+                continue
+            if tag == "a":
+                href = item.get("href")
+                if href is not None:
+                    if title_el is None:
+                        title_el = item
+                    if supplier_el is None and _SUPPLIER_HREF_RE.search(href):
+                        supplier_el = item
+            elif tag == "img" and img_el is None:
+                img_el = item
+            if title_el is not None and img_el is not None and supplier_el is not None and price_text and moq_text:
+                break
+            stack.extend(_lxml_children_reversed(item))
+            if item.text and isinstance(tag, str):
+                stack.append(item.text)
+
+        title_text = product_url = supplier_name = supplier_url = None
+        if title_el is not None:
+            title_text = title_el.get("title") or _lxml_link_text(title_el)
+            product_url = title_el.get("href")
+        if supplier_el is not None:
+            supplier_name = supplier_el.get("title") or _lxml_link_text(supplier_el)
+            supplier_url = supplier_el.get("href")
+        image_url = _image_src(img_el.get) if img_el is not None else None
+
+        product = _make_product(title_text, product_url, image_url, price_text, moq_text, supplier_name, supplier_url)
+        if product is not None:
+            products.append(product)
+    return products
 
 
-def scrape_products(base_url: str, pages: int, delay_sec: float) -> List[Product]:
-    urls = discover_paged_urls(base_url, pages)
+def _lxml_children_reversed(el: Any) -> List[Any]:
+    # Stack order for a document-order walk: each child is followed by its tail text
+    out: List[Any] = []
+    for child in reversed(el):
+        if child.tail:
+            out.append(child.tail)
+        out.append(child)
+    return out
+
+
+def _selectolax_link_text(el: Any) -> str:
+    parts: List[str] = []
+    for node in el.traverse(include_text=True):
+        if not node.is_text_node:
+            continue
+        parent = node.parent
+        skipped = False
+        while parent is not None and parent is not el:
+            if parent.tag in _NON_TEXT_CONTAINERS:
+                skipped = True
+                break
+            parent = parent.parent
+        if skipped:
+            continue
+        stripped = (node.text_content or "").strip()
+        if stripped:
+            parts.append(stripped)
+    return "".join(parts)
+
+
+def _parse_cards_selectolax(html: str) -> List[Product]:
+    try:
+        from selectolax.lexbor import LexborHTMLParser
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("The selectolax parser engine requires `pip install selectolax`") from exc
+
+    tree = LexborHTMLParser(html)
+    candidates = []
+    for tag in ("div", "li"):
+        for node in tree.css(tag):
+            attrs = node.attributes
+            candidates.append((node, tag, attrs.get("class"), "data-s-virtual" in attrs))
+    cards = _pick_cards(candidates)
+
     products: List[Product] = []
-    for idx, url in enumerate(urls):
-        resp = get_with_retries(url)
-        page_products = parse_products_from_page(resp.text)
-        products.extend(page_products)
-        if idx < len(urls) - 1 and delay_sec > 0:
-            time.sleep(delay_sec)
-    # De-duplicate by product_url
-    unique: Dict[str, Product] = {}
-    for p in products:
-        unique[p.product_url] = p
-    return list(unique.values())
+    for card in cards:
+        title_attrs = img_attrs = supplier_attrs = None
+        title_el = supplier_el = None
+        price_text = moq_text = None
+        for node in card.traverse(include_text=True):
+            tag = node.tag
+            if tag == "-text" or tag == "-comment":
+                text = node.text_content if tag == "-text" else node.comment_content
+                if not text:
+                    continue
+                if price_text is None and _PRICE_TEXT_RE.search(text):
+                    price_text = text.strip()
+                if moq_text is None and _MOQ_TEXT_RE.search(text):
+                    moq_text = text.strip()
+            elif tag == "a":
+                attrs = node.attributes
+                if "href" not in attrs:
+                    continue
+                href = attrs["href"] or ""
+                if title_el is None:
+                    title_el, title_attrs = node, attrs
+                if supplier_el is None and _SUPPLIER_HREF_RE.search(href):
+                    supplier_el, supplier_attrs = node, attrs
+            elif tag == "img" and img_attrs is None:
+                img_attrs = node.attributes
+            if title_el is not None and img_attrs is not None and supplier_el is not None and price_text and moq_text:
+                break
 
+        title_text = product_url = supplier_name = supplier_url = None
+        if title_el is not None:
+            title_text = title_attrs.get("title") or _selectolax_link_text(title_el)
+            product_url = title_attrs["href"] or ""
+        if supplier_el is not None:
+            supplier_name = supplier_attrs.get("title") or _selectolax_link_text(supplier_el)
+            supplier_url = supplier_attrs["href"] or ""
+        image_url = _image_src(img_attrs.get) if img_attrs is not None else None
 
-def attach_images(products: List[Product], download_dir: str, max_workers: int = 8) -> None:
-    def _job(p: Product) -> None:
-        p.image_local_path = maybe_download_image(p.image_url, download_dir, p.title)
+        product = _make_product(title_text, product_url, image_url, price_text, moq_text, supplier_name, supplier_url)
+        if product is not None:
+            products.append(product)
+    return products
 
-    ensure_dir(download_dir)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
-        list(ex.map(_job, products))
 
+PARSER_ENGINES: Dict[str, Callable[[str], List[Product]]] = {
+    "bs4": _parse_cards_bs4,
+    "lxml": _parse_cards_lxml,
+    "selectolax": _parse_cards_selectolax,
+}
+# lxml returns exactly what bs4 does (tests/test_parser_parity.py) and imports far faster,
+# so the CLI only falls back to bs4 when lxml is not installed
+DEFAULT_PARSER_ENGINE = "lxml" if importlib.util.find_spec("lxml") is not None else "bs4"
 
-def upsert_products_to_dynamo(
-    products: List[Product],
-    table_name: str,
-    region_name: Optional[str],
-    extra_attrs: Optional[Dict[str, Any]] = None,
-) -> None:
-    session = boto3.session.Session(region_name=region_name)
-    dynamodb = session.resource("dynamodb")
-    table = dynamodb.Table(table_name)
 
-    # Validate table exists
+def parse_products_from_page(
+    html: str,
+    engine: str = "bs4",
+    parse_pool: Optional[concurrent.futures.Executor] = None,
+) -> List[Product]:
+    """Parse one search page, in this process or on `parse_pool` (see make_parse_pool)."""
     try:
-        table.load()
-    except botocore.exceptions.ClientError as e:  # noqa: BLE001
-        raise RuntimeError(f"DynamoDB table not accessible: {e}")
+        parse = PARSER_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown parser engine: {engine}") from None
+    with METRICS.stage("parse"):
+        if parse_pool is None:
+            started = time.perf_counter()
+            products = parse(html)
+            elapsed = time.perf_counter() - started
+        else:
+            # The worker times itself; measuring here would include time queued for a free worker
+            rows, elapsed = parse_pool.submit(_parse_page_rows, html, engine).result()
+            products = [_product_from_row(row) for row in rows]
+    METRICS.observe("parse_page_seconds", elapsed, engine=engine)
+    METRICS.inc("parsed_products_total", len(products))
+    return products
 
-    with table.batch_writer(overwrite_by_pkeys=["pk"]) as batch:
-        for p in products:
-            # Map to FE-expected structure while keeping admin metadata
-            # id/name/price/image/images/description/specifications/features
-            # Price best-effort: parse number from price_text (USD or generic). If not found, set 0.
-            price_value = 0
-            if p.price_text:
-                digits = re.findall(r"\d+[\d,.]*", p.price_text)
-                if digits:
-                    num = digits[0].replace(".", "").replace(",", "")
-                    try:
-                        price_value = int(num)
-                    except Exception:
-                        price_value = 0
-
-            item = {
-                # Keys
-                "pk": f"prod#{p.product_id}",
-                "sk": "prod",
-                # FE fields
-                "id": p.product_id,
-                "name": p.title,
-                "price": price_value,
-                "image": p.image_url or "",
-                "images": [p.image_url] if p.image_url else [],
-                "description": "",
-                "specifications": [],
-                "features": [],
-                # Optional category hint from query context
-                "category": "BMW M3/M4 | Exteriér",
-                # Admin/source metadata
-                "productUrl": p.product_url,
-                "imageLocalPath": p.image_local_path or "",
-                "priceText": p.price_text or "",
-                "moqText": p.moq_text or "",
-                "supplierName": p.supplier_name or "",
-                "supplierUrl": p.supplier_url or "",
-                "source": p.source,
-                "updatedAt": int(time.time()),
-            }
-            if extra_attrs:
-                item.update(extra_attrs)
-            batch.put_item(Item=item)
 
+# What a parse worker sends back per product: plain strings, cheap to pickle; the rest is derived
+_PARSED_FIELDS = ("title", "product_url", "image_url", "price_text", "moq_text", "supplier_name", "supplier_url")
 
-def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
-    parser = argparse.ArgumentParser(
-        description="Scrape Made-in-China search results and upsert into DynamoDB",
-    )
-    parser.add_argument(
-        "--url",
-        default=DEFAULT_URL,
-        help="Search URL to scrape (default: preset M3 lip URL)",
-    )
-    parser.add_argument(
-        "--pages",
-        type=int,
-        default=1,
-        help="Number of pages to attempt via page= pagination (default: 1)",
-    )
-    parser.add_argument(
-        "--delay-sec",
-        type=float,
-        default=1.0,
-        help="Delay between page requests in seconds (default: 1.0)",
-    )
-    parser.add_argument(
-        "--download-dir",
-        default=os.path.join("data", "made-in-china", "m3-lip", "images"),
-        help="Directory to store downloaded images",
-    )
-    parser.add_argument(
-        "--table-name",
-        required=True,
-        help="DynamoDB table name",
-    )
-    parser.add_argument(
-        "--aws-region",
-        default=None,
-        help="AWS region (if not set, boto3 defaults/environment will be used)",
+
+def _init_parse_worker(engine: str) -> None:
+    # Once per worker process: import the engine's library and warm its code paths
+    PARSER_ENGINES[engine]("<html><body><div class='product-item'></div></body></html>")
+
+
+def _parse_page_rows(html: str, engine: str) -> Tuple[List[Tuple[Optional[str], ...]], float]:
+    started = time.perf_counter()
+    rows = [tuple(getattr(p, name) for name in _PARSED_FIELDS) for p in PARSER_ENGINES[engine](html)]
+    return rows, time.perf_counter() - started
+
+
+def _parse_page_batch(
+    pages: List[Tuple[bytes, str]], engine: str
+) -> List[Tuple[List[Tuple[Optional[str], ...]], float]]:
+    # Raw bytes are sent so decoding runs in the worker too; batching amortizes the round trip
+    return [_parse_page_rows(body.decode(encoding, "replace"), engine) for body, encoding in pages]
+
+
+def _product_from_row(row: Tuple[Optional[str], ...]) -> Product:
+    values = dict(zip(_PARSED_FIELDS, row))
+    return Product(
+        product_id=stable_id_from_url(values["product_url"]),
+        image_local_path=None,
+        source="made-in-china",
+        **values,
     )
-    parser.add_argument(
-        "--extra-attr",
-        action="append",
-        default=[],
-        metavar="KEY=VALUE",
-        help="Additional attributes to include in each item (repeatable)",
+
+
+def make_parse_pool(workers: int, engine: str = "bs4") -> "concurrent.futures.ProcessPoolExecutor":
+    """Long-lived parse processes; the engine is imported and warmed once per worker.
+
+    Workers are spawned rather than forked: the pool starts while fetch and
+    writer threads are running, and forking a threaded process is unsafe.
+    """
+    import multiprocessing
+
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_parse_worker,
+        initargs=(engine,),
     )
-    return parser.parse_args(argv)
 
 
-def parse_extra_attrs(kv_pairs: List[str]) -> Dict[str, str]:
-    out: Dict[str, str] = {}
-    for pair in kv_pairs:
-        if "=" in pair:
-            k, v = pair.split("=", 1)
-            out[k] = v
-    return out
+class ImageStore:
+    """Content-addressed image directory: files are named `<sha256>.<ext>`.
 
+    A SQLite manifest maps source URL -> digest so repeat runs skip the
+    download entirely, and identical images from different listings are
+    stored once. Downloads stream to a temporary file in chunks and are
+    renamed into place atomically.
+    """
 
-def main(argv: Optional[List[str]] = None) -> int:
-    args = parse_args(argv)
-    extra_attrs = parse_extra_attrs(args.extra_attr)
+    CHUNK_SIZE = 64 * 1024
 
-    print(f"Scraping: {args.url} (pages={args.pages})")
-    products = scrape_products(args.url, args.pages, args.delay_sec)
-    print(f"Found {len(products)} unique products")
+    def __init__(self, root: str) -> None:
+        self.root = root
+        ensure_dir(root)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "manifest.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " url TEXT PRIMARY KEY, digest TEXT NOT NULL, ext TEXT NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.commit()
 
-    print(f"Downloading images into: {args.download_dir}")
-    attach_images(products, args.download_dir)
+    def path_for(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, f"{digest}{ext}")
 
-    print(f"Upserting {len(products)} products into DynamoDB table: {args.table_name}")
-    upsert_products_to_dynamo(
-        products=products,
-        table_name=args.table_name,
-        region_name=args.aws_region,
-        extra_attrs=extra_attrs,
-    )
-    print("Done.")
-    return 0
+    def lookup(self, url: str) -> Optional[Tuple[str, str]]:
+        """(digest, path) for an already stored URL, if its file is still present."""
+        with self._lock:
+            row = self._db.execute("SELECT digest, ext FROM images WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        path = self.path_for(row[0], row[1])
+        if not os.path.exists(path):
+            return None
+        return row[0], path
+
+    def fetch(self, url: str) -> Tuple[str, str]:
+        """Download `url` into the store (unless already there); returns (digest, path)."""
+        known = self.lookup(url)
+        if known is not None:
+            return known
+        response = get_with_retries(url, timeout=30, stream=True)
+        ext = _image_extension(url, response.headers.get("Content-Type"))
+        digest_hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    digest_hasher.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            METRICS.inc("http_bytes_total", size, host=urlsplit(url).netloc)
+            if size == 0:
+                raise RuntimeError(f"Empty image body: {url}")
+            digest = digest_hasher.hexdigest()
+            path = self.path_for(digest, ext)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            response.close()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO images (url, digest, ext, size) VALUES (?, ?, ?, ?)",
+                (url, digest, ext, size),
+            )
+            self._db.commit()
+        return digest, path
 
 
-if __name__ == "__main__":
-    raise SystemExit(main())
+def _image_extension(url: str, content_type: Optional[str]) -> str:
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    if ext and len(ext) <= 6 and ext[1:].isalnum():
+        return ext
+    if content_type:
+        guessed = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if guessed:
+            return ".jpg" if guessed == ".jpe" else guessed
+    return ".jpg"
+
+
+_IMAGE_STORES: Dict[str, ImageStore] = {}
+_IMAGE_STORES_LOCK = threading.Lock()
+
+
+def get_image_store(download_dir: str) -> ImageStore:
+    key = os.path.abspath(download_dir)
+    with _IMAGE_STORES_LOCK:
+        store = _IMAGE_STORES.get(key)
+        if store is None:
+            store = ImageStore(download_dir)
+            _IMAGE_STORES[key] = store
+        return store
+
+
+def maybe_download_image(
+    image_url: Optional[str], download_dir: str, offline: bool = False
+) -> Optional[Tuple[str, str]]:
+    """(sha256, local path) of the image in the content-addressed store, or None.
+
+    `offline` only looks the URL up in the store and never downloads.
+    """
+    if not image_url:
+        return None
+    try:
+        store = get_image_store(download_dir)
+        return store.lookup(image_url) if offline else store.fetch(image_url)
+    except Exception:
+        return None
+
+
+class CrawlJournal:
+    """Append-only SQLite journal of one import run, so a crashed run can be resumed.
+
+    Records parsed search pages (with their products, plus the page count
+    found on the first page of an adaptive crawl), image outcomes and the
+    items DynamoDB has confirmed. A resumed run replays journaled pages
+    instead of fetching them and does not rewrite confirmed items; stored
+    images are already skipped by the ImageStore manifest.
+    """
+
+    def __init__(self, path: str) -> None:
+        parent = os.path.dirname(path)
+        if parent:
+            ensure_dir(parent)
+        self.path = path
+        self.run_id: Optional[int] = None
+        self.resumed = False
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Every record is committed; NORMAL keeps that from costing an fsync each time
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL NOT NULL, finished_at REAL, argv TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " run_id INTEGER NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, payload TEXT, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lookup ON entries (run_id, kind, key)")
+        self._db.commit()
+
+    def start(self, argv: List[str], resume: bool = False) -> int:
+        """Open a new run, or with `resume` continue the latest unfinished one (if any)."""
+        with self._lock:
+            if resume:
+                row = self._db.execute(
+                    "SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self.run_id, self.resumed = row[0], True
+                    return self.run_id
+            cur = self._db.execute(
+                "INSERT INTO runs (started_at, argv) VALUES (?, ?)", (time.time(), json.dumps(argv))
+            )
+            self._db.commit()
+            self.run_id = cur.lastrowid
+            return self.run_id
+
+    def finish(self) -> None:
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+            self._db.commit()
+
+    def _append(self, kind: str, key: str, payload: Any) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO entries (run_id, kind, key, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, kind, key, json.dumps(payload, ensure_ascii=False, default=str), time.time()),
+            )
+            self._db.commit()
+
+    def _latest(self, kind: str, key: str) -> Optional[Any]:
+        if not self.resumed:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload FROM entries WHERE run_id = ? AND kind = ? AND key = ? ORDER BY rowid DESC LIMIT 1",
+                (self.run_id, kind, key),
+            ).fetchone()
+        if row is None:
+            return None
+        METRICS.inc("journal_replayed_total", kind=kind)
+        return json.loads(row[0])
+
+    def record_page(self, url: str, products: List[Product]) -> None:
+        self._append("page", url, [asdict(p) for p in products])
+
+    def page_products(self, url: str) -> Optional[List[Product]]:
+        payload = self._latest("page", url)
+        return [Product(**p) for p in payload] if payload is not None else None
+
+    def record_page_count(self, url: str, last_page: Optional[int]) -> None:
+        self._append("page_count", url, last_page)
+
+    def page_count(self, url: str) -> Optional[int]:
+        """Last page discovered on `url` (page 1 of an adaptive crawl), or None."""
+        return self._latest("page_count", url)
+
+    def record_image(self, url: str, stored: Optional[Tuple[str, str]]) -> None:
+        self._append("image", url, list(stored) if stored is not None else None)
 
+    def record_written(self, table_name: str, item_key: str, content_hash: str, first_seen: Optional[int]) -> None:
+        self._append("written", f"{table_name}|{item_key}", [content_hash, first_seen])
 
+    def written(self, table_name: str, item_key: str) -> Optional[Tuple[str, Optional[int]]]:
+        """(content hash, first seen) of an item this run already got confirmed by DynamoDB."""
+        payload = self._latest("written", f"{table_name}|{item_key}")
+        return (payload[0], payload[1]) if payload is not None else None
+
+    def close(self) -> None:
+        self._db.close()
+
+
+_JOURNAL: Optional[CrawlJournal] = None
+
+
+def set_journal(journal: Optional[CrawlJournal]) -> None:
+    global _JOURNAL
+    _JOURNAL = journal
+
+
+# Hop-by-hop / transfer headers that no longer describe the stored (decoded) body
+_ARCHIVE_DROP_HEADERS = frozenset({"content-encoding", "transfer-encoding", "content-length", "connection"})
+
+
+class PageArchive:
+    """Append-only WARC/1.1 archive of fetched search pages (`.warc.gz`).
+
+    Every record is its own gzip member, so a crash loses at most the record
+    being written and the files stay readable by standard WARC tools. Each
+    run appends to a new `pages-<UTC time>-<pid>.warc.gz` under `root`.
+    The body is stored decoded, as the parser saw it.
+    """
+
+    def __init__(self, root: str) -> None:
+        ensure_dir(root)
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.path = os.path.join(root, f"pages-{stamp}-{os.getpid()}.warc.gz")
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, "ab")
+
+    def write(self, url: str, response: "requests.Response") -> None:
+        import http.client
+        import uuid
+
+        status = response.status_code
+        reason = response.reason or http.client.responses.get(status, "")
+        body = response.content
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        lines += [f"{k}: {v}" for k, v in response.headers.items() if k.lower() not in _ARCHIVE_DROP_HEADERS]
+        lines.append(f"Content-Length: {len(body)}")
+        block = ("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1", "replace") + body
+        fetched = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        head = (
+            "WARC/1.1\r\n"
+            "WARC-Type: response\r\n"
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+            f"WARC-Date: {fetched}\r\n"
+            f"WARC-Target-URI: {url}\r\n"
+            "Content-Type: application/http; msgtype=response\r\n"
+            f"Content-Length: {len(block)}\r\n\r\n"
+        )
+        # Compress outside the lock; fetch threads only serialize on the append
+        member = gzip.compress(head.encode("utf-8") + block + b"\r\n\r\n", compresslevel=6)
+        with self._lock:
+            self._file.write(member)
+            self._file.flush()
+            self.records += 1
+        METRICS.inc("archived_pages_total")
+        METRICS.inc("archive_bytes_total", len(member))
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_PAGE_ARCHIVE: Optional[PageArchive] = None
+
+
+def set_page_archive(archive: Optional[PageArchive]) -> None:
+    global _PAGE_ARCHIVE
+    _PAGE_ARCHIVE = archive
+
+
+@dataclass
+class ArchivedPage:
+    url: str
+    fetched_at: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    @property
+    def encoding(self) -> str:
+        """Charset from Content-Type, decoded the way requests' Response.text would."""
+        from requests.utils import get_encoding_from_headers
+
+        encoding = get_encoding_from_headers(self.headers) or "utf-8"
+        try:
+            return codecs.lookup(encoding).name
+        except LookupError:
+            return "utf-8"
+
+
+def iter_archive_records(path: str) -> Iterator[ArchivedPage]:
+    """Stream the response records of one `.warc.gz` file, one record in memory at a time."""
+    # gzip reads concatenated members as one stream
+    with gzip.open(path, "rb") as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            if not line.startswith(b"WARC/"):
+                raise RuntimeError(f"{path}: expected a WARC record header, got {line[:40]!r}")
+            warc_headers: Dict[str, str] = {}
+            for line in iter(f.readline, b""):
+                if not line.strip():
+                    break
+                name, _, value = line.decode("utf-8").partition(":")
+                warc_headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(warc_headers["content-length"])
+            except (KeyError, ValueError):
+                raise RuntimeError(f"{path}: WARC record without a valid Content-Length") from None
+            block = f.read(length)
+            if len(block) < length:
+                # Truncated final record (crash while appending): keep everything before it
+                return
+            if warc_headers.get("warc-type") != "response":
+                continue
+            head, _, body = block.partition(b"\r\n\r\n")
+            status_line, *header_lines = head.decode("iso-8859-1").split("\r\n")
+            headers = {}
+            for header in header_lines:
+                name, _, value = header.partition(":")
+                headers[name.strip()] = value.strip()
+            yield ArchivedPage(
+                url=warc_headers.get("warc-target-uri", ""),
+                fetched_at=warc_headers.get("warc-date", ""),
+                status=int(status_line.split()[1]),
+                headers=headers,
+                body=body,
+            )
+
+
+def archive_files(paths: Iterable[str]) -> List[str]:
+    """Archive files named by `paths` (files or directories), newest first."""
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = [os.path.join(path, n) for n in os.listdir(path) if n.endswith((".warc.gz", ".warc"))]
+            files.extend(sorted(found, key=os.path.getmtime, reverse=True))
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            raise RuntimeError(f"No such archive: {path}")
+    return files
+
+
+def page_url(base_url: str, page: int) -> str:
+    if page <= 1:
+        return base_url
+    # Try common pagination parameter: page=2,3,...
+    sep = "&" if "?" in base_url else "?"
+    return f"{base_url}{sep}page={page}"
+
+
+def discover_paged_urls(base_url: str, pages: int) -> List[str]:
+    return [page_url(base_url, p) for p in range(1, max(1, pages) + 1)]
+
+
+def discover_last_page(html: str, products_on_page: int) -> Optional[int]:
+    """Best-effort page count from page 1: the highest page= link, else total results / page size."""
+    linked_pages = [int(n) for n in _PAGE_LINK_RE.findall(html)]
+    if linked_pages:
+        return max(linked_pages)
+    match = _TOTAL_RESULTS_RE.search(html)
+    if match and products_on_page > 0:
+        total = int(match.group(1).replace(",", ""))
+        return max(1, -(-total // products_on_page))
+    return None
+
+
+def build_rate_limiter(delay_sec: float) -> Optional[HostRateLimiter]:
+    # --delay-sec keeps its meaning as the average spacing between requests to one host
+    if delay_sec <= 0:
+        return None
+    return HostRateLimiter(rate_per_sec=1.0 / delay_sec)
+
+
+def fetch_page_html(url: str, rate_limiter: Optional[HostRateLimiter] = None) -> str:
+    """Fetch one search page, adding it to the page archive when one is set."""
+    with METRICS.stage("fetch"):
+        response = get_with_retries(url, rate_limiter=rate_limiter)
+    if _PAGE_ARCHIVE is not None:
+        _PAGE_ARCHIVE.write(url, response)
+    return response.text
+
+
+def iter_scraped_pages(
+    urls: List[str],
+    delay_sec: float,
+    concurrency: int = 4,
+    parser_engine: str = "bs4",
+    rate_limiter: Optional[HostRateLimiter] = None,
+    executor: Optional[concurrent.futures.Executor] = None,
+    parse_pool: Optional[concurrent.futures.Executor] = None,
+) -> Iterator[Tuple[int, List[Product]]]:
+    """Fetch pages concurrently and yield (page index, products) as each page arrives.
+
+    Pass `executor` to share one fetch pool between several crawls; it is left running.
+    With `parse_pool`, each fetch thread hands its page to the pool and waits,
+    so pages are parsed on several cores instead of in this thread.
+    """
+    if rate_limiter is None:
+        rate_limiter = build_rate_limiter(delay_sec)
+
+    def _fetch(url: str) -> Union[str, List[Product]]:
+        html = fetch_page_html(url, rate_limiter)
+        if parse_pool is None:
+            return html
+        return parse_products_from_page(html, parser_engine, parse_pool)
+
+    journal = _JOURNAL
+    if journal is not None and journal.resumed:
+        remaining = []
+        for idx, url in enumerate(urls):
+            replayed = journal.page_products(url)
+            if replayed is None:
+                remaining.append((idx, url))
+            else:
+                yield idx, replayed
+    else:
+        remaining = list(enumerate(urls))
+
+    workers = max(1, concurrency)
+    # Bounded look-ahead: a slow consumer stops new fetches instead of piling up pages in memory
+    max_in_flight = workers * 2
+    pending_urls = iter(remaining)
+    in_flight: Dict[concurrent.futures.Future, int] = {}
+    pool = (
+        contextlib.nullcontext(executor)
+        if executor is not None
+        else concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    )
+    with pool as ex:
+        while True:
+            for idx, url in pending_urls:
+                in_flight[ex.submit(_fetch, url)] = idx
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                idx = in_flight.pop(fut)
+                result = fut.result()
+                page_products = result if parse_pool is not None else parse_products_from_page(result, parser_engine)
+                if journal is not None:
+                    journal.record_page(urls[idx], page_products)
+                yield idx, page_products
+
+
+def iter_unique_products(
+    urls: List[str],
+    delay_sec: float,
+    concurrency: int = 4,
+    parser_engine: str = "bs4",
+) -> Iterator[Product]:
+    """Stream products as pages arrive, dropping product_urls already seen on earlier pages."""
+    seen: set = set()
+    for _, page_products in iter_scraped_pages(urls, delay_sec, concurrency, parser_engine):
+        yield from _unseen_products(page_products, seen)
+
+
+def _unseen_products(page_products: List[Product], seen: set) -> List[Product]:
+    fresh = []
+    for p in page_products:
+        if p.product_url not in seen:
+            seen.add(p.product_url)
+            fresh.append(p)
+    return fresh
+
+
+def iter_adaptive_products(
+    base_url: str,
+    delay_sec: float,
+    concurrency: int = 4,
+    parser_engine: str = "bs4",
+    max_pages: int = 100,
+    rate_limiter: Optional[HostRateLimiter] = None,
+    executor: Optional[concurrent.futures.Executor] = None,
+    parse_pool: Optional[concurrent.futures.Executor] = None,
+) -> Iterator[Product]:
+    """Like iter_unique_products, but works out how many pages to crawl.
+
+    The page count comes from page 1 (pagination links or a total-results
+    marker). Without one, pages are fetched in windows of `concurrency` and
+    the crawl stops at the first page, in page order, that adds no new
+    product URLs.
+    """
+    # One limiter for the whole crawl so successive windows keep the per-host pace
+    if rate_limiter is None:
+        rate_limiter = build_rate_limiter(delay_sec)
+    journal = _JOURNAL
+    first_products = journal.page_products(base_url) if journal is not None else None
+    if first_products is not None:
+        # The page count is journaled before page 1, so a replayed page 1 always has it
+        last_page = journal.page_count(base_url)
+    else:
+        first_html = fetch_page_html(base_url, rate_limiter)
+        first_products = parse_products_from_page(first_html, parser_engine, parse_pool)
+        last_page = discover_last_page(first_html, len(first_products)) if first_products else None
+        if journal is not None:
+            journal.record_page_count(base_url, last_page)
+            journal.record_page(base_url, first_products)
+    seen: set = set()
+    yield from _unseen_products(first_products, seen)
+    if not first_products:
+        return
+
+    if last_page is not None:
+        urls = discover_paged_urls(base_url, min(last_page, max_pages))[1:]
+        for _, page_products in iter_scraped_pages(
+            urls, delay_sec, concurrency, parser_engine, rate_limiter, executor, parse_pool
+        ):
+            yield from _unseen_products(page_products, seen)
+        return
+
+    window = max(1, concurrency)
+    next_page = 2
+    while next_page <= max_pages:
+        pages = list(range(next_page, min(next_page + window, max_pages + 1)))
+        by_page: Dict[int, List[Product]] = {}
+        for idx, page_products in iter_scraped_pages(
+            [page_url(base_url, n) for n in pages],
+            delay_sec,
+            concurrency,
+            parser_engine,
+            rate_limiter,
+            executor,
+            parse_pool,
+        ):
+            by_page[pages[idx]] = page_products
+        for n in pages:
+            fresh = _unseen_products(by_page[n], seen)
+            if not fresh:
+                return
+            yield from fresh
+        next_page = pages[-1] + 1
+
+
+def scrape_products(
+    base_url: str,
+    pages: int,
+    delay_sec: float,
+    concurrency: int = 4,
+    parser_engine: str = "bs4",
+) -> List[Product]:
+    urls = discover_paged_urls(base_url, pages)
+    by_page: Dict[int, List[Product]] = {}
+    for idx, page_products in iter_scraped_pages(urls, delay_sec, concurrency, parser_engine):
+        by_page[idx] = page_products
+    # De-duplicate by product_url (in page order, so results do not depend on arrival order)
+    unique: Dict[str, Product] = {}
+    for idx in sorted(by_page):
+        for p in by_page[idx]:
+            unique[p.product_url] = p
+    return list(unique.values())
+
+
+@dataclass
+class CrawlQuery:
+    url: str
+    name: str
+    category: str = DEFAULT_CATEGORY
+    pages: Optional[int] = 1  # None: detect the page count (--pages auto)
+    extra_attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_manifest(path: str) -> List[CrawlQuery]:
+    """Read a crawl manifest (.yaml/.yml, anything else is parsed as JSON).
+
+    The document is a list of queries, or {"defaults": {...}, "queries": [...]}
+    where defaults fill in keys a query leaves out. Each query needs a url and
+    may set name, category, pages (a number or "auto") and extra_attrs.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("YAML manifests require PyYAML: pip install pyyaml")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, list):
+        data = {"queries": data}
+    if not isinstance(data, dict) or not isinstance(data.get("queries"), list):
+        raise RuntimeError(f"{path}: expected a list of queries or a mapping with a 'queries' list")
+    defaults = data.get("defaults") or {}
+
+    queries: List[CrawlQuery] = []
+    for n, entry in enumerate(data["queries"], start=1):
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        merged = {**defaults, **entry}
+        # extra_attrs merge key by key so a query can add to the shared ones
+        extra = {**(defaults.get("extra_attrs") or {}), **(entry.get("extra_attrs") or {})}
+        if not merged.get("url"):
+            raise RuntimeError(f"{path}: query {n} has no url")
+        try:
+            pages = parse_pages(str(merged.get("pages", 1)))
+        except argparse.ArgumentTypeError as e:
+            raise RuntimeError(f"{path}: query {n}: {e}")
+        queries.append(
+            CrawlQuery(
+                url=merged["url"],
+                name=str(merged.get("name") or f"query-{n}"),
+                category=str(merged.get("category") or DEFAULT_CATEGORY),
+                pages=pages,
+                # boto3 refuses Python floats; YAML/JSON numbers with a fraction become Decimals
+                extra_attrs={k: decimal.Decimal(str(v)) if isinstance(v, float) else v for k, v in extra.items()},
+            )
+        )
+    if not queries:
+        raise RuntimeError(f"{path}: manifest lists no queries")
+    return queries
+
+
+def _tag_products(products: List[Product], query: CrawlQuery) -> List[Product]:
+    for p in products:
+        p.category = query.category
+        p.extra_attrs = dict(query.extra_attrs)
+    return products
+
+
+def iter_manifest_products(
+    queries: List[CrawlQuery],
+    delay_sec: float,
+    concurrency: int = 4,
+    parser_engine: str = "bs4",
+    max_pages: int = 100,
+    parse_workers: int = 0,
+    rate_limiter: Optional[HostRateLimiter] = None,
+) -> Iterator[Product]:
+    """Crawl every query in one fetch pool and stream products tagged with their query.
+
+    All pages of fixed-count queries are fetched as one stream; auto-paged
+    queries follow, one after another, on the same pool and rate limiter. A
+    product_url found by several queries is kept once, for the first query in
+    manifest order, so reruns tag products the same way. With `parse_workers`,
+    pages are parsed by that many long-lived processes.
+    """
+    if rate_limiter is None:
+        rate_limiter = build_rate_limiter(delay_sec)
+    seen: set = set()
+    found = [0] * len(queries)
+    fixed = [
+        (qi, url)
+        for qi, q in enumerate(queries)
+        if q.pages is not None
+        for url in discover_paged_urls(q.url, q.pages)
+    ]
+    pages_done = [0] * len(queries)
+
+    parse_pool = make_parse_pool(parse_workers, parser_engine) if parse_workers > 0 else None
+    with contextlib.ExitStack() as stack:
+        if parse_pool is not None:
+            stack.enter_context(parse_pool)
+        ex = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)))
+        # Pages arrive out of order; release them in (query, page) order to keep dedup deterministic
+        ready: Dict[int, List[Product]] = {}
+        next_idx = 0
+        for idx, page_products in iter_scraped_pages(
+            [url for _, url in fixed], delay_sec, concurrency, parser_engine, rate_limiter, ex, parse_pool
+        ):
+            ready[idx] = page_products
+            while next_idx in ready:
+                qi = fixed[next_idx][0]
+                q = queries[qi]
+                fresh = _tag_products(_unseen_products(ready.pop(next_idx), seen), q)
+                next_idx += 1
+                found[qi] += len(fresh)
+                pages_done[qi] += 1
+                print(f"[{q.name}] page {pages_done[qi]}/{q.pages}: {len(fresh)} new products ({found[qi]} total)")
+                yield from fresh
+
+        for qi, q in enumerate(queries):
+            if q.pages is not None:
+                continue
+            print(f"[{q.name}] crawling with detected page count")
+            for p in iter_adaptive_products(
+                q.url, delay_sec, concurrency, parser_engine, max_pages, rate_limiter, ex, parse_pool
+            ):
+                if p.product_url in seen:
+                    continue
+                seen.add(p.product_url)
+                found[qi] += 1
+                yield _tag_products([p], q)[0]
+            print(f"[{q.name}] done: {found[qi]} new products")
+
+
+# Pages per task sent to a parse worker when re-parsing archives
+REPARSE_BATCH_PAGES = 16
+
+
+def iter_archived_products(
+    paths: List[str],
+    parser_engine: str = "bs4",
+    parse_workers: int = 0,
+    queries: Optional[List[CrawlQuery]] = None,
+) -> Iterator[Product]:
+    """Re-parse archived search pages (see PageArchive) and stream their products; no network.
+
+    Archive files are read newest first and a product_url is kept at its
+    first, i.e. newest, occurrence. Products are tagged with the query whose
+    URL is the longest prefix of the page URL. With `parse_workers`, pages
+    go to that many processes in batches, with a bounded number in flight.
+    """
+    files = archive_files(paths)
+    by_prefix = sorted(queries or [], key=lambda q: len(q.url), reverse=True)
+
+    def _pages() -> Iterator[ArchivedPage]:
+        for path in files:
+            for page in iter_archive_records(path):
+                if 200 <= page.status < 300:
+                    yield page
+                else:
+                    METRICS.inc("reparse_skipped_pages_total", status=str(page.status))
+
+    def _parsed() -> Iterator[Tuple[str, List[Product]]]:
+        if parse_workers <= 0:
+            for page in _pages():
+                yield page.url, parse_products_from_page(page.body.decode(page.encoding, "replace"), parser_engine)
+            return
+        in_flight: collections.deque = collections.deque()
+
+        def _drain() -> Iterator[Tuple[str, List[Product]]]:
+            urls, fut = in_flight.popleft()
+            for url, (rows, elapsed) in zip(urls, fut.result()):
+                METRICS.observe("parse_page_seconds", elapsed, engine=parser_engine)
+                METRICS.inc("parsed_products_total", len(rows))
+                yield url, [_product_from_row(row) for row in rows]
+
+        with make_parse_pool(parse_workers, parser_engine) as pool:
+            pages = _pages()
+            while True:
+                batch = [(page.url, page.body, page.encoding) for page in itertools.islice(pages, REPARSE_BATCH_PAGES)]
+                if not batch:
+                    break
+                fut = pool.submit(_parse_page_batch, [(body, enc) for _, body, enc in batch], parser_engine)
+                in_flight.append(([url for url, _, _ in batch], fut))
+                if len(in_flight) >= parse_workers * 2:
+                    yield from _drain()
+            while in_flight:
+                yield from _drain()
+
+    seen: set = set()
+    page_count = product_count = 0
+    for url, page_products in _parsed():
+        page_count += 1
+        fresh = _unseen_products(page_products, seen)
+        query = next((q for q in by_prefix if url.startswith(q.url)), None)
+        if query is not None:
+            _tag_products(fresh, query)
+        product_count += len(fresh)
+        yield from fresh
+    print(f"Reparsed {page_count} archived pages from {len(files)} file(s): {product_count} products")
+
+
+def iter_html_products(
+    paths: List[str], parser_engine: str = "bs4", query: Optional[CrawlQuery] = None
+) -> Iterator[Product]:
+    """Parse saved search pages (one HTML file each) without any network access.
+
+    Meant for trying a selector or parser engine on a page saved from the
+    browser; products are deduplicated and tagged with `query` like crawled ones.
+    """
+    seen: set = set()
+    product_count = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            html = f.read().decode("utf-8", "replace")
+        fresh = _unseen_products(parse_products_from_page(html, parser_engine), seen)
+        if query is not None:
+            _tag_products(fresh, query)
+        product_count += len(fresh)
+        yield from fresh
+    print(f"Parsed {len(paths)} HTML file(s): {product_count} products")
+
+
+# NDJSON is how the scrape, images and upload commands hand products to each other
+_PRODUCT_FIELDS = frozenset(f.name for f in fields(Product))
+
+
+def write_products_ndjson(products: Iterable[Product], out: IO[str]) -> int:
+    """Write one JSON object per product to `out` as the products arrive; returns the count."""
+    count = 0
+    for p in products:
+        out.write(json.dumps(asdict(p), ensure_ascii=False, default=json_default) + "\n")
+        count += 1
+    out.flush()
+    return count
+
+
+def iter_products_ndjson(lines: Iterable[str]) -> Iterator[Product]:
+    """Products from NDJSON lines written by write_products_ndjson.
+
+    Fraction numbers come back as Decimal (what DynamoDB expects in
+    extra_attrs); keys this version of Product does not know are ignored.
+    """
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line, parse_float=decimal.Decimal)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"NDJSON line {line_no}: {e}") from None
+        yield Product(**{k: v for k, v in data.items() if k in _PRODUCT_FIELDS})
+
+
+def _attach_image(p: Product, download_dir: str, offline: bool = False) -> Product:
+    with METRICS.stage("images"):
+        stored = maybe_download_image(p.image_url, download_dir, offline)
+    METRICS.inc("images_total", result="stored" if stored is not None else "missing")
+    if _JOURNAL is not None and p.image_url:
+        _JOURNAL.record_image(p.image_url, stored)
+    if stored is not None:
+        p.image_digest, p.image_local_path = stored
+    return p
+
+
+def attach_images(products: List[Product], download_dir: str, max_workers: int = 8) -> None:
+    ensure_dir(download_dir)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+        list(ex.map(lambda p: _attach_image(p, download_dir), products))
+
+
+def iter_products_with_images(
+    products: Iterable[Product],
+    download_dir: str,
+    max_workers: int = 8,
+    offline: bool = False,
+) -> Iterator[Product]:
+    """Streaming attach_images: yields each product once its image download finished.
+
+    At most 2 * max_workers downloads are pending; pulling from `products`
+    pauses while that window is full. `offline` attaches already stored
+    images only (see maybe_download_image).
+    """
+    ensure_dir(download_dir)
+    max_in_flight = max(1, max_workers) * 2
+    in_flight: set = set()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+        for p in products:
+            in_flight.add(ex.submit(_attach_image, p, download_dir, offline))
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            else:
+                done = {fut for fut in in_flight if fut.done()}
+                in_flight -= done
+            for fut in done:
+                yield fut.result()
+        for fut in concurrent.futures.as_completed(in_flight):
+            yield fut.result()
+
+
+def parse_price_tiers(soup: Any) -> List[Dict[str, Any]]:
+    """Quantity tiers ({minQty, maxQty, price, currency}) from a detail page, lowest quantity first.
+
+    Inside a price block (by class), a tier is any element holding exactly
+    one price and one quantity range; the block around several tiers is not
+    one more tier.
+    """
+    tiers: Dict[int, Dict[str, Any]] = {}
+    nodes = [
+        node
+        for block in soup.find_all(class_=_TIER_CLASS_RE)
+        for node in [block, *block.find_all(["div", "li", "tr", "dl"])]
+    ]
+    for node in nodes:
+        text = node.get_text(" ", strip=True)
+        prices = _TIER_PRICE_RE.findall(text)
+        quantities = _TIER_QTY_RE.findall(text)
+        if len(prices) != 1 or len(quantities) != 1:
+            continue
+        low, high = quantities[0]
+        min_qty = int(low.replace(",", ""))
+        tiers.setdefault(
+            min_qty,
+            {
+                "minQty": min_qty,
+                "maxQty": int(high.replace(",", "")) if high else None,
+                # Kept as a string: the cache stores JSON, items get a Decimal
+                "price": prices[0].replace(",", ""),
+                "currency": "USD",
+            },
+        )
+    return [tiers[q] for q in sorted(tiers)]
+
+
+def parse_specifications(soup: Any) -> List[Dict[str, str]]:
+    """Label/value rows of the specification table(s), in page order, first occurrence per label."""
+    rows: List[Tuple[str, str]] = []
+    for item in soup.find_all(class_=_SPEC_ITEM_CLASS_RE):
+        label = item.find(class_=_SPEC_LABEL_CLASS_RE)
+        value = item.find(class_=_SPEC_VALUE_CLASS_RE)
+        if label is not None and value is not None:
+            rows.append((label.get_text(" ", strip=True), value.get_text(" ", strip=True)))
+    for tr in soup.find_all("tr"):
+        cells = tr.find_all(["th", "td"], recursive=False)
+        if len(cells) != 2:
+            continue
+        label, value = (c.get_text(" ", strip=True) for c in cells)
+        # Two-column quantity/price tables are tiers, not specifications
+        if _TIER_QTY_RE.search(label) and _TIER_PRICE_RE.search(value):
+            continue
+        rows.append((label, value))
+    specs: Dict[str, str] = {}
+    for label, value in rows:
+        label = label.rstrip(":： ").strip()
+        if label and value and len(label) <= 60 and label not in specs:
+            specs[label] = value
+    return [{"label": k, "value": v} for k, v in specs.items()]
+
+
+def parse_gallery(soup: Any, page_url: str) -> List[str]:
+    """Absolute URLs of the product gallery images, full size where the page links one."""
+    urls: List[str] = []
+    for container in soup.find_all(class_=_GALLERY_CLASS_RE):
+        for img in container.find_all("img"):
+            src = img.get("data-big") or img.get("data-zoom") or _image_src(img.get)
+            if not src or src.startswith("data:") or src.lower().endswith((".svg", ".gif")):
+                continue
+            url = urljoin(page_url, f"https:{src}" if src.startswith("//") else src)
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+
+def parse_product_details(html: str, page_url: str) -> Dict[str, Any]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    meta = soup.find("meta", attrs={"name": "description"}) or soup.find("meta", attrs={"property": "og:description"})
+    return {
+        "description": (meta.get("content") or "").strip() if meta is not None else "",
+        "specifications": parse_specifications(soup),
+        "priceTiers": parse_price_tiers(soup),
+        "gallery": parse_gallery(soup, page_url),
+    }
+
+
+class HostConcurrencyLimiter:
+    """At most `max_per_host` requests in flight per host; other hosts are not held up."""
+
+    def __init__(self, max_per_host: int) -> None:
+        self.max_per_host = max(1, max_per_host)
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._slots.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self._slots[host] = semaphore
+        with semaphore:
+            yield
+
+
+class DetailCache:
+    """SQLite cache of parsed detail pages by product URL, with the listing fingerprint they belong to."""
+
+    def __init__(self, path: str) -> None:
+        parent = os.path.dirname(path)
+        if parent:
+            ensure_dir(parent)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS details ("
+            " url TEXT PRIMARY KEY, listing_hash TEXT NOT NULL, details TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, url: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(listing fingerprint, details) stored for `url`, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT listing_hash, details FROM details WHERE url = ?", (url,)).fetchone()
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def put(self, url: str, listing_hash: str, details: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO details (url, listing_hash, details, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, listing_hash, json.dumps(details, ensure_ascii=False), time.time()),
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def listing_fingerprint(p: Product) -> str:
+    # What the search listing says about a product; a change here means the detail page may have changed
+    listing = [p.title, p.price_text, p.moq_text, p.image_url, p.supplier_url]
+    return hashlib.sha256(json.dumps(listing).encode("utf-8")).hexdigest()
+
+
+def _apply_details(p: Product, details: Dict[str, Any]) -> None:
+    p.description = details.get("description") or ""
+    p.specifications = details.get("specifications") or []
+    p.price_tiers = details.get("priceTiers") or []
+    p.gallery = details.get("gallery") or []
+
+
+def iter_products_enriched(
+    products: Iterable[Product],
+    cache_path: str,
+    max_workers: int = 8,
+    max_per_host: int = 2,
+    rate_limiter: Optional[HostRateLimiter] = None,
+    offline: bool = False,
+) -> Iterator[Product]:
+    """Add description, specifications, price tiers and gallery from each product's detail page.
+
+    Detail pages are fetched by `max_workers` threads with at most
+    `max_per_host` requests per host in flight. A product whose listing
+    fingerprint matches the DetailCache entry is not fetched again;
+    `offline` uses cached details only. A failed fetch leaves the product
+    as listed (or with its older cached details). Like the image stage, at
+    most 2 * max_workers products are pending.
+    """
+    import requests
+
+    cache = DetailCache(cache_path)
+    limiter = HostConcurrencyLimiter(max_per_host)
+
+    def _enrich(p: Product) -> Product:
+        fingerprint = listing_fingerprint(p)
+        cached = cache.get(p.product_url)
+        if cached is not None and (offline or cached[0] == fingerprint):
+            result, details = "cached", cached[1]
+        elif offline:
+            result, details = "offline", None
+        else:
+            try:
+                with METRICS.stage("enrich"), limiter.slot(p.product_url):
+                    html = get_with_retries(p.product_url, rate_limiter=rate_limiter).text
+                details = parse_product_details(html, p.product_url)
+                cache.put(p.product_url, fingerprint, details)
+                result = "fetched"
+            except (requests.RequestException, RuntimeError):
+                result, details = "failed", cached[1] if cached is not None else None
+        METRICS.inc("enrich_total", result=result)
+        if details is not None:
+            _apply_details(p, details)
+        return p
+
+    workers = max(1, max_workers)
+    max_in_flight = workers * 2
+    in_flight: set = set()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+            for p in products:
+                in_flight.add(ex.submit(_enrich, p))
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                else:
+                    done = {fut for fut in in_flight if fut.done()}
+                    in_flight -= done
+                for fut in done:
+                    yield fut.result()
+            for fut in concurrent.futures.as_completed(in_flight):
+                yield fut.result()
+    finally:
+        cache.close()
+
+
+# Near-duplicate detection: 64 MinHash values in 16 bands of 4 rows put titles with a
+# Jaccard similarity above ~0.5 in a shared bucket; candidates are then checked exactly.
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+_MINHASH_PRIME = (1 << 61) - 1
+_MINHASH_RNG = random.Random(0x5EED)
+_MINHASH_COEFFS = [
+    (_MINHASH_RNG.randrange(1, _MINHASH_PRIME), _MINHASH_RNG.randrange(0, _MINHASH_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+TITLE_DUPLICATE_SIMILARITY = 0.7
+# The same photo with a reworded title: a close pHash plus a weaker title match
+PHASH_DUPLICATE_DISTANCE = 6
+PHASH_TITLE_SIMILARITY = 0.35
+# pHash buckets: a 64-bit hash split into 7 bands of 9-10 bits. Hashes at most
+# PHASH_DUPLICATE_DISTANCE bits apart differ in at most that many bands, so they always share one
+PHASH_BANDS = PHASH_DUPLICATE_DISTANCE + 1
+# Products compared exactly per new product, those sharing the most buckets first
+DEDUP_MAX_CANDIDATES = 200
+# Words every listing uses; they would make unrelated titles look alike
+_TITLE_STOPWORDS = frozenset(
+    "a an and for the with of to in on new hot sale high quality style car auto bmw fit fits".split()
+)
+_TITLE_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def title_shingles(title: str) -> set:
+    """Normalized title words (diacritics folded, lowercased, stopwords dropped) as a set."""
+    folded = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode("ascii").lower()
+    return {t for t in _TITLE_TOKEN_RE.findall(folded) if t not in _TITLE_STOPWORDS}
+
+
+def minhash_signature(shingles: Iterable[str]) -> Tuple[int, ...]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    if not hashes:
+        return ()
+    return tuple(min((a * h + b) % _MINHASH_PRIME for h in hashes) for a, b in _MINHASH_COEFFS)
+
+
+def signature_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two MinHash signatures."""
+    if not a or not b:
+        return 0.0
+    return sum(map(operator.eq, a, b)) / len(a)
+
+
+def image_phash(path: str) -> int:
+    """64-bit DCT perceptual hash: low frequencies of a 32x32 grayscale, each bit above/below the median."""
+    try:
+        from PIL import Image
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("Image hashes for --dedup require `pip install Pillow`") from exc
+
+    size, keep = 32, 8
+    with Image.open(path) as img:
+        img.draft("L", (size * 2, size * 2))
+        pixels = list(img.convert("L").resize((size, size), Image.LANCZOS).getdata())
+    cos = [[math.cos((2 * x + 1) * u * math.pi / (2 * size)) for x in range(size)] for u in range(keep)]
+    # Separable DCT, computing only the keep x keep lowest frequencies
+    rows = [
+        [sum(c * v for c, v in zip(cos[u], pixels[y * size:(y + 1) * size])) for u in range(keep)]
+        for y in range(size)
+    ]
+    coeffs = [sum(cos[v][y] * rows[y][u] for y in range(size)) for v in range(keep) for u in range(keep)]
+    median = sorted(coeffs[1:])[len(coeffs) // 2 - 1]  # DC term left out: it is overall brightness
+    return sum(1 << i for i, c in enumerate(coeffs) if c > median)
+
+
+_U64 = (1 << 64) - 1
+
+
+def _sqlite_int(value: int) -> int:
+    # SQLite integers are signed 64-bit; store the hash's bit pattern (read back with & _U64)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _lsh_buckets(chassis: str, signature: Tuple[int, ...], phash: Optional[int]) -> List[str]:
+    buckets = []
+    if signature:
+        rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        for band in range(MINHASH_BANDS):
+            band_hash = hashlib.sha1(repr(signature[band * rows:(band + 1) * rows]).encode("ascii")).hexdigest()
+            buckets.append(f"t{band}:{chassis}:{band_hash[:16]}")
+    if phash is not None:
+        edges = [64 * band // PHASH_BANDS for band in range(PHASH_BANDS + 1)]
+        for band in range(PHASH_BANDS):
+            bits = edges[band + 1] - edges[band]
+            buckets.append(f"i{band}:{chassis}:{(phash >> edges[band]) & ((1 << bits) - 1):x}")
+    return buckets
+
+
+class DuplicateIndex:
+    """Persistent LSH index assigning products to near-duplicate clusters.
+
+    Title MinHash bands and image pHash bands are bucket keys in SQLite, so a
+    new product is compared only with products sharing a bucket, never with
+    the whole catalog. Buckets include the chassis code: an F80 and a G80
+    lip with otherwise equal titles are different parts. A cluster is named
+    after its first member and products keep their cluster on later runs.
+    At most `max_candidates` products (0: no limit) are compared per new
+    product; `capped` counts the products for which that limit was hit.
+    """
+
+    def __init__(self, path: str, max_candidates: int = DEDUP_MAX_CANDIDATES) -> None:
+        parent = os.path.dirname(path)
+        if parent:
+            ensure_dir(parent)
+        self.max_candidates = max_candidates
+        self.capped = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS members ("
+            " product_id TEXT PRIMARY KEY, cluster_id TEXT NOT NULL, signature BLOB NOT NULL, phash INTEGER)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (bucket TEXT NOT NULL, product_id TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS buckets_by_key ON buckets (bucket)")
+        # Keyed by image content digest, so a hash is computed once per distinct image
+        self._db.execute("CREATE TABLE IF NOT EXISTS image_hashes (digest TEXT PRIMARY KEY, phash INTEGER NOT NULL)")
+        self._db.commit()
+
+    def _phash(self, p: Product) -> Optional[int]:
+        if not p.image_digest or not p.image_local_path:
+            return None
+        row = self._db.execute("SELECT phash FROM image_hashes WHERE digest = ?", (p.image_digest,)).fetchone()
+        if row is not None:
+            return row[0] & _U64
+        try:
+            value = image_phash(p.image_local_path)
+        except OSError:
+            return None
+        self._db.execute(
+            "INSERT OR REPLACE INTO image_hashes (digest, phash) VALUES (?, ?)", (p.image_digest, _sqlite_int(value))
+        )
+        return value
+
+    def assign(self, p: Product) -> str:
+        """Cluster id for `p`, joining the most similar matching cluster or starting a new one."""
+        row = self._db.execute("SELECT cluster_id FROM members WHERE product_id = ?", (p.product_id,)).fetchone()
+        if row is not None:
+            METRICS.inc("dedup_products_total", result="known")
+            return row[0]
+
+        chassis = parse_chassis(p.category, p.title)
+        signature = minhash_signature(title_shingles(p.title or ""))
+        phash = self._phash(p)
+        buckets = _lsh_buckets(chassis, signature, phash)
+
+        best: Optional[Tuple[float, str]] = None
+        if buckets:
+            marks = ",".join("?" * len(buckets))
+            # One row past the limit tells whether it was hit; LIMIT -1 is no limit
+            limit = self.max_candidates + 1 if self.max_candidates > 0 else -1
+            candidates = self._db.execute(
+                "SELECT m.product_id, m.cluster_id, m.signature, m.phash FROM members m JOIN "
+                f"(SELECT product_id, COUNT(*) AS shared FROM buckets WHERE bucket IN ({marks})"
+                " GROUP BY product_id ORDER BY shared DESC, product_id LIMIT ?) c"
+                " ON c.product_id = m.product_id ORDER BY c.shared DESC, m.product_id",
+                (*buckets, limit),
+            ).fetchall()
+            if 0 < self.max_candidates < len(candidates):
+                candidates = candidates[: self.max_candidates]
+                self.capped += 1
+                METRICS.inc("dedup_candidates_capped_total")
+            for _, cluster_id, other_signature, other_phash in candidates:
+                similarity = signature_similarity(signature, array.array("Q", other_signature))
+                same_image = (
+                    phash is not None
+                    and other_phash is not None
+                    and bin(phash ^ (other_phash & _U64)).count("1") <= PHASH_DUPLICATE_DISTANCE
+                )
+                if similarity >= TITLE_DUPLICATE_SIMILARITY or (same_image and similarity >= PHASH_TITLE_SIMILARITY):
+                    if best is None or similarity > best[0]:
+                        best = (similarity, cluster_id)
+
+        cluster_id = best[1] if best is not None else p.product_id
+        METRICS.inc("dedup_products_total", result="joined" if best is not None else "new_cluster")
+        self._db.execute(
+            "INSERT INTO members (product_id, cluster_id, signature, phash) VALUES (?, ?, ?, ?)",
+            (p.product_id, cluster_id, array.array("Q", signature).tobytes(), _sqlite_int(phash) if phash is not None else None),
+        )
+        self._db.executemany(
+            "INSERT INTO buckets (bucket, product_id) VALUES (?, ?)", [(b, p.product_id) for b in buckets]
+        )
+        return cluster_id
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+
+def _price_rank(p: Product) -> Tuple[int, decimal.Decimal]:
+    # Lowest price first, the same Decimal product_to_item stores (first tier when enriched);
+    # products without a price lose to any priced one
+    price = decimal.Decimal(p.price_tiers[0]["price"]) if p.price_tiers else parse_price_value(p.price_text)
+    return (0, price) if price > 0 else (1, decimal.Decimal(0))
+
+
+def iter_deduplicated_products(
+    products: Iterable[Product],
+    index_path: str,
+    best_only: bool = False,
+    max_candidates: int = DEDUP_MAX_CANDIDATES,
+) -> Iterator[Product]:
+    """Set `cluster_id` on each product from a DuplicateIndex at `index_path`.
+
+    Products stream through unchanged otherwise. With `best_only`, only the
+    best-priced product of each cluster seen in this run is yielded, after
+    the input is exhausted (one product per cluster is held in memory).
+    """
+    index = DuplicateIndex(index_path, max_candidates=max_candidates)
+    best: Dict[str, Product] = {}
+    sizes: collections.Counter = collections.Counter()
+    try:
+        for n, p in enumerate(products, start=1):
+            with METRICS.stage("dedup"):
+                p.cluster_id = index.assign(p)
+            sizes[p.cluster_id] += 1
+            if n % 500 == 0:
+                index.commit()
+            if not best_only:
+                yield p
+            elif p.cluster_id not in best or _price_rank(p) < _price_rank(best[p.cluster_id]):
+                best[p.cluster_id] = p
+        index.commit()
+    finally:
+        index.close()
+    duplicates = sum(sizes.values()) - len(sizes)
+    print(f"Dedup: {sum(sizes.values())} products in {len(sizes)} clusters ({duplicates} near-duplicates)")
+    if index.capped:
+        print(
+            f"Warning: {index.capped} products had more than {index.max_candidates} dedup candidates; "
+            "only the closest were compared (raise --dedup-max-candidates)"
+        )
+    yield from best.values()
+
+
+# Pillow format names and file extensions for derivative images
+VARIANT_FORMATS = {"avif": ("AVIF", ".avif"), "webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg")}
+
+
+def _render_variants(
+    src_path: str,
+    out_dir: str,
+    widths: Tuple[int, ...],
+    formats: Tuple[str, ...],
+    quality: int,
+) -> List[Dict[str, Any]]:
+    """Process-pool worker: write resized variants of one source image into `out_dir`.
+
+    Returns the variant metadata list that is also persisted as `meta.json`.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError("Image variants require `pip install Pillow`") from exc
+
+    ensure_dir(out_dir)
+    with Image.open(src_path) as img:
+        # JPEG can decode at a reduced scale directly, which is much cheaper than a full decode
+        img.draft("RGB", (max(widths), max(widths)))
+        img = ImageOps.exif_transpose(img)
+        src_w, src_h = img.size
+        # Never upscale; a source smaller than every width yields one variant at its own size
+        targets = sorted({w for w in widths if w < src_w} | ({src_w} if any(w >= src_w for w in widths) else set()))
+        variants: List[Dict[str, Any]] = []
+        for width in targets:
+            height = max(1, round(src_h * width / src_w))
+            resized = img if width == src_w else img.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                pil_format, ext = VARIANT_FORMATS[fmt]
+                frame = resized
+                if pil_format == "JPEG" and frame.mode not in ("RGB", "L"):
+                    frame = frame.convert("RGB")
+                path = os.path.join(out_dir, f"{width}{ext}")
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                frame.save(tmp_path, format=pil_format, quality=quality)
+                os.replace(tmp_path, path)
+                variants.append({"width": width, "height": height, "format": fmt, "path": path})
+    meta_path = os.path.join(out_dir, "meta.json")
+    with open(f"{meta_path}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"widths": list(widths), "formats": list(formats), "variants": variants}, f)
+    os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+    return variants
+
+
+def _load_variant_meta(
+    out_dir: str,
+    widths: Tuple[int, ...],
+    formats: Tuple[str, ...],
+) -> Optional[List[Dict[str, Any]]]:
+    """Variants rendered earlier for the same digest and settings, if all files are still there."""
+    try:
+        with open(os.path.join(out_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("widths") != list(widths) or meta.get("formats") != list(formats):
+        return None
+    variants = meta.get("variants") or []
+    if not all(os.path.exists(v["path"]) for v in variants):
+        return None
+    return variants
+
+
+def _with_variant_urls(variants: List[Dict[str, Any]], variants_dir: str, url_base: Optional[str]) -> List[Dict[str, Any]]:
+    out = []
+    for v in variants:
+        v = dict(v)
+        if url_base:
+            rel = os.path.relpath(v["path"], variants_dir).replace(os.sep, "/")
+            v["url"] = f"{url_base.rstrip('/')}/{rel}"
+        out.append(v)
+    return out
+
+
+def iter_products_with_variants(
+    products: Iterable[Product],
+    variants_dir: str,
+    widths: Tuple[int, ...],
+    formats: Tuple[str, ...] = ("webp", "jpeg"),
+    url_base: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    quality: int = 80,
+) -> Iterator[Product]:
+    """Attach resized variants to each product, rendering them in a process pool.
+
+    Variants live under `<variants_dir>/<source sha256>/`, so a variant is only
+    rendered again when the source image digest changes. Products sharing an
+    image digest share one render job.
+    """
+    ensure_dir(variants_dir)
+    workers = max_workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    # Products waiting on a render job, keyed by the job's future
+    waiting: Dict[concurrent.futures.Future, List[Product]] = {}
+    by_digest: Dict[str, concurrent.futures.Future] = {}
+
+    def _finish(fut: concurrent.futures.Future) -> Iterator[Product]:
+        waiters = waiting.pop(fut)
+        digest = waiters[0].image_digest
+        by_digest.pop(digest, None)
+        try:
+            variants = _with_variant_urls(fut.result(), variants_dir, url_base)
+        except Exception as exc:  # noqa: BLE001 - a broken image must not stop the import
+            print(f"Variant generation failed for {waiters[0].image_local_path}: {exc}", file=sys.stderr)
+            variants = []
+        METRICS.inc("image_variants_rendered_total", len(variants))
+        for p in waiters:
+            p.image_variants = variants
+            yield p
+
+    import multiprocessing
+
+    # Spawned like make_parse_pool: image download threads are still running when the pool starts
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as ex:
+        for p in products:
+            if not p.image_digest or not p.image_local_path:
+                yield p
+                continue
+            out_dir = os.path.join(variants_dir, p.image_digest)
+            if p.image_digest in by_digest:
+                waiting[by_digest[p.image_digest]].append(p)
+                continue
+            cached = _load_variant_meta(out_dir, widths, formats)
+            if cached is not None:
+                p.image_variants = _with_variant_urls(cached, variants_dir, url_base)
+                yield p
+                continue
+            fut = ex.submit(_render_variants, p.image_local_path, out_dir, widths, formats, quality)
+            waiting[fut] = [p]
+            by_digest[p.image_digest] = fut
+            if len(waiting) >= max_in_flight:
+                done, _ = concurrent.futures.wait(list(waiting), return_when=concurrent.futures.FIRST_COMPLETED)
+            else:
+                done = [fut for fut in waiting if fut.done()]
+            for fut in done:
+                yield from _finish(fut)
+        for fut in concurrent.futures.as_completed(list(waiting)):
+            yield from _finish(fut)
+
+
+# Published objects are content-addressed, so they can be cached forever
+S3_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _local_s3_etag(path: str, multipart_threshold: int, multipart_chunksize: int) -> str:
+    """The ETag S3 will report for `path` when uploaded with the given transfer settings."""
+    from s3transfer.utils import ChunksizeAdjuster
+
+    size = os.path.getsize(path)
+    if size < multipart_threshold:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    chunksize = ChunksizeAdjuster().adjust_chunksize(multipart_chunksize, size)
+    part_digests = []
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunksize), b""):
+            part_digests.append(hashlib.md5(chunk).digest())
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+class S3Publisher:
+    """Uploads files through one shared boto3 transfer manager (multipart for large files).
+
+    Existing objects are listed once under `prefix`; an upload is skipped when
+    the key already exists with the ETag the local file would produce.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        public_url_base: Optional[str] = None,
+        region_name: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        max_concurrency: int = 10,
+    ) -> None:
+        import boto3
+        import botocore.config
+        from boto3.s3.transfer import TransferConfig, create_transfer_manager
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        session = boto3.session.Session(region_name=region_name)
+        self._client = session.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            config=botocore.config.Config(max_pool_connections=max(10, max_concurrency)),
+        )
+        region = self._client.meta.region_name
+        self.public_url_base = (public_url_base or f"https://{bucket}.s3.{region}.amazonaws.com").rstrip("/")
+        self._config = TransferConfig(max_concurrency=max_concurrency)
+        self._manager = create_transfer_manager(self._client, self._config)
+        self._existing = self._list_etags()
+        self._lock = threading.Lock()
+        # key -> in-flight or finished upload future (None when skipped)
+        self._uploads: Dict[str, Optional[concurrent.futures.Future]] = {}
+        self.uploaded = 0
+        self.skipped = 0
+
+    def _list_etags(self) -> Dict[str, str]:
+        etags: Dict[str, str] = {}
+        paginator = self._client.get_paginator("list_objects_v2")
+        list_prefix = f"{self.prefix}/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=list_prefix):
+            for obj in page.get("Contents", []):
+                etags[obj["Key"]] = obj["ETag"].strip('"')
+        return etags
+
+    def key_for(self, relative_key: str) -> str:
+        return f"{self.prefix}/{relative_key}" if self.prefix else relative_key
+
+    def url_for(self, key: str) -> str:
+        return f"{self.public_url_base}/{key}"
+
+    def publish(self, path: str, key: str, extra_args_override: Optional[Dict[str, str]] = None) -> Optional[Any]:
+        """Start uploading `path` to `key`; returns a future, or None if the object is current.
+
+        `extra_args_override` replaces default upload headers (CacheControl, ContentType, ...).
+        """
+        with self._lock:
+            if key in self._uploads:
+                return self._uploads[key]
+            self._uploads[key] = None
+        etag = _local_s3_etag(path, self._config.multipart_threshold, self._config.multipart_chunksize)
+        if self._existing.get(key) == etag:
+            with self._lock:
+                self.skipped += 1
+            METRICS.inc("s3_objects_total", result="present")
+            return None
+        extra_args = {
+            "CacheControl": S3_CACHE_CONTROL,
+            "ContentType": mimetypes.guess_type(path)[0] or "application/octet-stream",
+        }
+        extra_args.update(extra_args_override or {})
+        future = self._manager.upload(path, self.bucket, key, extra_args=extra_args)
+        METRICS.inc("s3_objects_total", result="uploaded")
+        METRICS.inc("s3_bytes_total", os.path.getsize(path))
+        with self._lock:
+            self._uploads[key] = future
+            self.uploaded += 1
+        return future
+
+    def existing_keys(self) -> List[str]:
+        """Keys that were under the prefix when the publisher was created."""
+        return list(self._existing)
+
+    def delete(self, keys: List[str]) -> None:
+        # DeleteObjects takes at most 1000 keys per request
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            resp = self._client.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True}
+            )
+            if resp.get("Errors"):
+                raise RuntimeError(f"S3 DeleteObjects failed for {len(resp['Errors'])} keys: {resp['Errors'][0]}")
+            METRICS.inc("s3_objects_total", len(batch), result="deleted")
+            with self._lock:
+                for key in batch:
+                    self._existing.pop(key, None)
+
+    def close(self) -> None:
+        self._manager.shutdown()
+
+
+def _publish_product_images(p: Product, publisher: S3Publisher) -> List[Any]:
+    futures = []
+    if p.image_local_path and p.image_digest:
+        key = publisher.key_for(os.path.basename(p.image_local_path))
+        futures.append(publisher.publish(p.image_local_path, key))
+        p.image_public_url = publisher.url_for(key)
+    for v in p.image_variants:
+        key = publisher.key_for(f"variants/{p.image_digest}/{os.path.basename(v['path'])}")
+        futures.append(publisher.publish(v["path"], key))
+        v["url"] = publisher.url_for(key)
+    return [f for f in futures if f is not None]
+
+
+def iter_products_published_to_s3(
+    products: Iterable[Product],
+    publisher: S3Publisher,
+    max_pending: int = 64,
+) -> Iterator[Product]:
+    """Upload each product's stored image and variants, then point its URLs at S3/CDN.
+
+    Products are yielded in order once their uploads have completed; at most
+    `max_pending` products wait on uploads at any time.
+    """
+    waiting: "collections.deque[Tuple[Product, List[Any]]]" = collections.deque()
+    for p in products:
+        waiting.append((p, _publish_product_images(p, publisher)))
+        while waiting and (len(waiting) >= max_pending or all(f.done() for f in waiting[0][1])):
+            head, futures = waiting.popleft()
+            with METRICS.stage("s3"):
+                for f in futures:
+                    f.result()
+            yield head
+    while waiting:
+        head, futures = waiting.popleft()
+        with METRICS.stage("s3"):
+            for f in futures:
+                f.result()
+        yield head
+
+
+def parse_price_value(price_text: Optional[str]) -> decimal.Decimal:
+    """First amount in a listing price, e.g. "US$1,200.50-1,500.00" -> 1200.50; 0 if there is none.
+
+    Only thousands separators are dropped: with both "," and "." the later
+    one is the decimal point, a lone "," is a separator only in 3-digit groups.
+    """
+    if not price_text:
+        return decimal.Decimal(0)
+    match = _PRICE_NUMBER_RE.search(price_text)
+    if match is None:
+        return decimal.Decimal(0)
+    num = match.group(0).rstrip(",.")
+    if "," in num and "." in num:
+        thousands = "," if num.rfind(",") < num.rfind(".") else "."
+        num = num.replace(thousands, "").replace(",", ".")
+    elif "," in num:
+        num = num.replace(",", "") if _THOUSANDS_GROUPED_RE.fullmatch(num) else num.replace(",", ".")
+    elif num.count(".") > 1:
+        num = num.replace(".", "")
+    try:
+        return decimal.Decimal(num)
+    except decimal.InvalidOperation:
+        return decimal.Decimal(0)
+
+
+def product_to_item(p: Product, extra_attrs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Map to FE-expected structure while keeping admin metadata
+    # id/name/price/image/images/description/specifications/features
+    item = {
+        # Keys
+        "pk": f"prod#{p.product_id}",
+        "sk": "prod",
+        # FE fields
+        "id": p.product_id,
+        "name": p.title,
+        "price": parse_price_value(p.price_text),
+        "image": p.image_public_url or p.image_url or "",
+        "images": _item_images(p),
+        "description": p.description,
+        "specifications": p.specifications,
+        "features": [],
+        # Category hint from the query (manifest entry or --category) that found the product
+        "category": p.category or DEFAULT_CATEGORY,
+        # Admin/source metadata
+        "productUrl": p.product_url,
+        "imageLocalPath": p.image_local_path or "",
+        "priceText": p.price_text or "",
+        "moqText": p.moq_text or "",
+        "supplierName": p.supplier_name or "",
+        "supplierUrl": p.supplier_url or "",
+        "source": p.source,
+        # Query keys for the storefront GSIs (see PRODUCT_INDEXES)
+        "listing": LISTING_KEY,
+        "chassis": parse_chassis(p.category, p.title),
+    }
+    if p.price_tiers:
+        # The detail page's lowest-quantity tier is the single-unit price; the listing snippet is a fallback
+        item["priceTiers"] = [{**tier, "price": decimal.Decimal(tier["price"])} for tier in p.price_tiers]
+        item["price"] = item["priceTiers"][0]["price"]
+    if item["price"] > 0:
+        # Sparse: products without a parsed price stay out of the price-sorted indexes. Same
+        # Decimal scale as price and priceTiers, so $12.50 sorts below $100
+        item["priceSort"] = item["price"]
+    variants = [
+        {"url": v["url"], "width": v["width"], "height": v["height"], "format": v["format"]}
+        for v in p.image_variants
+        if v.get("url")
+    ]
+    if variants:
+        item["imageVariants"] = variants
+    if p.image_public_url and p.image_url:
+        item["sourceImageUrl"] = p.image_url
+    if p.cluster_id:
+        item["clusterId"] = p.cluster_id
+    if extra_attrs:
+        item.update(extra_attrs)
+    # Per-query attributes win over the run-wide --extra-attr ones
+    item.update(p.extra_attrs)
+    return item
+
+
+def parse_chassis(*texts: Optional[str]) -> str:
+    """First chassis code in the given texts (category before title), e.g. 'F80'; 'other' if none."""
+    for text in texts:
+        if text:
+            match = _CHASSIS_RE.search(text)
+            if match:
+                return match.group(1).upper()
+    return "other"
+
+
+def _apply_recency(item: Dict[str, Any], first_seen: int, now: int) -> None:
+    item["firstSeenAt"] = first_seen
+    item["isNew"] = now - first_seen < NEW_PRODUCT_DAYS * 86400
+    # Sorts new products first, then by first import time; Query with ScanIndexForward=False
+    item["recencyKey"] = f"{int(item['isNew'])}#{first_seen:010d}"
+
+
+def _item_images(p: Product) -> List[str]:
+    # Prefer the largest published variant over the hotlinked source; FE builds srcset from imageVariants
+    published = [v for v in p.image_variants if v.get("url")]
+    if published:
+        largest = max(published, key=lambda v: (v["width"], v["format"] == "jpeg"))
+        images = [largest["url"]]
+    else:
+        image = p.image_public_url or p.image_url
+        images = [image] if image else []
+    # Detail page gallery (hotlinked), without the listing image it usually repeats
+    return images + [url for url in p.gallery if url != p.image_url and url not in images]
+
+
+# Attributes that change on every write and must not influence change detection
+_VOLATILE_ITEM_ATTRS = frozenset({"updatedAt", "contentHash"})
+
+
+def item_content_hash(item: Dict[str, Any]) -> str:
+    payload = {k: v for k, v in item.items() if k not in _VOLATILE_ITEM_ATTRS}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ChangeIndex:
+    """Local SQLite record of the contentHash last written for each item key, per table.
+
+    It also remembers when each item was first imported, which drives isNew/recencyKey,
+    and its category, which scopes --delete-missing to the categories a run crawled.
+    """
+
+    def __init__(self, path: str) -> None:
+        parent = os.path.dirname(path)
+        if parent:
+            ensure_dir(parent)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS item_hashes ("
+            " table_name TEXT NOT NULL, item_key TEXT NOT NULL, content_hash TEXT NOT NULL,"
+            " first_seen INTEGER, category TEXT, PRIMARY KEY (table_name, item_key))"
+        )
+        self._db.commit()
+
+    def has_table(self, table_name: str) -> bool:
+        row = self._db.execute("SELECT 1 FROM item_hashes WHERE table_name = ? LIMIT 1", (table_name,)).fetchone()
+        return row is not None
+
+    def get(self, table_name: str, item_key: str) -> Optional[Tuple[str, Optional[int]]]:
+        """(content hash, first seen epoch) of a known item, or None."""
+        row = self._db.execute(
+            "SELECT content_hash, first_seen FROM item_hashes WHERE table_name = ? AND item_key = ?",
+            (table_name, item_key),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(
+        self,
+        table_name: str,
+        item_key: str,
+        content_hash: str,
+        first_seen: Optional[int] = None,
+        category: Optional[str] = None,
+    ) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO item_hashes (table_name, item_key, content_hash, first_seen, category)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (table_name, item_key, content_hash, first_seen, category),
+        )
+
+    def delete(self, table_name: str, item_key: str) -> None:
+        self._db.execute("DELETE FROM item_hashes WHERE table_name = ? AND item_key = ?", (table_name, item_key))
+
+    def keys(self, table_name: str, categories: Optional[Set[str]] = None) -> Iterator[str]:
+        """Item keys of a table, optionally only those last written under one of `categories`."""
+        rows = self._db.execute("SELECT item_key, category FROM item_hashes WHERE table_name = ?", (table_name,))
+        for item_key, category in rows:
+            if categories is None or category in categories:
+                yield item_key
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+@dataclass
+class WriteSummary:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    writers: List["WriterStats"] = field(default_factory=list)
+
+    @property
+    def written(self) -> int:
+        return self.inserted + self.updated
+
+
+def _item_key(item: Dict[str, Any], key_names: List[str]) -> Dict[str, Any]:
+    return {name: item[name] for name in key_names}
+
+
+def _encode_item_key(key: Dict[str, Any]) -> str:
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+def _fetch_remote_state(
+    dynamodb: Any,
+    table_name: str,
+    keys: List[Dict[str, Any]],
+) -> Dict[str, Tuple[Optional[str], Optional[int]]]:
+    """BatchGetItem (contentHash, firstSeenAt) of up to 100 keys; missing items are absent from the result."""
+    key_names = sorted(keys[0])
+    # Expression attribute names keep reserved words (and "pk"/"sk") safe in the projection
+    names = {f"#k{i}": name for i, name in enumerate(key_names)}
+    names["#h"] = "contentHash"
+    names["#f"] = "firstSeenAt"
+    request = {
+        table_name: {
+            "Keys": keys,
+            "ProjectionExpression": ", ".join(list(names)),
+            "ExpressionAttributeNames": names,
+        }
+    }
+    found: Dict[str, Tuple[Optional[str], Optional[int]]] = {}
+    attempt = 0
+    while request:
+        resp = dynamodb.batch_get_item(RequestItems=request)
+        for item in resp.get("Responses", {}).get(table_name, []):
+            first_seen = item.get("firstSeenAt")
+            found[_encode_item_key(_item_key(item, key_names))] = (
+                item.get("contentHash"),
+                int(first_seen) if first_seen is not None else None,
+            )
+        request = resp.get("UnprocessedKeys") or {}
+        if request:
+            time.sleep(min(0.05 * (2 ** attempt), 2.0))
+            attempt += 1
+    return found
+
+
+def _scan_imported_keys(
+    table: Any,
+    key_names: List[str],
+    source: str,
+    categories: Optional[Set[str]] = None,
+) -> Iterator[str]:
+    """Keys of items this importer wrote (matched by `source`), optionally only in `categories`.
+
+    Used when no local index exists.
+    """
+    from boto3.dynamodb.conditions import Attr
+
+    names = {f"#k{i}": name for i, name in enumerate(key_names)}
+    names["#c"] = "category"
+    kwargs: Dict[str, Any] = {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+        "FilterExpression": Attr("source").eq(source),
+    }
+    while True:
+        resp = table.scan(**kwargs)
+        for item in resp.get("Items", []):
+            if categories is None or item.get("category") in categories:
+                yield _encode_item_key(_item_key(item, key_names))
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _instrument_dynamodb_client(client: Any) -> None:
+    """Time batch calls and ask DynamoDB for ConsumedCapacity, feeding both into METRICS."""
+    local = threading.local()
+
+    def _request_capacity(params: Dict[str, Any], **_: Any) -> None:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    def _start(**_: Any) -> None:
+        local.started = time.perf_counter()
+
+    def _record(operation: str, parsed: Dict[str, Any]) -> None:
+        started = getattr(local, "started", None)
+        if started is not None:
+            METRICS.observe("dynamodb_request_seconds", time.perf_counter() - started, operation=operation)
+        for consumed in parsed.get("ConsumedCapacity") or []:
+            METRICS.inc("dynamodb_consumed_capacity_units_total", consumed.get("CapacityUnits", 0), operation=operation)
+        unprocessed = parsed.get("UnprocessedItems") or parsed.get("UnprocessedKeys") or {}
+        for pending in unprocessed.values():
+            count = len(pending) if isinstance(pending, list) else len(pending.get("Keys", []))
+            METRICS.inc("dynamodb_unprocessed_total", count, operation=operation)
+
+    for operation in ("BatchWriteItem", "BatchGetItem"):
+        client.meta.events.register(f"provide-client-params.dynamodb.{operation}", _request_capacity)
+        client.meta.events.register(f"before-call.dynamodb.{operation}", _start)
+        client.meta.events.register(
+            f"after-call.dynamodb.{operation}",
+            lambda parsed, _op=operation, **kw: _record(_op, parsed),
+        )
+
+
+@dataclass
+class WriterStats:
+    worker: int
+    items: int = 0
+    requests: int = 0
+    retried_items: int = 0
+    backoff_sec: float = 0.0
+    busy_sec: float = 0.0
+
+    @property
+    def items_per_sec(self) -> float:
+        return self.items / self.busy_sec if self.busy_sec else 0.0
+
+
+_WRITER_STOP = object()
+
+
+def _request_wcu(request: Dict[str, Any]) -> int:
+    # Estimated write units: 1 per started KB of the (serialized) item, as DynamoDB bills them
+    return max(1, math.ceil(len(json.dumps(request, separators=(",", ":"))) / 1024))
+
+
+class DynamoBulkWriter:
+    """Parallel drop-in for table.batch_writer(): put_item/delete_item fan out to worker threads.
+
+    Items are sharded by key, so all writes to one key go through the same
+    worker in order. Each worker has its own client and sends 25-item
+    BatchWriteItem calls. UnprocessedItems are resent after a jittered
+    exponential backoff, and a worker that keeps getting throttled paces its
+    following batches until DynamoDB accepts them whole again.
+    `max_wcu_per_sec` caps the estimated write units sent per second across
+    all workers, to stay inside a table's provisioned capacity.
+    `on_flushed(kind, payload, encoded_key)` is called from the worker thread
+    for every put/delete once DynamoDB has accepted it.
+    """
+
+    BATCH_SIZE = 25
+
+    def __init__(
+        self,
+        table_name: str,
+        key_names: List[str],
+        region_name: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        workers: int = 4,
+        max_wcu_per_sec: Optional[float] = None,
+        max_attempts: int = 10,
+        base_delay: float = 0.05,
+        max_delay: float = 5.0,
+        on_flushed: Optional[Callable[[str, Dict[str, Any], str], None]] = None,
+    ) -> None:
+        self.table_name = table_name
+        self.on_flushed = on_flushed
+        self.key_names = list(key_names)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        workers = max(1, workers)
+        self.stats = [WriterStats(worker=i) for i in range(workers)]
+        self._rate = TokenBucket(max_wcu_per_sec, max_wcu_per_sec) if max_wcu_per_sec else None
+        self._error: Optional[BaseException] = None
+        self._error_lock = threading.Lock()
+        import boto3
+
+        # Sessions are not thread-safe, so every worker gets a client built from its own
+        self._clients = []
+        for _ in range(workers):
+            client = boto3.session.Session(region_name=region_name).client("dynamodb", endpoint_url=endpoint_url)
+            _instrument_dynamodb_client(client)
+            self._clients.append(client)
+        # A couple of batches of look-ahead per worker; a full queue blocks the producer
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=self.BATCH_SIZE * 4) for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(i,), name=f"dynamodb-writer-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __enter__(self) -> "DynamoBulkWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.close(raise_errors=exc_type is None)
+
+    def put_item(self, Item: Dict[str, Any]) -> None:  # noqa: N803 - mirrors batch_writer
+        self._submit("put", Item, _item_key(Item, self.key_names))
+
+    def delete_item(self, Key: Dict[str, Any]) -> None:  # noqa: N803 - mirrors batch_writer
+        self._submit("delete", Key, Key)
+
+    def close(self, raise_errors: bool = True) -> None:
+        for q in self._queues:
+            q.put(_WRITER_STOP)
+        for t in self._threads:
+            t.join()
+        for stats in self.stats:
+            labels = {"worker": str(stats.worker)}
+            METRICS.inc("dynamodb_writer_items_total", stats.items, **labels)
+            METRICS.inc("dynamodb_writer_busy_seconds_total", stats.busy_sec, **labels)
+            METRICS.inc("dynamodb_writer_backoff_seconds_total", stats.backoff_sec, **labels)
+        if raise_errors and self._error is not None:
+            raise RuntimeError(f"DynamoDB bulk write failed: {self._error}") from self._error
+
+    def _submit(self, kind: str, payload: Dict[str, Any], key: Dict[str, Any]) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"DynamoDB bulk write failed: {self._error}") from self._error
+        encoded_key = _encode_item_key(key)
+        shard = int(hashlib.sha1(encoded_key.encode("utf-8")).hexdigest()[:8], 16) % len(self._queues)
+        self._queues[shard].put((kind, payload, encoded_key))
+
+    def _run(self, worker: int) -> None:
+        from boto3.dynamodb.types import TypeSerializer
+
+        q = self._queues[worker]
+        serializer = TypeSerializer()
+        pace = 0.0
+        stopping = False
+        while not stopping:
+            first = q.get()
+            if first is _WRITER_STOP:
+                return
+            ops = [first]
+            # Fill the batch from what is already queued, with a short linger for stragglers
+            while len(ops) < self.BATCH_SIZE:
+                try:
+                    op = q.get(timeout=0.05)
+                except queue.Empty:
+                    break
+                if op is _WRITER_STOP:
+                    stopping = True
+                    break
+                ops.append(op)
+            if self._error is not None:
+                continue  # keep draining so producers never block on a dead worker
+            try:
+                pace = self._write_batch(worker, ops, serializer, pace)
+            except Exception as e:  # noqa: BLE001
+                with self._error_lock:
+                    if self._error is None:
+                        self._error = e
+
+    def _write_batch(
+        self,
+        worker: int,
+        ops: List[Tuple[str, Dict[str, Any], str]],
+        serializer: "TypeSerializer",
+        pace: float,
+    ) -> float:
+        stats = self.stats[worker]
+        client = self._clients[worker]
+        # BatchWriteItem rejects two requests for one key; the last one is the state we want
+        by_key: Dict[str, Dict[str, Any]] = {}
+        for kind, payload, encoded_key in ops:
+            serialized = {k: serializer.serialize(v) for k, v in payload.items()}
+            if kind == "put":
+                by_key[encoded_key] = {"PutRequest": {"Item": serialized}}
+            else:
+                by_key[encoded_key] = {"DeleteRequest": {"Key": serialized}}
+        pending = list(by_key.values())
+
+        started = time.perf_counter()
+        if pace:
+            time.sleep(pace)
+            stats.backoff_sec += pace
+        attempt = 0
+        while pending:
+            if self._rate is not None:
+                self._rate.acquire(sum(_request_wcu(r) for r in pending))
+            resp = client.batch_write_item(RequestItems={self.table_name: pending})
+            stats.requests += 1
+            unprocessed = (resp.get("UnprocessedItems") or {}).get(self.table_name, [])
+            stats.items += len(pending) - len(unprocessed)
+            if not unprocessed:
+                break
+            attempt += 1
+            if attempt >= self.max_attempts:
+                raise RuntimeError(f"{len(unprocessed)} items still unprocessed after {attempt} attempts")
+            stats.retried_items += len(unprocessed)
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+            time.sleep(delay)
+            stats.backoff_sec += delay
+            pending = unprocessed
+        # Throttled batches slow this worker's next ones down; clean ones ease the pace off again
+        if attempt:
+            pace = min(self.max_delay, max(self.base_delay, pace * 2))
+        else:
+            pace = pace / 2 if pace > self.base_delay else 0.0
+        stats.busy_sec += time.perf_counter() - started
+        if self.on_flushed is not None:
+            for kind, payload, encoded_key in ops:
+                self.on_flushed(kind, payload, encoded_key)
+        return pace
+
+
+LISTING_KEY = "product"
+NEW_PRODUCT_DAYS = 30
+# GSIs the storefront queries instead of scanning: category pages by chassis (newest or cheapest
+# first) and the whole catalogue by price. Items carry every key attribute except priceSort
+# when the price is unknown.
+PRODUCT_INDEXES = [
+    {"name": "chassis-recency-index", "hash": ("chassis", "S"), "range": ("recencyKey", "S")},
+    {"name": "chassis-price-index", "hash": ("chassis", "S"), "range": ("priceSort", "N")},
+    {"name": "listing-price-index", "hash": ("listing", "S"), "range": ("priceSort", "N")},
+]
+
+
+def _index_key_schema(spec: Dict[str, Any]) -> List[Dict[str, str]]:
+    return [
+        {"AttributeName": spec["hash"][0], "KeyType": "HASH"},
+        {"AttributeName": spec["range"][0], "KeyType": "RANGE"},
+    ]
+
+
+def missing_product_indexes(table: Any) -> List[str]:
+    """Names of PRODUCT_INDEXES the (loaded) table lacks; raises if one exists with other keys."""
+    existing = {gsi["IndexName"]: gsi for gsi in table.global_secondary_indexes or []}
+    missing = []
+    for spec in PRODUCT_INDEXES:
+        gsi = existing.get(spec["name"])
+        if gsi is None:
+            missing.append(spec["name"])
+        elif gsi["KeySchema"] != _index_key_schema(spec):
+            raise RuntimeError(f"Index {spec['name']} on {table.name} has an unexpected key schema: {gsi['KeySchema']}")
+    return missing
+
+
+def ensure_product_indexes(table: Any, timeout_sec: float = 1800.0, poll_sec: float = 10.0) -> List[str]:
+    """Create missing PRODUCT_INDEXES one by one, waiting for each backfill; returns the created names.
+
+    DynamoDB builds only one new GSI per table at a time, hence the wait.
+    Provisioned tables get the table's own read/write capacity on each index.
+    """
+    table.load()
+    created = []
+    for name in missing_product_indexes(table):
+        spec = next(s for s in PRODUCT_INDEXES if s["name"] == name)
+        create: Dict[str, Any] = {
+            "IndexName": name,
+            "KeySchema": _index_key_schema(spec),
+            "Projection": {"ProjectionType": "ALL"},
+        }
+        billing = (table.billing_mode_summary or {}).get("BillingMode", "PROVISIONED")
+        if billing == "PROVISIONED":
+            throughput = table.provisioned_throughput
+            create["ProvisionedThroughput"] = {
+                "ReadCapacityUnits": throughput["ReadCapacityUnits"],
+                "WriteCapacityUnits": throughput["WriteCapacityUnits"],
+            }
+        table.meta.client.update_table(
+            TableName=table.name,
+            AttributeDefinitions=[
+                {"AttributeName": attr, "AttributeType": attr_type} for attr, attr_type in (spec["hash"], spec["range"])
+            ],
+            GlobalSecondaryIndexUpdates=[{"Create": create}],
+        )
+        print(f"Creating index {name} on {table.name}...")
+        deadline = time.monotonic() + timeout_sec
+        while True:
+            table.load()
+            status = next(
+                (g.get("IndexStatus") for g in table.global_secondary_indexes or [] if g["IndexName"] == name), None
+            )
+            if status == "ACTIVE":
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Index {name} on {table.name} still {status} after {timeout_sec:.0f}s")
+            time.sleep(poll_sec)
+        created.append(name)
+    return created
+
+
+def upsert_products_to_dynamo(
+    products: Iterable[Product],
+    table_name: str,
+    region_name: Optional[str],
+    extra_attrs: Optional[Dict[str, Any]] = None,
+    change_index_path: Optional[str] = None,
+    delete_missing: bool = False,
+    write_workers: int = 4,
+    max_wcu_per_sec: Optional[float] = None,
+    endpoint_url: Optional[str] = None,
+    ensure_indexes: bool = False,
+    on_item_changed: Optional[Callable[[str, Optional[Dict[str, Any]]], None]] = None,
+) -> WriteSummary:
+    """Write new or changed products through a DynamoBulkWriter as they arrive.
+
+    Each item carries a `contentHash` over everything except `updatedAt`.
+    Known hashes and first-import times come from the local ChangeIndex at
+    `change_index_path`; when it has no entries for this table, they are
+    prefetched with BatchGetItem. The first-import time is kept across
+    updates and sets isNew/recencyKey. With `ensure_indexes`, missing
+    PRODUCT_INDEXES are created before writing; otherwise they are only
+    reported.
+    Unchanged items are not written. With `delete_missing`, previously
+    imported items not seen in this run are deleted once the stream has been
+    fully consumed, but only in categories this run produced items for, so a
+    single-query or resumed run leaves the other queries' items alone. Items
+    no longer seen come from the ChangeIndex; without one, the table is only
+    scanned for them when `delete_missing` is set.
+
+    `products` may be a lazy iterator: the table is validated before the
+    first item is pulled, so a bad table name fails before any crawling.
+    `endpoint_url` points both the checks and the writers at a local
+    DynamoDB stand-in. `on_item_changed` is called with (encoded key, item)
+    for every item written and (encoded key, None) for every item deleted,
+    from a writer thread once DynamoDB has accepted the write.
+    """
+    import boto3
+    import botocore.exceptions
+
+    session = boto3.session.Session(region_name=region_name)
+    dynamodb = session.resource("dynamodb", endpoint_url=endpoint_url)
+    table = dynamodb.Table(table_name)
+
+    # Validate table exists
+    try:
+        table.load()
+    except botocore.exceptions.ClientError as e:  # noqa: BLE001
+        raise RuntimeError(f"DynamoDB table not accessible: {e}")
+    key_names = [k["AttributeName"] for k in table.key_schema]
+    _instrument_dynamodb_client(dynamodb.meta.client)
+    if ensure_indexes:
+        ensure_product_indexes(table)
+    else:
+        missing = missing_product_indexes(table)
+        if missing:
+            print(f"Warning: {table_name} lacks storefront indexes {', '.join(missing)} (use --ensure-indexes)")
+
+    index = ChangeIndex(change_index_path) if change_index_path else None
+    use_index = index is not None and index.has_table(table_name)
+    journal = _JOURNAL
+
+    def _flushed(kind: str, payload: Dict[str, Any], encoded_key: str) -> None:
+        if journal is not None and kind == "put":
+            journal.record_written(table_name, encoded_key, payload["contentHash"], payload.get("firstSeenAt"))
+        if on_item_changed is not None:
+            on_item_changed(encoded_key, payload if kind == "put" else None)
+
+    summary = WriteSummary()
+    seen_keys: set = set()
+    seen_categories: Set[str] = set()
+
+    try:
+        writer = DynamoBulkWriter(
+            table_name,
+            key_names,
+            region_name=region_name,
+            endpoint_url=endpoint_url,
+            workers=write_workers,
+            max_wcu_per_sec=max_wcu_per_sec,
+            on_flushed=_flushed if journal is not None or on_item_changed is not None else None,
+        )
+        summary.writers = writer.stats
+        with writer as batch:
+
+            def _write_changed(
+                items: List[Dict[str, Any]],
+                known: Dict[str, Tuple[Optional[str], Optional[int]]],
+            ) -> None:
+                now = int(time.time())
+                for item in items:
+                    encoded_key = _encode_item_key(_item_key(item, key_names))
+                    previous, first_seen = known.get(encoded_key, (None, None))
+                    # isNew is part of the hash, so an item is rewritten once when it stops being new
+                    _apply_recency(item, first_seen or now, now)
+                    item["contentHash"] = item_content_hash(item)
+                    if previous == item["contentHash"]:
+                        summary.unchanged += 1
+                    else:
+                        item["updatedAt"] = now
+                        with METRICS.stage("dynamodb"):
+                            batch.put_item(Item=item)
+                        if encoded_key not in known:
+                            summary.inserted += 1
+                        else:
+                            summary.updated += 1
+                    if index is not None:
+                        index.put(
+                            table_name, encoded_key, item["contentHash"], item["firstSeenAt"], item.get("category")
+                        )
+
+            pending: List[Dict[str, Any]] = []
+            for p in products:
+                item = product_to_item(p, extra_attrs)
+                encoded_key = _encode_item_key(_item_key(item, key_names))
+                if encoded_key in seen_keys:
+                    continue
+                seen_keys.add(encoded_key)
+                seen_categories.add(item.get("category"))
+                # The change index is only committed at the end, so after a crash the journal knows better
+                state = journal.written(table_name, encoded_key) if journal is not None else None
+                if state is None and use_index:
+                    state = index.get(table_name, encoded_key)
+                if state is not None or use_index:
+                    _write_changed([item], {encoded_key: state} if state is not None else {})
+                    continue
+                pending.append(item)
+                if len(pending) == 100:
+                    keys = [_item_key(i, key_names) for i in pending]
+                    _write_changed(pending, _fetch_remote_state(dynamodb, table_name, keys))
+                    pending = []
+            if pending:
+                keys = [_item_key(i, key_names) for i in pending]
+                _write_changed(pending, _fetch_remote_state(dynamodb, table_name, keys))
+
+            # Only categories crawled in this run are complete enough to say an item is gone.
+            # The local index answers for free; a full table scan is only paid for when deleting.
+            if use_index:
+                stale_keys = [k for k in index.keys(table_name, seen_categories) if k not in seen_keys]
+            elif not delete_missing:
+                stale_keys = []
+            else:
+                stale_keys = [
+                    k for k in _scan_imported_keys(table, key_names, "made-in-china", seen_categories)
+                    if k not in seen_keys
+                ]
+            summary.removed = len(stale_keys)
+            if delete_missing:
+                for encoded_key in stale_keys:
+                    with METRICS.stage("dynamodb"):
+                        batch.delete_item(Key=json.loads(encoded_key))
+                    if index is not None:
+                        index.delete(table_name, encoded_key)
+        if index is not None:
+            index.commit()
+    finally:
+        if index is not None:
+            index.close()
+    return summary
+
+
+SNAPSHOT_PAGE_SIZE = 250
+SNAPSHOT_MANIFEST = "manifest.json"
+# Fields of a product card in listing shards; detail shards carry everything but the internals below
+_SNAPSHOT_LISTING_FIELDS = ("id", "name", "price", "image", "imageVariants", "category", "chassis", "isNew")
+_SNAPSHOT_INTERNAL_FIELDS = frozenset(
+    {"pk", "sk", "contentHash", "imageLocalPath", "updatedAt", "listing", "priceSort", "recencyKey", "firstSeenAt"}
+)
+
+
+def _slug(text: str) -> str:
+    folded = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", folded.lower()).strip("-") or "other"
+
+
+def _snapshot_encoders() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    # mtime=0 keeps gzip output byte-identical for identical content
+    encoders: List[Tuple[str, Callable[[bytes], bytes]]] = [
+        ("gzip", lambda body: gzip.compress(body, compresslevel=9, mtime=0))
+    ]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoders.append(("br", lambda body: brotli.compress(body, quality=11)))
+    return encoders
+
+
+_ENCODING_SUFFIX = {"gzip": ".gz", "br": ".br"}
+
+SNAPSHOT_STATE = "snapshot.sqlite3"
+
+# Files named by CatalogSnapshot.write_shard; prune() never touches anything else under the root or prefix
+_SNAPSHOT_SHARD_RE = re.compile(r"\.[0-9a-f]{16}\.json\.(?:gz|br)$")
+
+
+class CatalogSnapshot:
+    """Content-addressed, precompressed catalog shards under `root`.
+
+    Every shard is named `<name>.<sha256 prefix>.json` and stored once per
+    encoding (`.gz`, plus `.br` when the brotli package is installed). A shard
+    whose content did not change keeps its name and is not rewritten; only
+    manifest.json is replaced on every build.
+
+    The listing cards behind the shards are kept in SQLite next to them, so a
+    build needs only the products changed since the last one: put() and
+    delete() (callable from several threads, like SearchIndexBuilder's) write
+    a changed product's detail shard right away, and build() regenerates the
+    pages from the stored cards. prune() removes the shards neither this nor
+    the previous build references; clients may still hold the previous
+    manifest for its max-age.
+    """
+
+    def __init__(self, root: str) -> None:
+        ensure_dir(root)
+        self.root = root
+        self.encoders = _snapshot_encoders()
+        # Shards referenced by the last build()
+        self.files: List[str] = []
+        self.written = 0
+        self.kept = 0
+        self.pruned = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, SNAPSHOT_STATE), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            " item_key TEXT PRIMARY KEY, content_hash TEXT NOT NULL, sort_key TEXT NOT NULL,"
+            " product_id TEXT NOT NULL, category TEXT NOT NULL, card TEXT NOT NULL)"
+        )
+        # The last build that referenced each shard file, for prune()
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (rel_path TEXT PRIMARY KEY, build INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+    def is_empty(self) -> bool:
+        return self._db.execute("SELECT 1 FROM products LIMIT 1").fetchone() is None
+
+    def _build_number(self) -> int:
+        row = self._db.execute("SELECT value FROM state WHERE name = 'build'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _rel_paths(self, relative: str) -> List[str]:
+        return [relative + _ENCODING_SUFFIX[encoding] for encoding, _ in self.encoders]
+
+    def write_shard(self, name: str, payload: Any) -> str:
+        body = json.dumps(
+            payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=json_default
+        ).encode("utf-8")
+        relative = f"{name}.{hashlib.sha256(body).hexdigest()[:16]}.json"
+        for (encoding, compress), rel_path in zip(self.encoders, self._rel_paths(relative)):
+            path = os.path.join(self.root, rel_path)
+            if os.path.exists(path):
+                with self._lock:
+                    self.kept += 1
+                continue
+            write_atomic(path, compress(body))
+            with self._lock:
+                self.written += 1
+        return relative
+
+    def put(self, item_key: str, item: Dict[str, Any]) -> bool:
+        """Store `item` under `item_key` and write its detail shard; False if its content is unchanged."""
+        if not item.get("id"):
+            self.delete(item_key)
+            return False
+        content_hash = item.get("contentHash") or item_content_hash(item)
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM products WHERE item_key = ?", (item_key,)).fetchone()
+            if row is not None and row[0] == content_hash:
+                return False
+        product_id = str(item["id"])
+        detail = {k: v for k, v in item.items() if k not in _SNAPSHOT_INTERNAL_FIELDS}
+        card = {k: item[k] for k in _SNAPSHOT_LISTING_FIELDS if k in item}
+        card["detail"] = self.write_shard(f"product/{_slug(product_id)}", detail)
+        card_json = json.dumps(card, ensure_ascii=False, sort_keys=True, default=json_default)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO products (item_key, content_hash, sort_key, product_id, category, card)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    item_key,
+                    content_hash,
+                    str(item.get("recencyKey", "")),
+                    product_id,
+                    str(item.get("category") or "other"),
+                    card_json,
+                ),
+            )
+        return True
+
+    def delete(self, item_key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM products WHERE item_key = ?", (item_key,))
+
+    def commit(self) -> None:
+        with self._lock:
+            self._db.commit()
+
+    def sync(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Make the stored products exactly `items` ((key, item) pairs), e.g. a full table scan."""
+        seen = set()
+        for item_key, item in items:
+            seen.add(item_key)
+            self.put(item_key, item)
+        stale = [k for (k,) in self._db.execute("SELECT item_key FROM products") if k not in seen]
+        for item_key in stale:
+            self.delete(item_key)
+        self.commit()
+
+    def build(self, page_size: int = SNAPSHOT_PAGE_SIZE) -> Dict[str, Any]:
+        """Write listing, per-category and index shards for the stored products, then the manifest."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT category, card FROM products ORDER BY sort_key DESC, product_id DESC"
+            ).fetchall()
+        product_shards: Dict[str, str] = {}
+        cards: List[Dict[str, Any]] = []
+        by_category: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+        names: Dict[str, str] = {}
+        for category, card_json in rows:
+            card = json.loads(card_json)
+            product_shards[str(card["id"])] = card["detail"]
+            cards.append(card)
+            slug = _slug(category)
+            names.setdefault(slug, category)
+            by_category[slug].append(card)
+        shards = list(product_shards.values())
+
+        def _pages(name: str, entries: List[Dict[str, Any]]) -> List[str]:
+            pages = [
+                self.write_shard(f"{name}-{n:04d}", {"items": entries[start:start + page_size]})
+                for n, start in enumerate(range(0, len(entries), page_size))
+            ] or [self.write_shard(f"{name}-0000", {"items": []})]
+            shards.extend(pages)
+            return pages
+
+        manifest = {
+            "version": 1,
+            "generatedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "productCount": len(cards),
+            "encodings": [encoding for encoding, _ in self.encoders],
+            "listing": _pages("listing/all", cards),
+            "categories": {
+                slug: {"name": names[slug], "count": len(entries), "shards": _pages(f"category/{slug}", entries)}
+                for slug, entries in sorted(by_category.items())
+            },
+            "productIndex": self.write_shard("products-index", product_shards),
+        }
+        shards.append(manifest["productIndex"])
+        self.files = sorted({rel_path for relative in shards for rel_path in self._rel_paths(relative)})
+        build = self._build_number() + 1
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files (rel_path, build) VALUES (?, ?)",
+                ((rel_path, build) for rel_path in self.files),
+            )
+            self._db.execute("INSERT OR REPLACE INTO state (name, value) VALUES ('build', ?)", (str(build),))
+            self._db.commit()
+        write_atomic(
+            os.path.join(self.root, SNAPSHOT_MANIFEST),
+            json.dumps(manifest, ensure_ascii=False, indent=2, default=json_default),
+        )
+        return manifest
+
+    def publish(self, publisher: "S3Publisher") -> None:
+        """Upload the current build to S3: shards first (existing ones are skipped), then the manifest."""
+        # Content-addressed: a shard key that already exists holds exactly this content
+        existing = set(publisher.existing_keys())
+        futures = []
+        for rel_path in self.files:
+            key = publisher.key_for(rel_path)
+            if key in existing:
+                continue
+            encoding = next(e for e, suffix in _ENCODING_SUFFIX.items() if rel_path.endswith(suffix))
+            future = publisher.publish(
+                os.path.join(self.root, rel_path),
+                key,
+                {"ContentType": "application/json", "ContentEncoding": encoding},
+            )
+            if future is not None:
+                futures.append(future)
+        for future in futures:
+            future.result()
+        # Clients re-fetch the manifest to find new shard names, so it must not be cached for long
+        manifest = publisher.publish(
+            os.path.join(self.root, SNAPSHOT_MANIFEST),
+            publisher.key_for(SNAPSHOT_MANIFEST),
+            {"ContentType": "application/json", "CacheControl": "public, max-age=60"},
+        )
+        if manifest is not None:
+            manifest.result()
+
+    def prune(self, publisher: Optional["S3Publisher"] = None) -> None:
+        """Remove shards (locally, and under `publisher`'s prefix) that neither of the last two builds references.
+
+        Call it only after the manifest of the current build is written (and published).
+        """
+        oldest = self._build_number() - 1
+        with self._lock:
+            keep = {p for (p,) in self._db.execute("SELECT rel_path FROM files WHERE build >= ?", (oldest,))}
+            self._db.execute("DELETE FROM files WHERE build < ?", (oldest,))
+            self._db.commit()
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if _SNAPSHOT_SHARD_RE.search(rel_path) and rel_path not in keep:
+                    os.remove(path)
+                    self.pruned += 1
+        if publisher is not None:
+            key_prefix = publisher.key_for("")
+            publisher.delete(
+                [
+                    key
+                    for key in publisher.existing_keys()
+                    if _SNAPSHOT_SHARD_RE.search(key) and key[len(key_prefix):] not in keep
+                ]
+            )
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+
+def _iter_table_items(table: Any) -> Iterator[Dict[str, Any]]:
+    kwargs: Dict[str, Any] = {}
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def build_catalog_snapshot(
+    snapshot: CatalogSnapshot,
+    table_name: Optional[str] = None,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+    publisher: Optional["S3Publisher"] = None,
+) -> CatalogSnapshot:
+    """Regenerate the static catalog (and publish it via `publisher`), then prune unreferenced shards.
+
+    With `table_name` the stored products are first replaced by a full scan of
+    that table; otherwise `snapshot` builds from what put()/delete() gave it.
+    """
+    with METRICS.stage("snapshot"):
+        if table_name:
+            import boto3
+
+            session = boto3.session.Session(region_name=region_name)
+            table = session.resource("dynamodb", endpoint_url=endpoint_url).Table(table_name)
+            key_names = [k["AttributeName"] for k in table.key_schema]
+            snapshot.sync((_encode_item_key(_item_key(i, key_names)), i) for i in _iter_table_items(table))
+        snapshot.build()
+        if publisher is not None:
+            snapshot.publish(publisher)
+        snapshot.prune(publisher)
+    return snapshot
+
+
+def _add_crawl_args(parser: argparse.ArgumentParser) -> None:
+    """Search pages: what to crawl (or re-parse) and how fast."""
+    parser.add_argument(
+        "--url",
+        default=DEFAULT_URL,
+        help="Search URL to scrape (default: preset M3 lip URL)",
+    )
+    parser.add_argument(
+        "--category",
+        default=DEFAULT_CATEGORY,
+        help=f"Category stored on items scraped from --url (default: {DEFAULT_CATEGORY})",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="YAML/JSON file listing search queries (url, name, category, pages, extra_attrs); "
+        "replaces --url/--pages/--category",
+    )
+    parser.add_argument(
+        "--pages",
+        type=parse_pages,
+        default=1,
+        help="Number of pages to attempt via page= pagination, or 'auto' to detect it (default: 1)",
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        default=100,
+        help="Upper bound on pages crawled with --pages auto (default: 100)",
+    )
+    parser.add_argument(
+        "--delay-sec",
+        type=float,
+        default=1.0,
+        help="Average delay between requests to the same host in seconds (default: 1.0)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of search pages fetched in parallel (default: 4)",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=sorted(PARSER_ENGINES),
+        default=DEFAULT_PARSER_ENGINE,
+        help=(
+            "HTML parser engine; lxml and selectolax are faster but must be installed "
+            "(default: lxml if installed, else bs4)"
+        ),
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="Parse pages in this many worker processes; keep --concurrency at least as high (default: 0, in-process)",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        default=os.path.join("data", "made-in-china", "page-archive"),
+        help="Store every fetched search page here as a compressed WARC file (one per run)",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="Do not archive fetched search pages",
+    )
+    parser.add_argument(
+        "--reparse",
+        action="append",
+        default=[],
+        metavar="ARCHIVE",
+        help="Re-parse pages from this archive file or directory instead of crawling (repeatable; no network "
+        "for pages or images)",
+    )
+
+
+def _add_enrich_args(parser: argparse.ArgumentParser) -> None:
+    """Detail page enrichment."""
+    parser.add_argument(
+        "--enrich",
+        action="store_true",
+        help="Fetch each product's detail page for description, specifications, price tiers and gallery",
+    )
+    parser.add_argument(
+        "--enrich-workers",
+        type=int,
+        default=8,
+        help="Parallel detail page fetches (default: 8)",
+    )
+    parser.add_argument(
+        "--enrich-per-host",
+        type=int,
+        default=2,
+        help="Most detail page requests in flight to one host (default: 2)",
+    )
+    parser.add_argument(
+        "--detail-cache",
+        default=os.path.join("data", "made-in-china", "detail-cache.sqlite3"),
+        help="SQLite cache of parsed detail pages; refetched only when the listing entry changes",
+    )
+
+
+def _add_http_args(parser: argparse.ArgumentParser) -> None:
+    """Retries, circuit breaker and the HTTP response cache."""
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=5,
+        help="Attempts per request for retryable errors (default: 5)",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=int,
+        default=8,
+        help="Consecutive failures after which requests to a host fail fast (default: 8)",
+    )
+    parser.add_argument(
+        "--breaker-cooldown-sec",
+        type=float,
+        default=60.0,
+        help="How long a host's circuit breaker stays open (default: 60)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=os.path.join("data", "made-in-china", "http-cache"),
+        help="Directory for the persistent HTTP response cache",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=512,
+        help="Size cap of the response cache in MB; least recently used entries are evicted (default: 512)",
+    )
+    parser.add_argument(
+        "--cache-ttl-sec",
+        type=float,
+        default=600.0,
+        help="Serve cached responses younger than this without revalidating (default: 600)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the HTTP response cache",
+    )
+
+
+def _add_image_args(parser: argparse.ArgumentParser) -> None:
+    """Image download, near-duplicate clustering and resized variants."""
+    parser.add_argument(
+        "--download-dir",
+        default=os.path.join("data", "made-in-china", "m3-lip", "images"),
+        help="Directory to store downloaded images",
+    )
+    parser.add_argument(
+        "--image-workers",
+        type=int,
+        default=8,
+        help="Number of parallel image downloads (default: 8)",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Group near-duplicate listings (title MinHash/LSH plus image pHash) and set clusterId on each item",
+    )
+    parser.add_argument(
+        "--dedup-best-only",
+        action="store_true",
+        help="With --dedup, write only the best-priced product of each cluster (implies --dedup)",
+    )
+    parser.add_argument(
+        "--dedup-index",
+        default=os.path.join("data", "made-in-china", "dedup-index.sqlite3"),
+        help="SQLite LSH index of known products and their clusters; keeps clusterIds stable across runs",
+    )
+    parser.add_argument(
+        "--dedup-max-candidates",
+        type=int,
+        default=DEDUP_MAX_CANDIDATES,
+        help=f"Products compared exactly per new product, 0 for no limit (default: {DEDUP_MAX_CANDIDATES})",
+    )
+    parser.add_argument(
+        "--variant-widths",
+        type=parse_int_list,
+        default=(),
+        metavar="W1,W2,...",
+        help="Render resized image variants at these widths, e.g. 320,640,1024 (default: off)",
+    )
+    parser.add_argument(
+        "--variant-formats",
+        type=parse_format_list,
+        default=("webp", "jpeg"),
+        metavar="FMT1,FMT2",
+        help="Variant formats out of avif, webp, jpeg (default: webp,jpeg)",
+    )
+    parser.add_argument(
+        "--variants-dir",
+        default=os.path.join("data", "made-in-china", "m3-lip", "variants"),
+        help="Directory for rendered image variants",
+    )
+    parser.add_argument(
+        "--variants-url-base",
+        default=None,
+        help="Public URL that serves --variants-dir; variant URLs go into images/imageVariants",
+    )
+    parser.add_argument(
+        "--variant-workers",
+        type=int,
+        default=None,
+        help="Processes used for rendering variants (default: CPU count)",
+    )
+
+
+def _add_upload_args(parser: argparse.ArgumentParser) -> None:
+    """S3 publishing, the DynamoDB write and what is rebuilt from the table afterwards."""
+    parser.add_argument(
+        "--table-name",
+        required=True,
+        help="DynamoDB table name",
+    )
+    parser.add_argument(
+        "--aws-region",
+        default=None,
+        help="AWS region (if not set, boto3 defaults/environment will be used)",
+    )
+    parser.add_argument(
+        "--dynamodb-endpoint-url",
+        default=None,
+        help="Custom DynamoDB endpoint, e.g. DynamoDB Local or a moto server",
+    )
+    parser.add_argument(
+        "--write-workers",
+        type=int,
+        default=4,
+        help="Parallel DynamoDB writer threads, each with its own client (default: 4)",
+    )
+    parser.add_argument(
+        "--max-wcu",
+        type=float,
+        default=None,
+        help="Cap on estimated write capacity units per second across all writers (default: no cap)",
+    )
+    parser.add_argument(
+        "--ensure-indexes",
+        action="store_true",
+        help="Create missing storefront GSIs (chassis/price/recency) before writing; waits for the backfill",
+    )
+    parser.add_argument(
+        "--change-index",
+        default=os.path.join("data", "made-in-china", "change-index.sqlite3"),
+        help="SQLite file with the content hash last written per item; unchanged items are skipped",
+    )
+    parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="Delete previously imported items of the categories crawled in this run that were not seen again",
+    )
+    parser.add_argument(
+        "--extra-attr",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Additional attributes to include in each item (repeatable)",
+    )
+    parser.add_argument(
+        "--s3-bucket",
+        default=None,
+        help="Publish downloaded images (and variants) to this S3 bucket (default: off)",
+    )
+    parser.add_argument(
+        "--s3-prefix",
+        default="products/made-in-china",
+        help="Key prefix for published images (default: products/made-in-china)",
+    )
+    parser.add_argument(
+        "--s3-public-url-base",
+        default=None,
+        help="Public URL base (CDN or bucket domain) for published images; default is the S3 URL",
+    )
+    parser.add_argument(
+        "--s3-endpoint-url",
+        default=None,
+        help="Custom S3 endpoint, e.g. a local moto server or MinIO",
+    )
+    parser.add_argument(
+        "--s3-workers",
+        type=int,
+        default=10,
+        help="Concurrent S3 upload threads (default: 10)",
+    )
+    parser.add_argument(
+        "--search-index-dir",
+        default=None,
+        help="Keep the offline search index (search-index.bin/.json) here up to date from changed items",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=None,
+        help="After the import, write compressed static catalog shards (listing, categories, products) here",
+    )
+    parser.add_argument(
+        "--snapshot-s3-prefix",
+        default=None,
+        help="Also publish the catalog snapshot to --s3-bucket under this prefix, e.g. catalog",
+    )
+
+
+def _add_run_args(parser: argparse.ArgumentParser) -> None:
+    """Journal, run report and profiling of a full run."""
+    parser.add_argument(
+        "--journal",
+        default=os.path.join("data", "made-in-china", "journal.sqlite3"),
+        help="Append-only journal of fetched pages, image outcomes and confirmed writes",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the last unfinished run from the journal, skipping pages and writes it completed",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="Do not keep a run journal",
+    )
+    parser.add_argument(
+        "--report-json",
+        default=os.path.join("data", "made-in-china", "run-report.json"),
+        help="Write a machine-readable run report (timings, latencies, bytes, retries, capacity) here",
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        default=None,
+        help="Also write the run metrics in Prometheus textfile-collector format to this path",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        metavar="DIR",
+        help=(
+            "Profile each stage with cProfile (one .prof per stage) and tracemalloc into DIR; "
+            "one stage is profiled at a time, overlapping ones are counted as skipped"
+        ),
+    )
+
+
+COMMANDS = ("scrape", "images", "upload", "run")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Scrape Made-in-China search results and upsert into DynamoDB. "
+        "Stages can run on their own and be piped as NDJSON: scrape | images | upload.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    scrape = commands.add_parser("scrape", help="Crawl (or re-parse) search pages and write products as NDJSON")
+    _add_crawl_args(scrape)
+    scrape.add_argument(
+        "--html",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="Parse these saved search pages instead of crawling (repeatable; no network, e.g. to try a selector)",
+    )
+    _add_enrich_args(scrape)
+    _add_http_args(scrape)
+    scrape.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="NDJSON file for the scraped products, '-' for stdout (default: -)",
+    )
+    scrape.set_defaults(handler=_cmd_scrape)
+
+    images = commands.add_parser("images", help="Download images (plus dedup and variants) for NDJSON products")
+    images.add_argument(
+        "-i",
+        "--input",
+        default="-",
+        help="NDJSON products from `scrape`, '-' for stdin (default: -)",
+    )
+    images.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="NDJSON file for the products with their images, '-' for stdout (default: -)",
+    )
+    images.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only attach images already in --download-dir, e.g. for products from scrape --reparse",
+    )
+    _add_image_args(images)
+    _add_http_args(images)
+    images.set_defaults(handler=_cmd_images)
+
+    upload = commands.add_parser("upload", help="Publish images to S3 and upsert NDJSON products into DynamoDB")
+    upload.add_argument(
+        "-i",
+        "--input",
+        default="-",
+        help="NDJSON products from `scrape` or `images`, '-' for stdin (default: -)",
+    )
+    _add_upload_args(upload)
+    upload.set_defaults(handler=_cmd_upload)
+
+    run = commands.add_parser("run", help="The whole pipeline in one process (also used when COMMAND is omitted)")
+    _add_crawl_args(run)
+    _add_enrich_args(run)
+    _add_http_args(run)
+    _add_image_args(run)
+    _add_upload_args(run)
+    _add_run_args(run)
+    run.set_defaults(handler=_cmd_run, html=[])
+    return parser.parse_args(argv)
+
+
+def parse_pages(value: str) -> Optional[int]:
+    """--pages value: a positive page count, or None for adaptive ('auto')."""
+    if value.strip().lower() == "auto":
+        return None
+    try:
+        pages = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a number or 'auto', got {value!r}")
+    if pages < 1:
+        raise argparse.ArgumentTypeError("pages must be at least 1")
+    return pages
+
+
+def parse_int_list(value: str) -> Tuple[int, ...]:
+    try:
+        widths = tuple(sorted({int(v) for v in value.split(",") if v.strip()}))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}")
+    if any(w <= 0 for w in widths):
+        raise argparse.ArgumentTypeError("widths must be positive")
+    return widths
+
+
+def parse_format_list(value: str) -> Tuple[str, ...]:
+    formats = tuple(v.strip().lower() for v in value.split(",") if v.strip())
+    unknown = [f for f in formats if f not in VARIANT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"unknown variant format(s): {', '.join(unknown) or value!r}")
+    return formats
+
+
+def parse_extra_attrs(kv_pairs: List[str]) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for pair in kv_pairs:
+        if "=" in pair:
+            k, v = pair.split("=", 1)
+            out[k] = v
+    return out
+
+
+def _write_run_report(args: argparse.Namespace, metrics: RunMetrics, summary: Optional["WriteSummary"]) -> None:
+    extra = {
+        "status": "ok" if summary is not None else "failed",
+        "url": None if args.manifest else args.url,
+        "manifest": args.manifest,
+        "reparse": args.reparse or None,
+        "table": args.table_name,
+        "parser": args.parser,
+        "summary": asdict(summary) if summary is not None else None,
+    }
+    if args.report_json:
+        metrics.write_json(args.report_json, extra)
+        print(f"Run report: {args.report_json}")
+    if args.prometheus_textfile:
+        if summary is not None:
+            for outcome in ("inserted", "updated", "unchanged", "removed"):
+                metrics.inc("items_total", getattr(summary, outcome), outcome=outcome)
+        metrics.write_prometheus(args.prometheus_textfile)
+    metrics.dump_profiles()
+
+
+def _configure_http(args: argparse.Namespace) -> None:
+    set_retry_policy(
+        RetryPolicy(
+            max_attempts=args.max_attempts,
+            breaker_threshold=args.breaker_threshold,
+            breaker_cooldown_sec=args.breaker_cooldown_sec,
+        )
+    )
+    if not args.no_cache:
+        set_response_cache(
+            ResponseCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024, ttl_sec=args.cache_ttl_sec)
+        )
+
+
+@contextlib.contextmanager
+def _page_archive(args: argparse.Namespace) -> Iterator[None]:
+    """Archive the search pages fetched inside the block, unless they come from an archive or files."""
+    if args.no_archive or args.reparse or args.html:
+        yield
+        return
+    archive = PageArchive(args.archive_dir)
+    set_page_archive(archive)
+    try:
+        yield
+    finally:
+        set_page_archive(None)
+        archive.close()
+        print(f"Archived {archive.records} pages: {archive.path}")
+
+
+@contextlib.contextmanager
+def _ndjson_output(path: str) -> Iterator[IO[str]]:
+    """The NDJSON stream a command writes; with '-' progress messages move to stderr."""
+    if path == "-":
+        out = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            yield out
+        return
+    parent = os.path.dirname(os.path.abspath(path))
+    ensure_dir(parent)
+    with open(path, "w", encoding="utf-8") as out:
+        yield out
+
+
+@contextlib.contextmanager
+def _ndjson_input(path: str) -> Iterator[Iterator[Product]]:
+    if path == "-":
+        yield iter_products_ndjson(sys.stdin)
+        return
+    with open(path, encoding="utf-8") as f:
+        yield iter_products_ndjson(f)
+
+
+def _scraped_products(args: argparse.Namespace, rate_limiter: Optional[HostRateLimiter]) -> Iterator[Product]:
+    """Products of the scrape stage: crawled, re-parsed or read from HTML files, then enriched."""
+    if args.manifest:
+        queries = load_manifest(args.manifest)
+        print(f"Scraping {len(queries)} queries from manifest: {args.manifest}")
+    else:
+        queries = [CrawlQuery(url=args.url, name="url", category=args.category, pages=args.pages)]
+        if not args.html:
+            print(f"Scraping: {args.url} (pages={args.pages or 'auto'})")
+    if args.html:
+        products = iter_html_products(args.html, args.parser, queries[0] if len(queries) == 1 else None)
+    elif args.reparse:
+        print(f"Re-parsing archived pages from: {', '.join(args.reparse)}")
+        products = iter_archived_products(args.reparse, args.parser, args.parse_workers, queries)
+    else:
+        products = iter_manifest_products(
+            queries, args.delay_sec, args.concurrency, args.parser, args.max_pages, args.parse_workers, rate_limiter
+        )
+    if args.enrich:
+        products = iter_products_enriched(
+            products,
+            args.detail_cache,
+            max_workers=args.enrich_workers,
+            max_per_host=args.enrich_per_host,
+            rate_limiter=rate_limiter,
+            offline=bool(args.reparse or args.html),
+        )
+    return products
+
+
+def _image_products(args: argparse.Namespace, products: Iterable[Product], offline: bool) -> Iterator[Product]:
+    """Products of the images stage: stored image attached, then clustered and rendered if asked."""
+    print(f"Downloading images into: {args.download_dir}")
+    products = iter_products_with_images(products, args.download_dir, args.image_workers, offline=offline)
+    if args.dedup or args.dedup_best_only:
+        products = iter_deduplicated_products(
+            products, args.dedup_index, best_only=args.dedup_best_only, max_candidates=args.dedup_max_candidates
+        )
+    if args.variant_widths:
+        products = iter_products_with_variants(
+            products,
+            args.variants_dir,
+            widths=args.variant_widths,
+            formats=args.variant_formats,
+            url_base=args.variants_url_base,
+            max_workers=args.variant_workers,
+        )
+    return products
+
+
+def _check_upload_args(args: argparse.Namespace) -> None:
+    if args.snapshot_s3_prefix and not (args.snapshot_dir and args.s3_bucket):
+        raise SystemExit("--snapshot-s3-prefix needs --snapshot-dir and --s3-bucket")
+
+
+def _upload_products(args: argparse.Namespace, products: Iterable[Product]) -> WriteSummary:
+    """The upload stage: S3 publishing, the DynamoDB upsert, then the search index and catalog snapshot."""
+    extra_attrs = parse_extra_attrs(args.extra_attr)
+    print(f"Upserting products into DynamoDB table: {args.table_name}")
+    publisher = None
+    search_builder = None
+    snapshot = None
+    # Stores fed with each confirmed write. A new one has to see the whole table once;
+    # after that, changed items are enough
+    incremental: List[Any] = []
+    on_item_changed = None
+    if args.search_index_dir:
+        # Imported here: runs without a search index do not need it
+        import search_index
+
+        search_builder = search_index.SearchIndexBuilder(args.search_index_dir)
+        full_search_sync = search_builder.is_empty()
+        if not full_search_sync:
+            incremental.append(search_builder)
+    if args.snapshot_dir:
+        snapshot = CatalogSnapshot(args.snapshot_dir)
+        full_snapshot_sync = snapshot.is_empty()
+        if not full_snapshot_sync:
+            incremental.append(snapshot)
+    if incremental:
+
+        def on_item_changed(encoded_key: str, item: Optional[Dict[str, Any]]) -> None:
+            for store in incremental:
+                if item is None:
+                    store.delete(encoded_key)
+                else:
+                    store.put(encoded_key, item)
+                # Committed as DynamoDB confirms it, like the journal entry: a resumed run treats the
+                # item as written and unchanged, so an entry lost in a crash would never come back
+                store.commit()
+    if args.s3_bucket:
+        publisher = S3Publisher(
+            args.s3_bucket,
+            prefix=args.s3_prefix,
+            public_url_base=args.s3_public_url_base,
+            region_name=args.aws_region,
+            endpoint_url=args.s3_endpoint_url,
+            max_concurrency=args.s3_workers,
+        )
+        print(f"Publishing images to s3://{args.s3_bucket}/{publisher.prefix}")
+        products = iter_products_published_to_s3(products, publisher)
+    try:
+        summary = upsert_products_to_dynamo(
+            products=products,
+            table_name=args.table_name,
+            region_name=args.aws_region,
+            extra_attrs=extra_attrs,
+            change_index_path=args.change_index,
+            delete_missing=args.delete_missing,
+            write_workers=args.write_workers,
+            max_wcu_per_sec=args.max_wcu,
+            endpoint_url=args.dynamodb_endpoint_url,
+            ensure_indexes=args.ensure_indexes,
+            on_item_changed=on_item_changed,
+        )
+        if search_builder is not None:
+            with METRICS.stage("search_index"):
+                if full_search_sync:
+                    search_builder.sync(
+                        search_index.iter_table_items(
+                            args.table_name, args.aws_region, args.dynamodb_endpoint_url
+                        )
+                    )
+                rewritten = search_builder.write()
+            print(
+                f"Search index: {args.search_index_dir} (analyzed={search_builder.analyzed} "
+                f"removed={search_builder.deleted}{'' if rewritten else ', unchanged'})"
+            )
+        if snapshot is not None:
+            snapshot_publisher = None
+            if args.snapshot_s3_prefix:
+                snapshot_publisher = S3Publisher(
+                    args.s3_bucket,
+                    prefix=args.snapshot_s3_prefix,
+                    region_name=args.aws_region,
+                    endpoint_url=args.s3_endpoint_url,
+                    max_concurrency=args.s3_workers,
+                )
+            try:
+                build_catalog_snapshot(
+                    snapshot,
+                    args.table_name if full_snapshot_sync else None,
+                    region_name=args.aws_region,
+                    endpoint_url=args.dynamodb_endpoint_url,
+                    publisher=snapshot_publisher,
+                )
+            finally:
+                if snapshot_publisher is not None:
+                    snapshot_publisher.close()
+            print(
+                f"Catalog snapshot: {args.snapshot_dir} "
+                f"(written={snapshot.written} unchanged={snapshot.kept} pruned={snapshot.pruned})"
+            )
+    finally:
+        if publisher is not None:
+            publisher.close()
+        if search_builder is not None:
+            search_builder.close()
+        if snapshot is not None:
+            snapshot.close()
+    if publisher is not None:
+        print(f"S3: uploaded={publisher.uploaded} already present={publisher.skipped}")
+    for stats in summary.writers:
+        print(
+            f"Writer {stats.worker}: {stats.items} items in {stats.busy_sec:.1f}s "
+            f"({stats.items_per_sec:.0f}/s), retried={stats.retried_items} backoff={stats.backoff_sec:.1f}s"
+        )
+    removed_label = "removed" if args.delete_missing else "no longer seen"
+    print(
+        f"Done. inserted={summary.inserted} updated={summary.updated} "
+        f"unchanged={summary.unchanged} {removed_label}={summary.removed}"
+    )
+    return summary
+
+
+def _cmd_scrape(args: argparse.Namespace, argv: List[str]) -> int:
+    with _ndjson_output(args.output) as out:
+        if not (args.html or args.reparse):
+            _configure_http(args)
+        # One per-host pace for search and detail pages alike
+        rate_limiter = build_rate_limiter(args.delay_sec)
+        with _page_archive(args):
+            count = write_products_ndjson(_scraped_products(args, rate_limiter), out)
+        print(f"Wrote {count} products to {'stdout' if args.output == '-' else args.output}")
+    return 0
+
+
+def _cmd_images(args: argparse.Namespace, argv: List[str]) -> int:
+    with _ndjson_output(args.output) as out, _ndjson_input(args.input) as products:
+        _configure_http(args)
+        count = write_products_ndjson(_image_products(args, products, offline=args.offline), out)
+        print(f"Wrote {count} products to {'stdout' if args.output == '-' else args.output}")
+    return 0
+
+
+def _cmd_upload(args: argparse.Namespace, argv: List[str]) -> int:
+    _check_upload_args(args)
+    with _ndjson_input(args.input) as products:
+        _upload_products(args, products)
+    return 0
+
+
+def _cmd_run(args: argparse.Namespace, argv: List[str]) -> int:
+    _check_upload_args(args)
+    if args.resume and args.no_journal:
+        raise SystemExit("--resume needs the journal; drop --no-journal")
+    metrics = reset_metrics()
+    if args.profile:
+        metrics.enable_profiling(args.profile)
+    _configure_http(args)
+    journal = None
+    if not args.no_journal:
+        journal = CrawlJournal(args.journal)
+        run_id = journal.start(argv, resume=args.resume)
+        if journal.resumed:
+            print(f"Resuming run {run_id} from journal: {args.journal}")
+        elif args.resume:
+            print(f"No unfinished run in {args.journal}; starting a new one")
+    set_journal(journal)
+
+    # Stages are chained generators: products flow to image download and the
+    # DynamoDB batch_writer as soon as their page is parsed.
+    summary: Optional[WriteSummary] = None
+    try:
+        with _page_archive(args):
+            rate_limiter = build_rate_limiter(args.delay_sec)
+            products = _scraped_products(args, rate_limiter)
+            products = _image_products(args, products, offline=bool(args.reparse))
+            summary = _upload_products(args, products)
+        if journal is not None:
+            journal.finish()
+    finally:
+        if journal is not None:
+            set_journal(None)
+            journal.close()
+        _write_run_report(args, metrics, summary)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        # Command lines from before the subcommands existed run the whole pipeline
+        argv = ["run"] + argv
+    args = parse_args(argv)
+    return args.handler(args, argv[1:])
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,587 @@
+import argparse
+import bisect
+import collections
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
+
+from io_utils import plain_number, write_atomic
+
+
+INDEX_FILE = "search-index.bin"
+JSON_FILE = "search-index.json"
+STATE_FILE = "documents.sqlite3"
+FORMAT_VERSION = 1
+_MAGIC = b"MICSRCH1"
+# magic, version, doc count, average doc length, then offsets of docs/terms/trigrams/facets/doc info
+_HEADER = struct.Struct("<8sIId5Q")
+# Dictionary entry: key offset, value offset, value length, count, key length (offsets from section start)
+_ENTRY = struct.Struct("<IIIIH")
+_COUNT = struct.Struct("<I")
+_SPAN = struct.Struct("<II")
+# Per document: length (for BM25) and the facet dictionary index of its chassis and price bucket
+_DOC_INFO = struct.Struct("<HHH")
+
+# Tokens from the name count more than tokens from the description
+FIELD_WEIGHTS = {"name": 3, "description": 1}
+# Fields returned with each hit (and exported to the frontend)
+DOC_FIELDS = ("id", "name", "price", "image", "category", "chassis", "isNew")
+# Lower bounds of the price facet buckets; a missing or zero price is "unknown"
+PRICE_BUCKETS = (0, 50, 100, 200, 500, 1000)
+# A query word missing from the vocabulary matches up to this many terms this similar (trigram Jaccard)
+FUZZY_MIN_SIMILARITY = 0.4
+FUZZY_MAX_EXPANSIONS = 8
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics, so 'Přední spoiler' and 'predni spoiler' index alike."""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(fold(text)) if text else []
+
+
+def trigrams(term: str) -> set:
+    # Padded like pg_trgm, so short codes such as "m4" still get trigrams
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def price_bucket(price: Any) -> str:
+    try:
+        value = float(price or 0)
+    except (TypeError, ValueError):
+        value = 0.0
+    if value <= 0:
+        return "unknown"
+    lower = PRICE_BUCKETS[bisect.bisect_right(PRICE_BUCKETS, value) - 1]
+    upper_idx = PRICE_BUCKETS.index(lower) + 1
+    return f"{lower}-{PRICE_BUCKETS[upper_idx]}" if upper_idx < len(PRICE_BUCKETS) else f"{lower}+"
+
+
+def analyze(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Stored form of one product: hit fields, weighted term frequencies, length and facet keys."""
+    terms: Dict[str, int] = collections.Counter()
+    length = 0
+    for name, weight in FIELD_WEIGHTS.items():
+        tokens = tokenize(item.get(name))
+        length += len(tokens)
+        for token in tokens:
+            terms[token] += weight
+    chassis = str(item.get("chassis") or "other")
+    return {
+        "doc": {k: plain_number(item[k]) for k in DOC_FIELDS if k in item},
+        "terms": dict(terms),
+        "length": length,
+        "facets": [f"chassis:{chassis}", f"price:{price_bucket(item.get('price'))}"],
+    }
+
+
+def _content_hash(item: Dict[str, Any]) -> str:
+    if item.get("contentHash"):
+        return str(item["contentHash"])
+    return hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _varints(values: Iterable[int]) -> bytes:
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _read_varints(buf: Any, start: int, end: int) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in buf[start:end]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def _deltas(sorted_ids: List[int]) -> List[int]:
+    previous = 0
+    out = []
+    for doc_id in sorted_ids:
+        out.append(doc_id - previous)
+        previous = doc_id
+    return out
+
+
+def _dictionary_section(entries: List[Tuple[bytes, bytes, int]]) -> bytes:
+    """Sorted (key, value, count) entries as a fixed-width table plus key and value blobs."""
+    entries = sorted(entries)
+    table_size = _COUNT.size + _ENTRY.size * len(entries)
+    keys_size = sum(len(k) for k, _, _ in entries)
+    table = bytearray(_COUNT.pack(len(entries)))
+    keys = bytearray()
+    values = bytearray()
+    for key, value, count in entries:
+        table += _ENTRY.pack(table_size + len(keys), table_size + keys_size + len(values), len(value), count, len(key))
+        keys += key
+        values += value
+    return bytes(table + keys + values)
+
+
+def encode_index(docs: List[Dict[str, Any]]) -> bytes:
+    """Serialize analyzed documents (see analyze) into the memory-mappable index format."""
+    postings: Dict[str, List[Tuple[int, int]]] = collections.defaultdict(list)
+    facets: Dict[str, List[int]] = collections.defaultdict(list)
+    for doc_id, doc in enumerate(docs):
+        for key in doc["facets"]:
+            facets[key].append(doc_id)
+    facet_ids = {key: i for i, key in enumerate(sorted(facets))}
+    lengths = []
+    doc_info = bytearray()
+    blobs = bytearray()
+    spans = bytearray(_COUNT.pack(len(docs)))
+    for doc_id, doc in enumerate(docs):
+        for term, tf in doc["terms"].items():
+            postings[term].append((doc_id, tf))
+        lengths.append(min(doc["length"], 0xFFFF))
+        doc_info += _DOC_INFO.pack(lengths[-1], *(facet_ids[key] for key in doc["facets"]))
+        body = json.dumps(doc["doc"], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        spans += _SPAN.pack(len(blobs), len(body))
+        blobs += body
+    docs_section = bytes(spans) + bytes(blobs)
+
+    vocabulary = sorted(postings)
+    term_entries = []
+    for term in vocabulary:
+        pairs = postings[term]
+        ids = _deltas([doc_id for doc_id, _ in pairs])
+        term_entries.append(
+            (term.encode("utf-8"), _varints(v for pair in zip(ids, (tf for _, tf in pairs)) for v in pair), len(pairs))
+        )
+    by_trigram: Dict[str, List[int]] = collections.defaultdict(list)
+    for term_id, term in enumerate(vocabulary):
+        for gram in trigrams(term):
+            by_trigram[gram].append(term_id)
+    trigram_entries = [(g.encode("utf-8"), _varints(_deltas(ids)), len(ids)) for g, ids in by_trigram.items()]
+    facet_entries = [(k.encode("utf-8"), _varints(_deltas(ids)), len(ids)) for k, ids in facets.items()]
+
+    sections = [
+        docs_section,
+        _dictionary_section(term_entries),
+        _dictionary_section(trigram_entries),
+        _dictionary_section(facet_entries),
+        bytes(doc_info),
+    ]
+    offsets = []
+    position = _HEADER.size
+    for i, section in enumerate(sections):
+        if position % 2:
+            # Doc info is read as a uint16 array in place; keep every section 2-byte aligned
+            sections[i - 1] += b"\0"
+            position += 1
+        offsets.append(position)
+        position += len(section)
+    avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+    header = _HEADER.pack(_MAGIC, FORMAT_VERSION, len(docs), avg_length, *offsets)
+    return header + b"".join(sections)
+
+
+def export_json(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Frontend form of the index: docs in index order, term and facet postings by doc position."""
+    terms: Dict[str, List[int]] = collections.defaultdict(list)
+    facets: Dict[str, Dict[str, List[int]]] = collections.defaultdict(lambda: collections.defaultdict(list))
+    for doc_id, doc in enumerate(docs):
+        for term, tf in doc["terms"].items():
+            terms[term] += [doc_id, tf]
+        for key in doc["facets"]:
+            name, _, value = key.partition(":")
+            facets[name][value].append(doc_id)
+    return {
+        "version": FORMAT_VERSION,
+        "fields": list(DOC_FIELDS),
+        "priceBuckets": list(PRICE_BUCKETS),
+        "docs": [[doc["doc"].get(k) for k in DOC_FIELDS] for doc in docs],
+        "lengths": [doc["length"] for doc in docs],
+        "terms": dict(sorted(terms.items())),
+        "facets": {name: dict(sorted(values.items())) for name, values in sorted(facets.items())},
+    }
+
+
+class _Dictionary:
+    """Binary-searchable view of one dictionary section inside the mapped file."""
+
+    def __init__(self, buf: Any, offset: int) -> None:
+        self._buf = buf
+        self._offset = offset
+        (self.size,) = _COUNT.unpack_from(buf, offset)
+
+    def entry(self, index: int) -> Tuple[bytes, int, int, int]:
+        key_off, val_off, val_len, count, key_len = _ENTRY.unpack_from(
+            self._buf, self._offset + _COUNT.size + index * _ENTRY.size
+        )
+        start = self._offset + key_off
+        return self._buf[start:start + key_len], self._offset + val_off, val_len, count
+
+    def find(self, key: bytes) -> Optional[int]:
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.size and self.entry(lo)[0] == key else None
+
+    def values(self, index: int) -> List[int]:
+        _, start, length, _ = self.entry(index)
+        return _read_varints(self._buf, start, start + length)
+
+
+@dataclass
+class SearchResult:
+    total: int
+    hits: List[Dict[str, Any]]
+    facets: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+class SearchIndex:
+    """Read-only query API over a search-index.bin file, memory-mapped.
+
+    Opening maps the file and reads the header; queries touch only the
+    dictionary entries and posting lists they need.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.doc_count, self.avg_length, docs, terms, grams, facets, info = _HEADER.unpack_from(
+            self._buf, 0
+        )
+        if magic != _MAGIC or version != FORMAT_VERSION:
+            raise RuntimeError(f"{path}: not a search index of format version {FORMAT_VERSION}")
+        self._docs = docs
+        self._terms = _Dictionary(self._buf, terms)
+        self._trigrams = _Dictionary(self._buf, grams)
+        self._facets = _Dictionary(self._buf, facets)
+        # Doc info as a flat uint16 view: [length, chassis facet, price facet] per document
+        self._info = memoryview(self._buf)[info:info + self.doc_count * _DOC_INFO.size].cast("H")
+
+    @classmethod
+    def open(cls, index_dir: str) -> "SearchIndex":
+        return cls(os.path.join(index_dir, INDEX_FILE))
+
+    def close(self) -> None:
+        self._info.release()
+        self._buf.close()
+        self._file.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def document(self, doc_id: int) -> Dict[str, Any]:
+        start, length = _SPAN.unpack_from(self._buf, self._docs + _COUNT.size + doc_id * _SPAN.size)
+        blob = self._docs + _COUNT.size + self.doc_count * _SPAN.size + start
+        return json.loads(self._buf[blob:blob + length])
+
+    def _expansions(self, token: str) -> List[Tuple[int, float]]:
+        """(term id, weight) pairs for one query word: the word itself, else similar terms by trigrams."""
+        exact = self._terms.find(token.encode("utf-8"))
+        if exact is not None:
+            return [(exact, 1.0)]
+        grams = trigrams(token)
+        shared: Dict[int, int] = collections.Counter()
+        for gram in grams:
+            idx = self._trigrams.find(gram.encode("utf-8"))
+            if idx is not None:
+                term_id = 0
+                for delta in self._trigrams.values(idx):
+                    term_id += delta
+                    shared[term_id] += 1
+        scored = []
+        for term_id, common in shared.items():
+            term = self._terms.entry(term_id)[0].decode("utf-8")
+            similarity = common / (len(grams) + len(trigrams(term)) - common)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, term_id))
+        return [(term_id, sim) for sim, term_id in heapq.nlargest(FUZZY_MAX_EXPANSIONS, scored)]
+
+    def _term_scores(self, term_id: int, weight: float, scores: Dict[int, float]) -> None:
+        _, _, _, df = self._terms.entry(term_id)
+        idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+        # BM25 with the per-term and per-length constants folded out of the loop
+        scale = weight * idf * (BM25_K1 + 1)
+        base = BM25_K1 * (1 - BM25_B)
+        per_length = BM25_K1 * BM25_B / (self.avg_length or 1)
+        info = self._info
+        values = self._terms.values(term_id)
+        doc_id = 0
+        for i in range(0, len(values), 2):
+            doc_id += values[i]
+            tf = values[i + 1]
+            score = scale * tf / (tf + base + per_length * info[doc_id * 3])
+            if score > scores.get(doc_id, 0.0):
+                scores[doc_id] = score
+
+    def facet_docs(self, name: str, value: str) -> set:
+        idx = self._facets.find(f"{name}:{value}".encode("utf-8"))
+        docs: set = set()
+        if idx is not None:
+            doc_id = 0
+            for delta in self._facets.values(idx):
+                doc_id += delta
+                docs.add(doc_id)
+        return docs
+
+    def search(
+        self,
+        query: str,
+        chassis: Optional[str] = None,
+        price: Optional[str] = None,
+        limit: int = 20,
+    ) -> SearchResult:
+        """Products matching every word of `query` (exactly or fuzzily), best BM25 score first.
+
+        `chassis` (e.g. "G82") and `price` (a bucket such as "100-200") filter
+        the matches; `facets` counts chassis and price buckets over them.
+        """
+        filters = [
+            (slot, f"{name}:{value}")
+            for slot, (name, value) in enumerate((("chassis", chassis), ("price", price)))
+            if value
+        ]
+        totals: Optional[Dict[int, float]] = None
+        for token in dict.fromkeys(tokenize(query)):
+            scores: Dict[int, float] = {}
+            for term_id, weight in self._expansions(token):
+                self._term_scores(term_id, weight, scores)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {d: s + scores[d] for d, s in totals.items() if d in scores}
+            if not totals:
+                break
+        if totals is None:
+            # No query words: start from the first filter's posting list, or everything
+            if filters:
+                totals = dict.fromkeys(self.facet_docs(*filters[0][1].split(":", 1)), 0.0)
+            else:
+                totals = dict.fromkeys(range(self.doc_count), 0.0)
+
+        wanted = []
+        for slot, key in filters:
+            idx = self._facets.find(key.encode("utf-8"))
+            if idx is None:
+                totals = {}
+                break
+            wanted.append((slot + 1, idx))
+        info = self._info
+        matched = {
+            doc_id: score
+            for doc_id, score in totals.items()
+            if all(info[doc_id * 3 + slot] == idx for slot, idx in wanted)
+        }
+        counts = collections.Counter(info[doc_id * 3 + 1] for doc_id in matched)
+        counts.update(info[doc_id * 3 + 2] for doc_id in matched)
+        facets: Dict[str, Dict[str, int]] = {"chassis": {}, "price": {}}
+        for idx, count in sorted(counts.items()):
+            name, _, value = self._facets.entry(idx)[0].decode("utf-8").partition(":")
+            facets[name][value] = count
+
+        best = heapq.nsmallest(limit, matched.items(), key=lambda kv: (-kv[1], kv[0]))
+        hits = [{**self.document(doc_id), "score": round(score, 4)} for doc_id, score in best]
+        return SearchResult(total=len(matched), hits=hits, facets=facets)
+
+
+class SearchIndexBuilder:
+    """Analyzed products kept in SQLite under `index_dir`, from which the index files are written.
+
+    Only new or changed products (by contentHash) are analyzed again;
+    write() regenerates search-index.bin and search-index.json from the
+    stored analyses, and does nothing when no product changed since the
+    last write. put(), delete() and commit() may be called from several
+    threads; otherwise nothing is committed before write() or close().
+    """
+
+    def __init__(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_dir = index_dir
+        self.analyzed = 0
+        self.deleted = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(index_dir, STATE_FILE), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Callers may commit after every put(); NORMAL keeps that from costing an fsync each time
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " item_key TEXT PRIMARY KEY, content_hash TEXT NOT NULL, analysis TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+    def is_empty(self) -> bool:
+        return self._db.execute("SELECT 1 FROM documents LIMIT 1").fetchone() is None
+
+    def _mark_dirty(self) -> None:
+        self._db.execute("INSERT OR REPLACE INTO state (name, value) VALUES ('dirty', '1')")
+
+    def put(self, item_key: str, item: Dict[str, Any]) -> bool:
+        """Store `item` under `item_key`; False (and no work) if its content is unchanged."""
+        content_hash = _content_hash(item)
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM documents WHERE item_key = ?", (item_key,)).fetchone()
+            if row is not None and row[0] == content_hash:
+                return False
+        analysis = json.dumps(analyze(item), ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (item_key, content_hash, analysis) VALUES (?, ?, ?)",
+                (item_key, content_hash, analysis),
+            )
+            self._mark_dirty()
+            self.analyzed += 1
+        return True
+
+    def delete(self, item_key: str) -> None:
+        with self._lock:
+            if self._db.execute("DELETE FROM documents WHERE item_key = ?", (item_key,)).rowcount:
+                self._mark_dirty()
+                self.deleted += 1
+
+    def commit(self) -> None:
+        with self._lock:
+            self._db.commit()
+
+    def sync(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Make the stored products exactly `items` ((key, item) pairs), e.g. a full table scan."""
+        seen = set()
+        for item_key, item in items:
+            seen.add(item_key)
+            self.put(item_key, item)
+        stale = [k for (k,) in self._db.execute("SELECT item_key FROM documents") if k not in seen]
+        for item_key in stale:
+            self.delete(item_key)
+
+    def write(self) -> bool:
+        """Write the index files if anything changed (or they are missing); True when written."""
+        bin_path = os.path.join(self.index_dir, INDEX_FILE)
+        json_path = os.path.join(self.index_dir, JSON_FILE)
+        dirty = self._db.execute("SELECT value FROM state WHERE name = 'dirty'").fetchone()
+        if not dirty and os.path.exists(bin_path) and os.path.exists(json_path):
+            self._db.commit()
+            return False
+        docs = [json.loads(a) for (a,) in self._db.execute("SELECT analysis FROM documents ORDER BY item_key")]
+        write_atomic(bin_path, encode_index(docs))
+        write_atomic(
+            json_path, json.dumps(export_json(docs), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        self._db.execute("DELETE FROM state WHERE name = 'dirty'")
+        self._db.commit()
+        return True
+
+    def close(self) -> None:
+        self._db.commit()
+        self._db.close()
+
+
+def iter_table_items(
+    table_name: str, region_name: Optional[str] = None, endpoint_url: Optional[str] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(encoded key, item) for every item of a table, keys encoded like the importer's change index."""
+    # Only a full sync reads the table; queries and incremental builds never load boto3
+    import boto3
+
+    table = boto3.session.Session(region_name=region_name).resource("dynamodb", endpoint_url=endpoint_url).Table(
+        table_name
+    )
+    key_names = [k["AttributeName"] for k in table.key_schema]
+    kwargs: Dict[str, Any] = {}
+    while True:
+        resp = table.scan(**kwargs)
+        for item in resp.get("Items", []):
+            yield json.dumps({k: item[k] for k in key_names}, sort_keys=True, default=str), item
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def build_from_table(
+    table_name: str,
+    index_dir: str,
+    region_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
+) -> SearchIndexBuilder:
+    """Sync the index with a full table scan; unchanged products are not analyzed again."""
+    builder = SearchIndexBuilder(index_dir)
+    try:
+        builder.sync(iter_table_items(table_name, region_name, endpoint_url))
+        builder.write()
+    finally:
+        builder.close()
+    return builder
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build or query the offline product search index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Sync the index with a DynamoDB table (re-analyzes changed products only)")
+    build.add_argument("--table-name", required=True, help="DynamoDB table to index")
+    build.add_argument("--index-dir", required=True, help="Directory holding the index files and their state")
+    build.add_argument("--aws-region", default=None, help="AWS region (default: boto3 environment)")
+    build.add_argument("--dynamodb-endpoint-url", default=None, help="Custom endpoint, e.g. DynamoDB Local")
+
+    query = sub.add_parser("query", help="Run one query against a built index")
+    query.add_argument("--index-dir", required=True, help="Directory with search-index.bin")
+    query.add_argument("query", nargs="?", default="", help="Search words, e.g. 'g82 lip'")
+    query.add_argument("--chassis", default=None, help="Only this chassis code, e.g. G82")
+    query.add_argument("--price", default=None, help="Only this price bucket, e.g. 100-200")
+    query.add_argument("--limit", type=int, default=10, help="Number of hits (default: 10)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.command == "build":
+        started = time.perf_counter()
+        builder = build_from_table(
+            args.table_name, args.index_dir, region_name=args.aws_region, endpoint_url=args.dynamodb_endpoint_url
+        )
+        print(
+            f"Search index: {args.index_dir} (analyzed={builder.analyzed} removed={builder.deleted}) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return 0
+    with SearchIndex.open(args.index_dir) as index:
+        started = time.perf_counter()
+        result = index.search(args.query, chassis=args.chassis, price=args.price, limit=args.limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    for hit in result.hits:
+        print(f"{hit['score']:8.3f}  {hit.get('chassis', ''):5}  {hit.get('price', '')!s:>7}  {hit.get('name', '')}")
+    print(f"{result.total} matches in {elapsed_ms:.2f} ms; facets: {json.dumps(result.facets)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+"""Incremental catalog snapshot builds and pruning of shards no manifest needs."""
+
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scrape_made_in_china_m3_lip as importer  # noqa: E402
+
+
+def _item(n: int, price: str = "US$100.00") -> dict:
+    return {
+        "pk": f"made-in-china#{n}",
+        "id": f"p{n}",
+        "title": f"Carbon lip {n}",
+        "category": "m3-lip",
+        "priceText": price,
+        "recencyKey": f"2026-01-{n:02d}",
+    }
+
+
+def _key(item: dict) -> str:
+    return importer._encode_item_key({"pk": item["pk"]})
+
+
+def _shards(root: str) -> set:
+    return {
+        os.path.relpath(os.path.join(d, f), root).replace(os.sep, "/")
+        for d, _, names in os.walk(root)
+        for f in names
+        if importer._SNAPSHOT_SHARD_RE.search(f)
+    }
+
+
+def _manifest_shards(root: str) -> set:
+    with open(os.path.join(root, importer.SNAPSHOT_MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    names = manifest["listing"] + [manifest["productIndex"]]
+    for category in manifest["categories"].values():
+        names += category["shards"]
+    return {name + ".gz" for name in names}
+
+
+def test_incremental_build_matches_full_and_prunes(tmp_path) -> None:
+    root = str(tmp_path / "catalog")
+    items = [_item(n) for n in range(1, 4)]
+    snapshot = importer.CatalogSnapshot(root)
+    snapshot.sync((_key(i), i) for i in items)
+    snapshot.build()
+    snapshot.prune()
+    first = _manifest_shards(root)
+
+    changed = _item(2, price="US$90.00")
+    snapshot.put(_key(changed), changed)
+    snapshot.delete(_key(items[0]))
+    snapshot.build()
+    snapshot.prune()
+    second = _manifest_shards(root)
+    # The previous build's shards survive one more build for clients holding its manifest
+    assert first | second <= _shards(root)
+
+    snapshot.build()
+    snapshot.prune()
+    assert second <= _shards(root)
+    assert not (first - second) & _shards(root)
+    snapshot.close()
+
+    full_root = str(tmp_path / "full")
+    full = importer.CatalogSnapshot(full_root)
+    full.sync((_key(i), i) for i in [changed, items[2]])
+    full.build()
+    full.close()
+    assert _manifest_shards(full_root) == second
@@ -0,0 +1,61 @@
+"""The lxml and selectolax parser engines must return exactly what bs4 returns.
+
+Fixtures in tests/fixtures are trimmed search pages covering div, li and
+data-s-virtual cards, links without a title attribute (text taken from
+nested inline markup, comments and scripts), entities, relative URLs, and
+CRLF line endings with NBSP in titles and prices. Fixtures are read without
+newline translation so the engines see the bytes as saved.
+"""
+
+import glob
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scrape_made_in_china_m3_lip as importer  # noqa: E402
+
+FIXTURES = sorted(glob.glob(os.path.join(ROOT, "tests", "fixtures", "*.html")))
+FAST_ENGINES = [
+    pytest.param(
+        engine,
+        marks=pytest.mark.skipif(importlib.util.find_spec(engine) is None, reason=f"{engine} is not installed"),
+    )
+    for engine in ("lxml", "selectolax")
+]
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def test_fixtures_present() -> None:
+    assert FIXTURES
+
+
+@pytest.mark.parametrize("engine", FAST_ENGINES)
+@pytest.mark.parametrize("fixture", FIXTURES, ids=os.path.basename)
+def test_engine_matches_bs4(fixture: str, engine: str) -> None:
+    html = _read(fixture)
+    expected = importer.PARSER_ENGINES["bs4"](html)
+    assert expected, "fixture should yield products"
+    assert importer.PARSER_ENGINES[engine](html) == expected
+
+
+@pytest.mark.parametrize("engine", ["bs4"] + FAST_ENGINES)
+def test_link_text_in_document_order(engine: str) -> None:
+    html = '<ul><li class="pro-item"><a href="/prod/1.html">G82 <b>M4</b> lip<!-- c --><script>x</script></a></li></ul>'
+    (product,) = importer.PARSER_ENGINES[engine](html)
+    assert product.title == "G82M4lip"
+
+
+@pytest.mark.parametrize("engine", ["bs4"] + FAST_ENGINES)
+def test_whitespace_normalized(engine: str) -> None:
+    html = '<ul><li class="pro-item"><a href="/prod/1.html">M4\r\nG82\xa0 lip\r</a><p>US$12.50&nbsp;/\rPiece</p></li></ul>'
+    (product,) = importer.PARSER_ENGINES[engine](html)
+    assert (product.title, product.price_text) == ("M4 G82 lip", "US$12.50 / Piece")
@@ -0,0 +1,98 @@
+"""A run that crashes mid-upsert must still index every write DynamoDB confirmed.
+
+The resumed run replays those writes from the journal as unchanged and never
+hands them to the search index again, so the crashed run has to keep them.
+Runs against an in-process moto DynamoDB.
+"""
+
+import json
+import os
+import sys
+from typing import Iterator, List
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scrape_made_in_china_m3_lip as importer  # noqa: E402
+import search_index  # noqa: E402
+
+moto = pytest.importorskip("moto")
+
+TABLE_NAME = "products"
+
+
+def _product(name: str) -> importer.Product:
+    url = f"https://www.made-in-china.com/prod/{name}.html"
+    return importer.Product(
+        product_id=importer.stable_id_from_url(url),
+        title=f"Carbon {name} lip",
+        product_url=url,
+        image_url=None,
+        image_local_path=None,
+        price_text="US$100.00",
+        moq_text=None,
+        supplier_name=None,
+        supplier_url=None,
+        source="made-in-china",
+    )
+
+
+def _crashing(products: List[importer.Product]) -> Iterator[importer.Product]:
+    yield from products
+    raise RuntimeError("simulated crash")
+
+
+def _upload(tmp_path, products, resume: bool = False) -> importer.WriteSummary:
+    args = importer.parse_args(
+        [
+            "upload",
+            "--table-name", TABLE_NAME,
+            "--change-index", str(tmp_path / "change-index.sqlite3"),
+            "--search-index-dir", str(tmp_path / "search"),
+        ]
+    )
+    journal = importer.CrawlJournal(str(tmp_path / "journal.sqlite3"))
+    journal.start([], resume=resume)
+    importer.set_journal(journal)
+    try:
+        summary = importer._upload_products(args, products)
+        journal.finish()
+        return summary
+    finally:
+        importer.set_journal(None)
+        journal.close()
+
+
+@pytest.fixture
+def table(monkeypatch):
+    import boto3
+
+    for name, value in (("AWS_ACCESS_KEY_ID", "test"), ("AWS_SECRET_ACCESS_KEY", "test")):
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-central-1")
+    with moto.mock_aws():
+        yield boto3.resource("dynamodb").create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+def test_crash_then_resume_indexes_every_item(tmp_path, table) -> None:
+    _upload(tmp_path, [_product("seed")])
+    batch = [_product(f"g82-{i}") for i in range(3)]
+
+    with pytest.raises(RuntimeError, match="simulated crash"):
+        _upload(tmp_path, _crashing(batch))
+    summary = _upload(tmp_path, batch, resume=True)
+    assert summary.unchanged == len(batch)
+
+    table_ids = {item["id"] for item in table.scan()["Items"]}
+    with open(tmp_path / "search" / search_index.JSON_FILE, encoding="utf-8") as f:
+        exported = json.load(f)
+    id_column = exported["fields"].index("id")
+    assert len(table_ids) == len(batch) + 1
+    assert {doc[id_column] for doc in exported["docs"]} == table_ids